@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.plugins.action import ActionBase
+
+from ..plugin_utils import deferred
+
+
+class ActionModule(ActionBase):
+    TRANSFERS_FILES = False
+
+    def run(self, tmp=None, task_vars=None):
+        task_vars = task_vars or {}
+        result = super(ActionModule, self).run(tmp, task_vars)
+
+        pending = deferred.get_pending(task_vars)
+        if not pending:
+            result.update(changed=False, msg="No pending changes.")
+            return result
+
+        module_args = deferred.merge_pending(pending)
+        module_args["merge"] = True
+        for option in ("provider", "diff_format"):
+            if option in self._task.args:
+                module_args[option] = self._task.args[option]
+
+        result.update(self._execute_module(
+            module_name="steampunk.unit.config", module_args=module_args,
+            task_vars=task_vars,
+        ))
+        if not result.get("failed") and not self._play_context.check_mode:
+            result["ansible_facts"] = {deferred.PENDING_FACT: []}
+        return result
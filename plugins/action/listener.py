@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ..module_utils import utils
+from ..module_utils.errors import UnitError
+from ..modules.listener import module_args
+from ..plugin_utils.deferred import DeferredAction
+
+
+class ActionModule(DeferredAction):
+    def module_args(self):
+        return module_args()
+
+    def defer(self, args):
+        if not args.get("pattern"):
+            # Batch mode already applies all changes at once.
+            return None
+
+        if args.get("state", "present") == "absent":
+            return "listeners", args["pattern"], None
+
+        if not args.get("pass"):
+            raise UnitError(
+                "state is present but all of the following are missing: pass"
+            )
+        return "listeners", args["pattern"], utils.filter_dict(
+            args, "pass", "tls",
+        )
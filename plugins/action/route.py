@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible.module_utils.parsing.convert_bool import boolean
+
+from ..module_utils.errors import UnitError
+from ..modules.route import build_payload, module_args
+from ..plugin_utils.deferred import DeferredAction
+
+
+class ActionModule(DeferredAction):
+    def module_args(self):
+        return module_args()
+
+    def defer(self, args):
+        is_global = boolean(args.get("global", False), strict=False)
+        present = args.get("state", "present") == "present"
+
+        if is_global and not present:
+            # Merge mode of the config module cannot remove the global route.
+            return None
+        if present and (args.get("raw_steps") or args.get("steps_file")):
+            # Raw steps are validated by the module and files are read on the
+            # managed host, which is why we cannot defer such tasks.
+            return None
+        if not is_global and not args.get("name"):
+            raise UnitError(
+                "global is False but all of the following are missing: name"
+            )
+
+        value = None
+        if present:
+            if not args.get("steps"):
+                raise UnitError(
+                    "state is present but all of the following are missing: "
+                    "steps"
+                )
+            value = build_payload(args["steps"])
+
+        return "routes", None if is_global else args["name"], value
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = """
+author:
+  - Tadej Borovšak (@tadeboro)
+name: metrics
+type: aggregate
+short_description: Summarize NGINX Unit request metrics
+description:
+  - Collects metrics that C(steampunk.unit) modules return when the
+    I(provider.metrics) option is enabled and prints a per host and module
+    summary at the end of the play.
+  - Enable it by adding C(steampunk.unit.metrics) to the list of enabled
+    callbacks.
+requirements:
+  - enable in configuration
+"""
+
+from ansible.plugins.callback import CallbackBase
+
+_TOTALS = (
+    "request_count", "request_time", "request_bytes", "response_bytes",
+    "put_retries", "saved_round_trips", "discovery_time",
+)
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = "aggregate"
+    CALLBACK_NAME = "steampunk.unit.metrics"
+    CALLBACK_NEEDS_WHITELIST = True
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        # (host, module) -> totals
+        self.stats = {}
+
+    def _record(self, result):
+        metrics = result._result.get("metrics")
+        if not isinstance(metrics, dict):
+            return
+
+        key = (result._host.get_name(), result._task.action)
+        stats = self.stats.setdefault(key, dict(
+            (k, 0) for k in ("tasks", ) + _TOTALS
+        ))
+        stats["tasks"] += 1
+        for k in _TOTALS:
+            stats[k] += metrics.get(k, 0)
+
+    def v2_runner_on_ok(self, result):
+        self._record(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result)
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.stats:
+            return
+
+        self._display.banner("NGINX UNIT METRICS")
+        self._display.display(
+            "{0:<24} {1:<28} {2:>5} {3:>8} {4:>10} {5:>10} {6:>7} "
+            "{7:>5} {8:>10}".format(
+                "HOST", "MODULE", "TASKS", "REQUESTS", "REQ TIME", "BYTES",
+                "RETRIES", "SAVED", "DISCOVERY",
+            )
+        )
+        # Slowest host and module combination first.
+        for (host, module), s in sorted(
+                self.stats.items(),
+                key=lambda i: -(i[1]["request_time"] + i[1]["discovery_time"]),
+        ):
+            self._display.display(
+                "{0:<24} {1:<28} {2:>5} {3:>8} {4:>9.3f}s {5:>10} {6:>7} "
+                "{7:>5} {8:>9.3f}s".format(
+                    host, module, s["tasks"], s["request_count"],
+                    s["request_time"],
+                    s["request_bytes"] + s["response_bytes"],
+                    s["put_retries"], s["saved_round_trips"],
+                    s["discovery_time"],
+                )
+            )
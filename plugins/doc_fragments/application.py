@@ -14,7 +14,7 @@ options:
   name:
     description:
       - Application name.
-    required: true
+      - Required unless the module manages a list of applications.
     type: str
 
   limits:
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+    DOCUMENTATION = """
+options:
+  diff_format:
+    description:
+      - Amount of information about the changes that module returns.
+      - If set to C(full), module returns the complete configuration before
+        and after the change in the I(diff) field and the managed object in
+        the I(object) field.
+      - If set to C(summary), I(diff) field only contains the list of
+        changed paths (in JSON pointer format) and the number of added,
+        replaced and removed parts of the configuration. I(object) field is
+        not returned.
+      - If set to C(none), module only reports whether the configuration
+        changed.
+      - Use C(summary) or C(none) when managing big objects on many hosts to
+        keep the module results small.
+    choices: [ full, summary, none ]
+    default: full
+    type: str
+"""
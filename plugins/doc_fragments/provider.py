@@ -13,6 +13,8 @@ options:
   provider:
     description:
       - Connection parameters.
+      - Ignored when the module runs over the persistent connection that the
+        C(steampunk.unit.unit) httpapi plugin provides.
     type: dict
     suboptions:
 
@@ -24,9 +26,38 @@ options:
           - By default, modules will try to connect to
             I(unix:///var/run/unit/control.sock), and if this socket does not
             exist, fallback to I(unix:///var/run/control.unit.sock).
+          - Discovered endpoint is cached in the
+            C(~/.ansible/steampunk.unit.discovery.json) file on the managed
+            host for five minutes, which means that subsequent tasks do not
+            need to probe the candidates again.
           - Can also be set using the I(UNIT_ENDPOINT) environment variable.
         type: str
 
+      endpoints:
+        description:
+          - List of HTTP or UNIX uris of the Unit instances that the module
+            should manage at the same time (for example, the control sockets
+            of Unit instances that run in different containers).
+          - Module applies (or reads) the same desired state on all of them
+            concurrently and returns a list of per-endpoint results in the
+            I(endpoints) field of its result. Each entry contains the
+            I(endpoint), the time it took to process it in seconds
+            (I(time)), and the fields that the module would return for that
+            endpoint alone.
+          - Module fails if it fails on any of the endpoints, but it still
+            processes all of them.
+          - Mutually exclusive with I(endpoint).
+        type: list
+        elements: str
+
+      workers:
+        description:
+          - Maximum number of endpoints from the I(endpoints) list that
+            module processes at the same time.
+          - If this parameter is not set, module processes up to four
+            endpoints at the same time.
+        type: int
+
       username:
         description:
           - Username that is used when the I(enpoint) is protected using the
@@ -58,6 +89,67 @@ options:
         type: bool
         default: true
 
+      snapshot:
+        description:
+          - Fetch the whole Unit configuration once and serve all subsequent
+            reads from memory.
+          - Changes that modules make are applied to the in-memory copy as
+            well, so the module sees the up-to-date configuration.
+          - Enable this option when the module needs to inspect many parts
+            of the configuration (for example, when the route has many steps
+            that pass requests to different applications).
+        type: bool
+        default: false
+
+      metrics:
+        description:
+          - Record every request that the module sends to the Unit and return
+            the collected data in the I(metrics) field of the module result.
+          - Metrics contain a list of I(requests) (each one with I(method),
+            I(path), I(status), I(latency), I(request_bytes), and
+            I(response_bytes)), their totals (I(request_count),
+            I(request_time), I(request_bytes), and I(response_bytes)), the
+            number of PUT requests that had to be repeated because of missing
+            parents (I(put_retries)), the number of round trips that the
+            lookup of existing parents saved compared to repeating the PUT
+            request for each missing parent (I(saved_round_trips)), and the
+            time spent finding the endpoint (I(discovery_time) and
+            I(discovery_cached)).
+          - Times are in seconds.
+          - Use the C(steampunk.unit.metrics) callback plugin to aggregate
+            metrics over the whole play.
+        type: bool
+        default: false
+
+      connect_timeout:
+        description:
+          - Number of seconds to wait for the connection to the Unit to be
+            established (including the TLS handshake).
+          - Also limits the time that module spends probing each candidate
+            endpoint. If this parameter is not set, module waits for 10
+            seconds when connecting and for 2 seconds when probing.
+        type: float
+
+      read_timeout:
+        description:
+          - Number of seconds to wait for each response from the Unit.
+          - If this parameter is not set, module waits for 10 seconds.
+        type: float
+
+      deadline:
+        description:
+          - Number of seconds that the module can spend talking to the Unit.
+          - Budget starts when the module connects to the Unit for the first
+            time and covers the endpoint discovery, all reads of the
+            configuration (including the ones that validate references), and
+            all changes (including repeated requests). Timeouts of
+            individual requests are shortened so that none of them runs past
+            the deadline.
+          - Once the budget runs out, module fails and reports the phase it
+            was in and the time spent in each phase.
+          - If I(endpoints) is set, all endpoints share the budget.
+        type: float
+
       ca_path:
         description:
           - Path to the CA bundle that should be used to validate the backend
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = """
+author:
+  - Tadej Borovšak (@tadeboro)
+name: unit
+short_description: HttpApi plugin for the NGINX Unit control API
+description:
+  - Sends requests from the C(steampunk.unit) modules to the NGINX Unit
+    control API over a persistent connection. The connection stays open for
+    the whole play, which means that modules do not need to discover the
+    endpoint or open a new connection on every task.
+  - Use it by setting I(ansible_connection) to C(ansible.netcommon.httpapi)
+    and I(ansible_network_os) to C(steampunk.unit.unit).
+  - Remote Unit instances are reached over TCP or TLS (set
+    I(ansible_httpapi_use_ssl) and related variables). Unit that only
+    listens on a unix socket can be reached by forwarding the socket to a
+    local TCP port over SSH
+    (C(ssh -N -L 8080:/var/run/control.unit.sock unit-host)) and pointing
+    I(ansible_host) and I(ansible_httpapi_port) to the forwarded port.
+  - When modules run over this connection, the I(provider) option is
+    ignored.
+requirements:
+  - C(ansible.netcommon) collection, which provides the
+    C(ansible.netcommon.httpapi) connection plugin. This collection does not
+    depend on it, so install it separately
+    (C(ansible-galaxy collection install ansible.netcommon)).
+"""
+
+from ansible.module_utils._text import to_text
+from ansible.plugins.httpapi import HttpApiBase
+
+
+class HttpApi(HttpApiBase):
+    def send_request(self, method, path, data=None):
+        headers = {}
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+
+        response, response_data = self.connection.send(
+            path, data, method=method, headers=headers,
+        )
+        return (
+            response.getcode(),
+            to_text(response_data.getvalue(), errors="surrogate_or_strict"),
+            response.headers.get("Server"),
+        )
+
+    def handle_httperror(self, exc):
+        if exc.code == 401:
+            # Credentials are static, so there is no point in retrying.
+            return False
+        # Unit reports missing objects and invalid configuration using
+        # status codes, and the client knows how to handle them.
+        return exc
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+# This module uses the async/await syntax and needs python 3.5 or newer.
+# Importing it on older pythons raises SyntaxError, so modules that use it
+# must guard the import themselves and fall back to the synchronous client:
+#
+#   try:
+#       from ..module_utils.async_client import AsyncClient
+#   except SyntaxError:
+#       AsyncClient = None
+
+import asyncio
+
+from ansible.module_utils.six.moves.urllib.parse import urlparse
+
+from . import jsoncodec, transport
+from .client import Client, Response, build_url
+from .errors import UnitError
+
+
+class AsyncClient:
+    """
+    Asyncio counterpart of the Client.
+
+    Methods get, put, and delete behave the same as their synchronous
+    counterparts, but any number of them can run at the same time. Client
+    keeps at most max_in_flight requests on the wire, each one over its own
+    keep-alive connection.
+
+    Concurrent GET requests for the same path share a single request.
+
+    All coroutines must run on the same event loop.
+    """
+
+    def __init__(self, endpoint, username=None, password=None, verify=True,
+                 ca_path=None, max_in_flight=8,
+                 timeout=transport.DEFAULT_TIMEOUT):
+        if not any(endpoint.startswith(p) for p in Client.VALID_PREFIXES):
+            raise UnitError(
+                "Endpoint should start with one of the following: {0}".format(
+                    ", ".join(Client.VALID_PREFIXES),
+                )
+            )
+
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self._headers = {}
+        self._prefix = ""
+        self._ssl = None
+
+        if endpoint.startswith("unix://"):
+            self._address = endpoint[7:]
+            self._host = "localhost"
+        else:
+            parts = urlparse(endpoint)
+            https = parts.scheme == "https"
+            self._address = (
+                parts.hostname, parts.port or (443 if https else 80),
+            )
+            self._host = parts.netloc
+            self._prefix = parts.path.rstrip("/")
+            if https:
+                self._ssl = transport._ssl_context(verify, ca_path)
+            if username:
+                self._headers["Authorization"] = transport._basic_auth_header(
+                    username, password,
+                )
+
+        self._idle = []
+        self._gets = {}
+        # Synchronization primitives bind to the running loop on older
+        # pythons, so we create them on the first request.
+        self._semaphore = None
+        self._put_lock = None
+
+    async def _connect(self):
+        if isinstance(self._address, tuple):
+            return await asyncio.open_connection(
+                self._address[0], self._address[1], ssl=self._ssl,
+            )
+        return await asyncio.open_unix_connection(self._address)
+
+    @staticmethod
+    def _close(conn):
+        conn[1].close()
+
+    async def _exchange(self, conn, method, url, body):
+        reader, writer = conn
+
+        lines = ["{0} {1} HTTP/1.1".format(method, url), "Host: " + self._host]
+        lines.extend("{0}: {1}".format(k, v) for k, v in self._headers.items())
+        if body is not None:
+            lines.append("Content-Type: application/json")
+            lines.append("Content-Length: {0}".format(len(body)))
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if body is not None:
+            writer.write(body)
+        await writer.drain()
+
+        line = await reader.readline()
+        if not line:
+            raise transport.ConnectionDropped(
+                "Remote end closed connection without response",
+            )
+        parts = line.decode("latin-1").split(None, 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            raise transport.ProtocolError(
+                "Invalid status line: {0!r}".format(line),
+            )
+        status = int(parts[1])
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).rstrip(b"\r\n")
+            if not line:
+                break
+            name, _sep, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        will_close = headers.get("connection", "").lower() == "close"
+        if status in (204, 304) or 100 <= status < 200:
+            data = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";", 1)[0], 16)
+                if size == 0:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            while (await reader.readline()).rstrip(b"\r\n"):
+                pass  # Trailers
+            data = b"".join(chunks)
+        elif "content-length" in headers:
+            data = await reader.readexactly(int(headers["content-length"]))
+        else:
+            data = await reader.read()
+            will_close = True
+
+        return status, data, will_close
+
+    async def _send(self, method, url, body):
+        if self._idle:
+            conn, reused = self._idle.pop(), True
+        else:
+            conn, reused = await self._connect(), False
+
+        try:
+            try:
+                status, data, will_close = await self._exchange(
+                    conn, method, url, body,
+                )
+            except (transport.ConnectionDropped, ConnectionError):
+                if not reused:
+                    raise
+                # Unit closed the idle connection on us. Retry once.
+                self._close(conn)
+                conn = await self._connect()
+                status, data, will_close = await self._exchange(
+                    conn, method, url, body,
+                )
+        except BaseException:
+            self._close(conn)
+            raise
+
+        if will_close or len(self._idle) >= self.max_in_flight:
+            self._close(conn)
+        else:
+            self._idle.append(conn)
+        return status, data
+
+    async def request(self, method, path, data=None):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._put_lock = asyncio.Lock()
+
+        url = self._prefix + build_url(path)
+        body = None
+        if data is not None:
+            body = jsoncodec.dumps(data).encode("utf-8")
+
+        async with self._semaphore:
+            try:
+                status, raw_data = await asyncio.wait_for(
+                    self._send(method, url, body), self.timeout,
+                )
+            except asyncio.TimeoutError:
+                raise UnitError("{0} request timed out".format(method))
+            except (OSError, asyncio.IncompleteReadError) as e:
+                raise UnitError("{0} request failed: {1}".format(method, e))
+
+        return Response(status, raw_data)
+
+    async def _get_raw(self, path):
+        r = await self.request("GET", path)
+        return r.status, r._raw
+
+    async def get(self, path):
+        path = tuple(path)
+        task = self._gets.get(path)
+        if task is None:
+            task = asyncio.ensure_future(self._get_raw(path))
+            self._gets[path] = task
+            task.add_done_callback(lambda _task: self._gets.pop(path))
+        # Each caller decodes its own copy of the response. Shielding the
+        # task keeps the request going for others if one caller cancels.
+        r = Response(*(await asyncio.shield(task)))
+        if r.status == 200:
+            return r.json
+        if r.status == 404:
+            return {}
+
+        raise UnitError(
+            "Invalid response: ({0}) - {1}".format(r.status, r.data)
+        )
+
+    async def get_many(self, paths):
+        return await asyncio.gather(*(self.get(p) for p in paths))
+
+    async def put(self, path, data):
+        path = tuple(path)
+        r = await self.request("PUT", path, data)
+        if r.status != 404:
+            Client._check_put_response(r)
+            return
+
+        # Missing parents. Two concurrent requests that create the same
+        # parent would overwrite each other's payload, so we create parents
+        # one request at a time. Once we hold the lock, the parent might
+        # already be there, which is why we start at the full path again.
+        async with self._put_lock:
+            while True:
+                r = await self.request("PUT", path, data)
+                if r.status != 404:
+                    Client._check_put_response(r)
+                    return
+                if not path:
+                    raise UnitError(
+                        "Ran out of parent path segments. This probaly "
+                        "indicates a bug in NGINX Unit Ansible Collection or "
+                        "in the NGINX Unit itself."
+                    )
+                data = {path[-1]: data}
+                path = path[:-1]
+
+    async def delete(self, path):
+        r = await self.request("DELETE", path)
+        # Yes, unit returns 200 on DELETE ...
+        if r.status != 200:
+            raise UnitError(
+                "Invalid response: ({0}) - {1}".format(r.status, r.data)
+            )
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+
+def run(coroutine):
+    """ Run the coroutine to completion on a private event loop. """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
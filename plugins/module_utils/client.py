@@ -6,77 +6,358 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import contextlib
+import copy
 import json
+import os
+import sys
+import threading
+import time
 
-from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+from ansible.module_utils._text import to_bytes, to_text
+from ansible.module_utils.six import reraise
 from ansible.module_utils.six.moves.urllib.parse import quote
-from ansible.module_utils.urls import Request
 
+from . import jsoncodec, jsonscan, transport
 from .errors import UnitError
 
 
+def build_url(path):
+    return "/" + "/".join(quote(s, safe="") for s in path)
+
+
 class Response:
+    """
+    Response from the Unit.
+
+    Body is kept in the form the transport returned it (bytes from our own
+    connections, text from the persistent connection). Once the body is
+    decoded, we drop the raw copy, since the configuration of a large Unit
+    would otherwise sit in memory twice.
+    """
+
     def __init__(self, status, data):
         self.status = status
-        self.data = data
+        self._raw = data
         self._json = None
+        self._decoded = False
+
+    @property
+    def data(self):
+        if self._decoded:
+            return jsoncodec.dumps(self._json)
+        raw = self._raw
+        if isinstance(raw, bytearray):
+            raw = bytes(raw)
+        return to_text(raw, errors="surrogate_or_strict")
+
+    def _invalid(self):
+        return UnitError(
+            "Unit returned an invalid json: {0}".format(self.data),
+        )
 
     @property
     def json(self):
-        if self._json is None:
+        if not self._decoded:
             try:
-                self._json = json.loads(self.data)
+                self._json = jsoncodec.loads(self._raw)
             except ValueError:
-                raise UnitError(
-                    "Unit returned an invalid json: {0}".format(self.data)
-                )
+                raise self._invalid()
+            self._raw = None
+            self._decoded = True
         return self._json
 
+    def extract(self, path):
+        """
+        Decode only the part of the body that is on the path.
+
+        Returns a (found, value) tuple. The rest of the document is skipped
+        without creating any Python objects for it.
+        """
+        if self._decoded:
+            found, node = _find_node(self._json, path)
+            return found, copy.deepcopy(node)
+
+        raw = self._raw
+        if not isinstance(raw, (bytes, bytearray)):
+            raw = to_bytes(raw, errors="surrogate_or_strict")
+        try:
+            return jsonscan.extract(raw, path)
+        except ValueError:
+            raise self._invalid()
+
+
+# Phases of the module run that the deadline tracks.
+DISCOVERY = "endpoint discovery"
+READS = "configuration reads"
+CHANGES = "configuration changes"
+
+
+class Deadline:
+    """
+    Time budget that all requests of a module run share.
+
+    Clients cap the timeouts of each request with the remaining time and
+    record how much time each phase of the run took, which means that the
+    error can tell where the time went.
+    """
+
+    def __init__(self, budget):
+        if budget <= 0:
+            raise UnitError("Deadline should be positive.")
+        self.budget = budget
+        self.expires = time.time() + budget
+        self.spent = {}
+        self._lock = threading.Lock()
+
+    def spend(self, phase, start):
+        with self._lock:
+            self.spent[phase] = self.spent.get(phase, 0.0) + (
+                time.time() - start
+            )
+
+    def expired(self):
+        return time.time() >= self.expires
+
+    def remaining(self, phase):
+        remaining = self.expires - time.time()
+        if remaining <= 0:
+            raise self.error(phase)
+        return remaining
+
+    def error(self, phase):
+        return UnitError(
+            "Deadline of {0} seconds expired during {1} (time spent: "
+            "{2}).".format(self.budget, phase, ", ".join(
+                "{0} {1:.2f} s".format(p, t)
+                for p, t in sorted(self.spent.items())
+            ))
+        )
+
 
 class Client:
     VALID_PREFIXES = "http://", "https://", "unix:///"
+    PUT_STRATEGIES = "lookup", "walk"
+    # Limits (in bytes or characters of the raw body) for the memoized
+    # responses to GET requests. See _memoized_get for details.
+    MEMO_ENTRY_LIMIT = 64 * 1024
+    MEMO_LIMIT = 1024 * 1024
 
-    def __init__(self, endpoint, username, password, verify, ca_path):
+    def __init__(self, endpoint, username, password, verify, ca_path,
+                 put_strategy="lookup", snapshot=False, metrics=False,
+                 pool=None, connect_timeout=None, read_timeout=None):
         valid_prefix = any(endpoint.startswith(p) for p in self.VALID_PREFIXES)
-        if not valid_prefix:
+        if pool is None and not valid_prefix:
             raise UnitError(
                 "Endpoint should start with one of the following: {0}".format(
                     ", ".join(self.VALID_PREFIXES),
                 )
             )
-
-        if endpoint.startswith("unix://"):
-            self._client = Request(unix_socket=endpoint[7:])
-            self._host = "http://localhost"
-        else:
-            self._client = Request(
-                force_basic_auth=True, validate_certs=verify, ca_path=ca_path,
-                url_username=username, url_password=password,
+        if put_strategy not in self.PUT_STRATEGIES:
+            raise UnitError(
+                "PUT strategy should be one of the following: {0}".format(
+                    ", ".join(self.PUT_STRATEGIES),
+                )
             )
-            self._host = endpoint.rstrip("/")
+        for timeout in (connect_timeout, read_timeout):
+            if timeout is not None and timeout <= 0:
+                raise UnitError("Timeouts should be positive.")
+
+        # Connections are kept alive and shared between all clients that talk
+        # to the same endpoint.
+        self._pool = pool or transport.get_pool(
+            endpoint, username, password, verify, ca_path,
+        )
+
+        # Paths that are known to exist on the server. We use this when
+        # determining where to send PUT requests.
+        self._existing = set()
+        self.put_strategy = put_strategy
+        # Number of PUT round trips that the lookup strategy saved compared
+        # to walking the parents. Can be negative if the lookup did not pay
+        # off.
+        self.saved_round_trips = 0
+
+        # In snapshot mode, we fetch the /config tree once and serve all
+        # subsequent GET requests for its subpaths from memory.
+        self.snapshot = snapshot
+        self._config = None
+
+        # Raw responses to GET requests, keyed by path. We keep them until
+        # we change the path, one of its ancestors, or one of its
+        # descendants. Concurrent GET requests for the same path wait for
+        # the one that is already in flight.
+        self._memo = {}
+        self._memo_size = 0
+        self._in_flight = {}
+        self._memo_lock = threading.Lock()
+        # Incremented on every change, which tells us that the response to
+        # a GET request that was in flight during the change is stale.
+        self._generation = 0
+
+        self.endpoint = endpoint
+        # Unit version as reported by the server. Set by the probe.
+        self.version = None
+
+        self.connect_timeout = connect_timeout or transport.DEFAULT_TIMEOUT
+        self.read_timeout = read_timeout or transport.DEFAULT_TIMEOUT
+        # Deadline of the module run (if any). Set by get_client.
+        self.deadline = None
+
+        # If metrics are enabled, we record every request we make. Modules
+        # return the collected data in the metrics field of the result.
+        self.metrics = metrics
+        self.requests = []
+        # Number of PUT requests that failed because of missing parents.
+        self.put_retries = 0
+        # Time spent finding the endpoint in get_client.
+        self.discovery_time = 0.0
+        self.discovery_cached = False
 
     def request(self, method, path, data=None):
-        url = (
-            self._host + "/" + "/".join(quote(s, safe="") for s in path)
-        ).rstrip("/")
+        url = build_url(path)
+
+        if data is not None and not isinstance(data, transport.FileBody):
+            data = jsoncodec.dumps(data)
+
+        phase = READS if method == "GET" else CHANGES
+        timeouts = self._timeouts(phase)
+        start = time.time()
+        try:
+            status, raw_data = self._pool.request(method, url, data, timeouts)
+        except transport.REQUEST_ERRORS as e:
+            self._record(method, url, None, start, data, b"")
+            self._spend(phase, start)
+            if self.deadline is not None and self.deadline.expired():
+                raise self.deadline.error(phase)
+            raise UnitError("{0} request failed: {1}".format(method, e))
+        self._record(method, url, status, start, data, raw_data)
+        self._spend(phase, start)
+
+        # Non 20x codes are not errors, since client consumers might be able
+        # to work around/expect them.
+        return Response(status, raw_data)
+
+    @contextlib.contextmanager
+    def _changing(self, path):
+        # Changing the path affects the memoized responses for the path
+        # itself, its descendants, and its ancestors. Requests that
+        # complete while the change is in flight might see the old state,
+        # so we drop the responses again once the change is done.
+        self._invalidate(path)
+        try:
+            yield
+        finally:
+            self._invalidate(path)
+
+    def _invalidate(self, path):
+        path = tuple(path)
+        with self._memo_lock:
+            self._generation += 1
+            for cached in list(self._memo):
+                size = min(len(cached), len(path))
+                if cached[:size] == path[:size]:
+                    self._memo_size -= len(self._memo.pop(cached)[1])
 
-        if data is not None:
-            data = json.dumps(data, separators=(",", ":"))
+    def _memoized_get(self, path):
+        path = tuple(path)
+        while True:
+            with self._memo_lock:
+                if path in self._memo:
+                    return Response(*self._memo[path])
+                event = self._in_flight.get(path)
+                if event is None:
+                    event = self._in_flight[path] = threading.Event()
+                    generation = self._generation
+                    break
+            # Same request is already in flight. Once it completes, we
+            # either find its response in the memo or send our own request.
+            event.wait()
 
         try:
-            raw_resp = self._client.open(method=method, url=url, data=data)
-            return Response(raw_resp.getcode(), raw_resp.read())
-        except HTTPError as e:
-            # This is not an error, since client consumers might be able to
-            # work around/expect non 20x codes.
-            return Response(e.code, e.reason)
-        except URLError as e:
-            raise UnitError("{0} request failed: {1}".format(method, e.reason))
-
-    def get(self, path):
-        r = self.request("GET", path)
+            r = self.request("GET", path)
+        finally:
+            with self._memo_lock:
+                del self._in_flight[path]
+            event.set()
+
+        # Responses are decoded again on each hit, which gives callers their
+        # own copy of the data to modify. But keeping the raw body around
+        # means that the data sits in memory twice once the caller decodes
+        # it, so we only memoize small responses and stop when the memo is
+        # full. Large responses (the whole configuration, for example) are
+        # fetched again on each call. Modules read those once anyway, and
+        # the snapshot mode keeps the decoded configuration around.
+        size = len(r._raw)
+        with self._memo_lock:
+            if (
+                r.status in (200, 404) and generation == self._generation
+                and size <= self.MEMO_ENTRY_LIMIT
+                and self._memo_size + size <= self.MEMO_LIMIT
+            ):
+                self._memo[path] = r.status, r._raw
+                self._memo_size += size
+        return r
+
+    def _timeouts(self, phase):
+        # Requests must not wait longer than the deadline allows.
+        connect, read = self.connect_timeout, self.read_timeout
+        if self.deadline is not None:
+            remaining = self.deadline.remaining(phase)
+            connect, read = min(connect, remaining), min(read, remaining)
+        return connect, read
+
+    def _spend(self, phase, start):
+        if self.deadline is not None:
+            self.deadline.spend(phase, start)
+
+    def _record(self, method, url, status, start, data, raw_data):
+        if self.metrics:
+            self.requests.append(dict(
+                method=method,
+                path=url,
+                status=status,
+                latency=time.time() - start,
+                request_bytes=_byte_length(data),
+                response_bytes=_byte_length(raw_data),
+            ))
+
+    def get_metrics(self):
+        return dict(
+            requests=self.requests,
+            request_count=len(self.requests),
+            request_time=sum(r["latency"] for r in self.requests),
+            request_bytes=sum(r["request_bytes"] for r in self.requests),
+            response_bytes=sum(r["response_bytes"] for r in self.requests),
+            put_retries=self.put_retries,
+            saved_round_trips=self.saved_round_trips,
+            discovery_time=self.discovery_time,
+            discovery_cached=self.discovery_cached,
+        )
+
+    def get(self, path, subtree=()):
+        """
+        Fetch the object on the path.
+
+        If subtree is set, only the part of the object on that (relative)
+        path is decoded and returned. Rest of the response is skipped
+        without building Python objects for it, which keeps memory use low
+        when we need a small part of a large response.
+
+        Small responses are memoized until the client changes the path, one
+        of its ancestors, or one of its descendants. Callers are still free
+        to modify the returned data.
+        """
+        if self._in_snapshot(path):
+            return self._get_from_snapshot(tuple(path) + tuple(subtree))
+
+        r = self._memoized_get(path)
         if r.status == 200:
-            return r.json
+            self.mark_existing(path)
+            if not subtree:
+                return r.json
+            found, node = r.extract(subtree)
+            return node if found else {}
         if r.status == 404:
             return {}
 
@@ -84,24 +365,180 @@ class Client:
             "Invalid response: ({0}) - {1}".format(r.status, r.data)
         )
 
+    def _in_snapshot(self, path):
+        return self.snapshot and tuple(path[:1]) == ("config", )
+
+    def _get_from_snapshot(self, path):
+        if self._config is None:
+            r = self.request("GET", ("config", ))
+            if r.status != 200:
+                raise UnitError(
+                    "Invalid response: ({0}) - {1}".format(r.status, r.data)
+                )
+            self._config = r.json
+
+        found, node = _find_node(self._config, path[1:])
+        if not found:
+            return {}
+
+        self.mark_existing(path)
+        # Callers are free to modify the returned data, so we must not hand
+        # out references to our snapshot.
+        return copy.deepcopy(node)
+
+    def _update_snapshot(self, path, data=None, delete=False):
+        if not self._in_snapshot(path) or self._config is None:
+            return
+
+        if not path[1:]:
+            self._config = None if delete else copy.deepcopy(data)
+            return
+
+        # Walk to the parent of the changed node, creating the missing
+        # sections along the way (Client.put did the same on the server).
+        parent = self._config
+        for segment in path[1:-1]:
+            found, node = _find_node(parent, (segment, ))
+            if not found:
+                if delete:
+                    return  # Nothing to delete
+                if not isinstance(parent, dict):
+                    self._config = None
+                    return
+                node = parent[segment] = {}
+            parent = node
+
+        key = path[-1]
+        if isinstance(parent, list) and str(key).isdigit():
+            key = int(key)
+        try:
+            if delete:
+                del parent[key]
+            else:
+                parent[key] = copy.deepcopy(data)
+        except (KeyError, IndexError, TypeError):
+            # Something we do not understand. Drop the snapshot and let the
+            # next GET request fetch a fresh copy.
+            self._config = None
+
     def put(self, path, data):
+        # Any of the parrent sections might be missing at this point, so we
+        # need to find the deepest ancestor that exists and wrap the payload
+        # in the missing sections.
+        #
+        # The lookup strategy sends the PUT request to the full path unless
+        # it already knows that the parent is missing. If the parent turns
+        # out to be missing, a single GET request (or the snapshot) tells
+        # us where to send one wrapped PUT request. The walk strategy sends
+        # PUT requests for each parent in turn until one of them succeeds.
+        path = tuple(path)
+        with self._changing(path):
+            if self.put_strategy == "walk":
+                self._put_walk(path, data)
+            else:
+                self._put_lookup(path, data)
+        self.mark_existing(path)
+        self._update_snapshot(path, data)
+
+    def put_file(self, path, fd):
+        """
+        Replace the object on the path with the JSON document from the file.
+
+        The document is streamed to the Unit as is. Unlike put, this method
+        does not create missing parents of the path.
+        """
+        path = tuple(path)
+        with self._changing(path):
+            self._check_put_response(
+                self.request("PUT", path, transport.FileBody(fd)),
+            )
+        self.mark_existing(path)
+        if self._in_snapshot(path):
+            # We do not keep the document around, so the next GET request
+            # needs to fetch a fresh copy.
+            self._config = None
+
+    def _put_lookup(self, path, data):
+        # Most of the time, the parent of the path already exists, so unless
+        # we know better, we send the PUT request to the full path first.
+        # Only if the parent is missing, we find its deepest existing
+        # ancestor with a single lookup and send one wrapped PUT request.
+        lookups = 0
+        if len(path) > 2 and path[:-1] not in self._existing:
+            if self._in_snapshot(path) and self._config is not None:
+                self._lookup_ancestors(path)
+            else:
+                r = self.request("PUT", path, data)
+                if r.status != 404:
+                    self._check_put_response(r)
+                    return
+                self.put_retries += 1
+                lookups = 1 + self._lookup_ancestors(path[:-1])
+
+        # Root sections (config, certificates, ...) always exist.
+        depth = 1 if len(path) > 1 else 0
+        for i in range(len(path) - 1, 1, -1):
+            if path[:i] in self._existing:
+                depth = i
+                break
+
+        target = min(depth + 1, len(path))
+        for segment in reversed(path[target:]):
+            data = {segment: data}
+
+        puts = 1
+        r = self.request("PUT", path[:target], data)
+        if r.status == 404 and target > 0:
+            # Our view of the configuration was stale. Walk up the parents.
+            self.put_retries += 1
+            puts += self._put_walk(
+                path[:target - 1], {path[target - 1]: data},
+            )
+        else:
+            self._check_put_response(r)
+
+        # Walking the parents would need one PUT request for each missing
+        # section plus the final one that succeeds. Our first attempt at the
+        # full path (if any) is counted among the lookups.
+        walk_puts = len(path) - target + 1
+        self.saved_round_trips += walk_puts - lookups - puts
+
+    def _lookup_ancestors(self, path):
+        if len(path) <= 2 or path[:-1] in self._existing:
+            return 0
+
+        # Snapshot can answer this question without talking to the server,
+        # as long as it is already loaded.
+        lookups = 0 if self._in_snapshot(path) and self._config else 1
+
+        # Only the top-level sections can be missing on a freshly installed
+        # Unit and everything below them can be found in the section itself.
+        node = self.get(path[:2])
+        for i in range(2, len(path) - 1):
+            if not isinstance(node, dict) or path[i] not in node:
+                break
+            node = node[path[i]]
+            self._existing.add(path[:i + 1])
+        return lookups
+
+    def _put_walk(self, path, data):
         # Any of the parrent sections might be missing at this point, so do
         # not fail on 404. Instead, incrementally build the payload until we
         # get a non-404 response back.
         #
         # Example: If the following request
         #
-        #   POST /config/listeners/127.0.0.1:80
+        #   PUT /config/listeners/127.0.0.1:80
         #     {"pass": "applications/test}
         #
         # returns 404, we will retry with the following request:
         #
-        #   POST /config/listeners
+        #   PUT /config/listeners
         #    {"127.0.0.1:80": {"pass": "applications/test}}
         #
         # And if this still fails, we will resort to
         #
-        #   POST /config
+        #   PUT /config
         #    {"listeners": {"127.0.0.1:80": {"pass": "applications/test}}}
         #
         # All this stops when:
@@ -109,18 +546,17 @@ class Client:
         #  1. we get back a 200 status (success), or
         #  2. we get back invalid status (fail), or
         #  3. when we run out of path segments (fail).
+        #
+        # Returns the number of PUT requests we had to make.
 
+        puts = 0
         while True:
             r = self.request("PUT", path, data)
-            if r.status == 200:
-                # Success, we managed to get our data pushed to the server.
-                return
-
+            puts += 1
             if r.status != 404:
-                # Something bad happened. Stop being smart and bail.
-                raise UnitError(
-                    "Invalid response: ({0}) - {1}".format(r.status, r.data)
-                )
+                self._check_put_response(r)
+                return puts
+            self.put_retries += 1
 
             if not path:
                 # We ran out of parent path segments. Bail.
@@ -137,13 +573,83 @@ class Client:
             data = {path[-1]: data}
             path = path[:-1]
 
+    @staticmethod
+    def _check_put_response(r):
+        if r.status != 200:
+            # Something bad happened. Stop being smart and bail.
+            raise UnitError(
+                "Invalid response: ({0}) - {1}".format(r.status, r.data)
+            )
+        # Success, we managed to get our data pushed to the server.
+
+    def mark_existing(self, path):
+        # Record that the path (and with it, all of its ancestors) exists on
+        # the server.
+        for i in range(len(path) + 1):
+            self._existing.add(tuple(path[:i]))
+
+    def _forget(self, path):
+        path = tuple(path)
+        self._existing = set(
+            p for p in self._existing if p[:len(path)] != path
+        )
+
     def delete(self, path):
-        r = self.request("DELETE", path)
+        with self._changing(path):
+            r = self.request("DELETE", path)
         # Yes, unit returns 200 on DELETE ...
         if r.status != 200:
             raise UnitError(
                 "Invalid response: ({0}) - {1}".format(r.status, r.data)
             )
+        self._forget(path)
+        self._update_snapshot(path, delete=True)
+
+    def probe(self, timeout):
+        # We only need to know whether the Unit is listening on the other
+        # side, so we request a tiny part of the configuration instead of the
+        # whole tree (which also contains all certificates).
+        if self.deadline is not None:
+            timeout = min(timeout, self.deadline.remaining(DISCOVERY))
+        start = time.time()
+        try:
+            status, server = self._pool.probe("/config/settings", timeout)
+        except transport.REQUEST_ERRORS:
+            return False
+        finally:
+            self._spend(DISCOVERY, start)
+
+        if status not in (200, 404):
+            return False
+
+        if server and server.startswith("Unit/"):
+            self.version = server[5:]
+        return True
+
+
+def _byte_length(data):
+    # Bodies are sent and received as UTF-8, but the persistent connection
+    # and our own JSON encoder work with text.
+    if data is None:
+        return 0
+    if isinstance(data, (bytes, bytearray, transport.FileBody)):
+        return len(data)
+    return len(to_bytes(data, errors="surrogate_or_strict"))
+
+
+def _find_node(tree, path):
+    node = tree
+    for segment in path:
+        if isinstance(node, dict) and segment in node:
+            node = node[segment]
+        elif (
+                isinstance(node, list) and str(segment).isdigit() and
+                int(segment) < len(node)
+        ):
+            node = node[int(segment)]
+        else:
+            return False, None
+    return True, node
 
 
 _DEFAULT_ENDPOINTS = (
@@ -151,23 +657,291 @@ _DEFAULT_ENDPOINTS = (
     "unix:///var/run/control.unit.sock",  # Debian-derived distros
 )
 
+_PROBE_TIMEOUT = 2
+_DISCOVERY_CACHE = os.path.join(
+    os.path.expanduser("~"), ".ansible", "steampunk.unit.discovery.json",
+)
+_DISCOVERY_TTL = 300
+
+
+def _load_discovery_cache():
+    try:
+        with open(_DISCOVERY_CACHE) as fd:
+            cache = json.load(fd)
+    except (IOError, OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _get_cached_endpoint(endpoints):
+    entry = _load_discovery_cache().get("|".join(endpoints))
+    if not isinstance(entry, dict) or entry.get("expires", 0) < time.time():
+        return None
+
+    endpoint = entry.get("endpoint")
+    if endpoint not in endpoints:
+        return None
+    if endpoint.startswith("unix://") and not os.path.exists(endpoint[7:]):
+        # Unit was stopped or reinstalled since we last checked.
+        return None
+    return entry
+
+
+def _store_cached_endpoint(endpoints, client):
+    cache = _load_discovery_cache()
+    now = time.time()
+    cache = dict(
+        (k, v) for k, v in cache.items()
+        if isinstance(v, dict) and v.get("expires", 0) > now
+    )
+    cache["|".join(endpoints)] = dict(
+        endpoint=client.endpoint,
+        version=client.version,
+        expires=now + _DISCOVERY_TTL,
+    )
+
+    # Cache is just an optimization, so we ignore all errors here. Threads
+    # that work on different endpoints can store their entries at the same
+    # time, so each one needs its own temporary file.
+    tmp_path = "{0}.{1}.{2}".format(
+        _DISCOVERY_CACHE, os.getpid(), threading.current_thread().ident,
+    )
+    try:
+        cache_dir = os.path.dirname(_DISCOVERY_CACHE)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+        with open(tmp_path, "w") as fd:
+            json.dump(cache, fd)
+        os.rename(tmp_path, _DISCOVERY_CACHE)
+    except (IOError, OSError):
+        pass
+
+
+def _map_concurrently(func, items, workers):
+    # Calls func for each item using at most workers threads and returns
+    # the results in the order of items. Exceptions (other than the ones
+    # that func handles itself) are re-raised in the calling thread.
+    if len(items) == 1 or workers == 1:
+        return [func(item) for item in items]
+
+    results = [None] * len(items)
+    pending = list(enumerate(items))
+    failures = []
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                if not pending or failures:
+                    return
+                i, item = pending.pop(0)
+            try:
+                results[i] = func(item)
+            except Exception:
+                failures.append(sys.exc_info())
+                return
+
+    threads = [
+        threading.Thread(target=work)
+        for _i in range(min(workers, len(items)))
+    ]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    for t in threads:
+        t.join()
+
+    if failures:
+        reraise(*failures[0])
+    return results
+
+
+def _probe_all(clients, timeout):
+    # Probe all candidates at the same time, so that a dead endpoint does
+    # not delay the discovery of a live one.
+    return _map_concurrently(
+        lambda c: c.probe(timeout), clients, len(clients),
+    )
+
+
+# Path to the socket of the persistent connection (if any). Modules set this
+# using the use_connection function.
+_SOCKET_PATH = None
+
+
+def use_connection(socket_path):
+    """
+    Send all requests through the persistent connection at socket_path.
+
+    Modules running under the steampunk.unit.unit httpapi plugin receive
+    the path to the ansible-connection socket. If the socket_path is None,
+    clients talk to the Unit directly.
+    """
+    global _SOCKET_PATH
+    _SOCKET_PATH = socket_path
+
+
+# Clients that get_client handed out. We collect metrics from them.
+_CLIENTS = []
+
+
+def add_metrics(result):
+    """
+    Add metrics of all clients with enabled metrics to the module result.
+    """
+    clients = [c for c in _CLIENTS if c.metrics]
+    if not clients:
+        return result
+
+    metrics = clients[0].get_metrics()
+    for client in clients[1:]:
+        for k, v in client.get_metrics().items():
+            if k == "discovery_cached":
+                metrics[k] = metrics[k] and v
+            else:
+                metrics[k] += v
+    result["metrics"] = metrics
+    return result
+
+
+# Provider options that are not passed to the Client constructor.
+_NON_CLIENT_OPTIONS = ("endpoint", "endpoints", "workers", "deadline")
+DEFAULT_WORKERS = 4
+
+
+def run_on_endpoints(run, params, *args):
+    """
+    Call run(params, *args) once for each endpoint in provider.endpoints.
+
+    At most provider.workers endpoints are processed at the same time. The
+    result lists the results of individual runs (with the endpoint and the
+    time it took) in the endpoints field and is marked as failed if any of
+    the runs failed. If the endpoints option is not set or if modules talk
+    to the Unit over the persistent connection, run is called once.
+    """
+    provider = params["provider"]
+    endpoints = provider.get("endpoints")
+    if not endpoints or _SOCKET_PATH:
+        return run(params, *args)
+
+    if provider.get("endpoint"):
+        raise UnitError(
+            "parameters are mutually exclusive: endpoint|endpoints",
+        )
+    workers = provider.get("workers") or DEFAULT_WORKERS
+    if workers < 1:
+        raise UnitError("Number of workers should be positive.")
+
+    def run_one(endpoint):
+        endpoint_params = dict(params, provider=dict(
+            provider, endpoint=endpoint, endpoints=None,
+        ))
+        start = time.time()
+        try:
+            result = dict(run(endpoint_params, *args))
+        except UnitError as e:
+            result = dict(changed=False, failed=True, msg=str(e))
+        result.update(endpoint=endpoint, time=time.time() - start)
+        return result
+
+    unique = []
+    for endpoint in endpoints:
+        if endpoint not in unique:
+            unique.append(endpoint)
+    results = _map_concurrently(run_one, unique, workers)
+
+    result = dict(
+        changed=any(r["changed"] for r in results), endpoints=results,
+    )
+    failed = [r for r in results if r.get("failed")]
+    if failed:
+        result.update(
+            failed=True,
+            msg="Failed on {0} of {1} endpoints: {2}".format(
+                len(failed), len(results), "; ".join(
+                    "{0}: {1}".format(r["endpoint"], r["msg"])
+                    for r in failed
+                ),
+            ),
+        )
+    return result
+
+
+# Deadline of the module run. The first get_client call starts it and all
+# clients (including the ones that run_on_endpoints creates) share it.
+_DEADLINE = None
+_DEADLINE_LOCK = threading.Lock()
+
+
+def _get_deadline(budget):
+    global _DEADLINE
+
+    if not budget:
+        return None
+    with _DEADLINE_LOCK:
+        if _DEADLINE is None:
+            _DEADLINE = Deadline(budget)
+        return _DEADLINE
+
 
 def get_client(provider):
+    start = time.time()
+    deadline = _get_deadline(provider.get("deadline"))
+    client = _discover_client(provider, deadline)
+    client.discovery_time = time.time() - start
+    _CLIENTS.append(client)
+    return client
+
+
+def _discover_client(provider, deadline):
     # We need to process endpoint a bit differently
-    params = dict((k, v) for k, v in provider.items() if k != "endpoint")
+    params = dict(
+        (k, v) for k, v in provider.items() if k not in _NON_CLIENT_OPTIONS
+    )
+
+    if _SOCKET_PATH:
+        # Imported here because the connection machinery is costly to load
+        # and most of the time, we talk to the Unit directly.
+        from . import httpapi
+
+        # Persistent connection knows where the Unit is, and it is alive for
+        # as long as the connection is.
+        client = Client(
+            "httpapi", None, None, True, None,
+            snapshot=provider.get("snapshot", False),
+            metrics=provider.get("metrics", False),
+            pool=httpapi.ConnectionTransport(_SOCKET_PATH),
+        )
+        client.deadline = deadline
+        return client
 
     if provider["endpoint"]:
         endpoints = (provider["endpoint"], )
     else:
         endpoints = _DEFAULT_ENDPOINTS
 
-    for endpoint in endpoints:
-        client = Client(endpoint, **params)
-        try:
-            client.get(())
+    cached = _get_cached_endpoint(endpoints)
+    if cached:
+        client = Client(cached["endpoint"], **params)
+        client.version = cached["version"]
+        client.discovery_cached = True
+        client.deadline = deadline
+        return client
+
+    clients = [Client(endpoint, **params) for endpoint in endpoints]
+    for client in clients:
+        client.deadline = deadline
+    # Explicit connect timeout also applies to probes, which makes it
+    # possible to skip dead endpoints faster.
+    timeout = provider.get("connect_timeout") or _PROBE_TIMEOUT
+    # Candidates are ordered by preference, so we pick the first live one.
+    for client, alive in zip(clients, _probe_all(clients, timeout)):
+        if alive:
+            _store_cached_endpoint(endpoints, client)
             return client
-        except UnitError:
-            pass  # Try next available endpoint
+
+    if deadline is not None and deadline.expired():
+        raise deadline.error(DISCOVERY)
 
     raise UnitError(
         "No valid endpoints found amongst the candidates: {0}".format(
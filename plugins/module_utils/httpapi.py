@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.module_utils.connection import Connection, ConnectionError
+
+from ansible.module_utils._text import to_text
+
+from .transport import FileBody, ProtocolError
+
+
+class ConnectionTransport:
+    """
+    Transport that sends requests through the persistent connection.
+
+    It implements the same interface as the transport.ConnectionPool, which
+    means that the client does not care which one it uses. Actual requests
+    are made by the steampunk.unit.unit httpapi plugin.
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self._connection = Connection(socket_path)
+
+    def _send(self, method, path, body):
+        try:
+            return self._connection.send_request(method, path, body)
+        except ConnectionError as e:
+            raise ProtocolError(str(e))
+
+    def request(self, method, path, body=None, timeouts=None):
+        # Persistent connection has its own timeouts.
+        if isinstance(body, FileBody):
+            # Persistent connection only accepts the body as a string.
+            body = to_text(body.read(), errors="surrogate_or_strict")
+        status, data, _server = self._send(method, path, body)
+        return status, data
+
+    def probe(self, path, timeout):
+        # Persistent connection has its own timeouts.
+        status, _data, server = self._send("GET", path, None)
+        return status, server
+
+    def close(self):
+        # Connection is owned by the ansible-connection process.
+        pass
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+# Encoding and decoding of large configurations is the main CPU cost of a
+# module run. If orjson is installed on the target, we use it, but only
+# where its results are guaranteed to be the same as the results of the
+# json module from the standard library, since we compare, measure, and
+# checksum encoded payloads:
+#
+#  * orjson does not escape non-ASCII characters and formats floats and
+#    special float values differently, so we use its output only if none of
+#    those appear in it;
+#  * orjson decodes integers that do not fit into 64 bits into floats, so
+#    we do not use it for documents that might contain them. Unsigned
+#    integers have 20 digits, but signed ones only have 19, which means that
+#    negative integers with 19 digits can already be out of range.
+#
+# In all other cases (including errors), we fall back to the json module.
+
+import json
+
+from ansible.module_utils._text import to_text
+
+try:
+    import orjson
+    BACKEND = "orjson"
+except ImportError:
+    orjson = None
+    BACKEND = "json"
+
+# Checks below only use substring searches, since anything more complex
+# quickly costs more than the faster codec saves. Matches in strings are
+# harmless, since we just fall back.
+_DIGITS = bytes.maketrans(b"0123456789", b"0000000000") if orjson else None
+# Floats that orjson formats differently always contain one of these.
+_SMALL_FLOAT = b"0.0000"
+_EXPONENT = b"0e"
+# orjson encodes special floats as null.
+_NULLS = (b":null", b",null", b"[null")
+_BIG_INTEGERS = (b"0" * 20, b"-" + b"0" * 19)
+
+
+def _safe_output(data):
+    if b"\x7f" in data or _SMALL_FLOAT in data:
+        return False
+    if data == b"null" or any(n in data for n in _NULLS):
+        return False
+    return _EXPONENT not in data.translate(_DIGITS)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _loads(data):
+    try:
+        return json.loads(data)
+    except TypeError:
+        # Older pythons cannot decode binary data directly.
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        return json.loads(to_text(data, errors="surrogate_or_strict"))
+
+
+def _fast_dumps(value):
+    try:
+        data = orjson.dumps(value)
+    except (TypeError, ValueError):
+        return None
+    try:
+        # Fails if orjson did not escape non-ASCII characters. We cannot use
+        # bytes.isascii, since it is not available before Python 3.7.
+        text = data.decode("ascii")
+    except UnicodeDecodeError:
+        return None
+    if not _safe_output(data):
+        return None
+    return text
+
+
+def _fast_loads(data):
+    # Returns a (decoded, value) tuple, since None is a valid document.
+    encoded = data.encode("utf-8") if isinstance(data, str) else data
+    digits = encoded.translate(_DIGITS)
+    if any(i in digits for i in _BIG_INTEGERS):
+        return False, None
+    try:
+        return True, orjson.loads(data)
+    except ValueError:
+        # Let the json module report the error.
+        return False, None
+
+
+def dumps(value):
+    """
+    Encode the value into compact JSON text.
+
+    Result is the same as the result of json.dumps with the most compact
+    separators.
+    """
+    if orjson is not None:
+        data = _fast_dumps(value)
+        if data is not None:
+            return data
+    return _dumps(value)
+
+
+def loads(data):
+    """
+    Decode JSON document from text, bytes, or bytearray.
+
+    Result is the same as the result of json.loads, and so are the errors.
+    """
+    if orjson is not None:
+        decoded, value = _fast_loads(data)
+        if decoded:
+            return value
+    return _loads(data)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+# Decoding a large JSON document just to look at a small part of it creates
+# Python objects for everything else as well. Functions in this module find
+# the part that we are interested in by scanning the encoded document and
+# decode only that part. Regular expressions skip strings and numbers, so
+# we only loop in Python once per skipped container. This is slower than
+# decoding the whole document, but needs next to no memory.
+
+import json
+import re
+
+from ansible.module_utils._text import to_bytes
+
+_WHITESPACE = re.compile(br"[ \t\n\r]*")
+_STRING = re.compile(br'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_SCALAR = re.compile(br"[^,:}\]\s]+")
+# Skips strings and everything else that is not a bracket and captures the
+# next bracket. Runs of other characters and strings always alternate, which
+# means that there is only one way to match the input and the time needed
+# to reject a truncated document stays linear.
+_NEXT_BRACKET = re.compile(
+    br'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*([{}\[\]])',
+    re.DOTALL,
+)
+
+_OPEN = (b"{", b"[")
+
+
+def _skip_ws(data, pos):
+    return _WHITESPACE.match(data, pos).end()
+
+
+def _char(data, pos):
+    # Slicing works the same for bytes and bytearray on all pythons.
+    return data[pos:pos + 1]
+
+
+def _expect(data, pos, char):
+    pos = _skip_ws(data, pos)
+    if _char(data, pos) != char:
+        raise ValueError("Expecting {0!r} at position {1}".format(char, pos))
+    return pos + 1
+
+
+def _skip_string(data, pos):
+    match = _STRING.match(data, pos)
+    if not match:
+        raise ValueError("Unterminated string at position {0}".format(pos))
+    return match.end()
+
+
+def _skip_value(data, pos):
+    # Returns position right after the value that starts at pos.
+    if _char(data, pos) == b'"':
+        return _skip_string(data, pos)
+
+    if _char(data, pos) not in _OPEN:
+        match = _SCALAR.match(data, pos)
+        if not match:
+            raise ValueError("Expecting value at position {0}".format(pos))
+        return match.end()
+
+    depth = 0
+    while True:
+        match = _NEXT_BRACKET.match(data, pos)
+        if not match:
+            raise ValueError("Unterminated container")
+        depth += 1 if match.group(1) in _OPEN else -1
+        pos = match.end()
+        if depth == 0:
+            return pos
+
+
+def _object_member(data, pos, key):
+    # Returns position of the value with the key or None if key is missing.
+    pos = _skip_ws(data, _expect(data, pos, b"{"))
+    if _char(data, pos) == b"}":
+        return None
+
+    encoded_key = to_bytes(key, errors="surrogate_or_strict")
+    while True:
+        pos = _skip_ws(data, pos)
+        end = _skip_string(data, pos)
+        name = data[pos + 1:end - 1]
+        if b"\\" in name:
+            # Only keys with escape sequences need proper decoding.
+            name = to_bytes(json.loads(bytes(data[pos:end]).decode("utf-8")))
+        pos = _skip_ws(data, _expect(data, end, b":"))
+        if name == encoded_key:
+            return pos
+
+        pos = _skip_ws(data, _skip_value(data, pos))
+        if _char(data, pos) == b"}":
+            return None
+        pos = _expect(data, pos, b",")
+
+
+def _array_element(data, pos, index):
+    pos = _skip_ws(data, _expect(data, pos, b"["))
+    if _char(data, pos) == b"]":
+        return None
+
+    for _i in range(index):
+        pos = _skip_ws(data, _skip_value(data, pos))
+        if _char(data, pos) == b"]":
+            return None
+        pos = _skip_ws(data, _expect(data, pos, b","))
+    return pos
+
+
+def extract(data, path):
+    """
+    Decode the part of the encoded JSON document that is on the path.
+
+    Path is a sequence of object keys and array indices (as strings or
+    integers), same as the paths that the client uses. Returns a (found,
+    value) tuple. Raises ValueError if the part of the document that we
+    need to scan is not valid JSON. The rest of the document is not checked.
+    """
+    pos = _skip_ws(data, 0)
+    for segment in path:
+        char = _char(data, pos)
+        if not char:
+            raise ValueError("Expecting value at position {0}".format(pos))
+        if char == b"{":
+            pos = _object_member(data, pos, segment)
+        elif char == b"[" and str(segment).isdigit():
+            pos = _array_element(data, pos, int(segment))
+        else:
+            return False, None
+
+        if pos is None:
+            return False, None
+
+    end = _skip_value(data, pos)
+    return True, json.loads(bytes(data[pos:end]).decode("utf-8"))
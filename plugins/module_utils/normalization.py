@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+# Unit accepts many configuration options in more than one form (a single
+# string or a list with one string, a number of processes or an object with
+# process limits, ...). Functions in this module convert configuration
+# objects into a canonical form, which makes it possible to compare the
+# current configuration with the desired one without reporting changes
+# that would not change anything in Unit.
+
+# Match options that accept a string or a list of strings.
+_SIMPLE_MATCHES = ("destination", "host", "method", "scheme", "source", "uri")
+# Match options that accept an object or a list of objects.
+_COMPOUND_MATCHES = ("arguments", "cookies", "headers")
+
+# Default process limits (https://unit.nginx.org/configuration/#app-process).
+_DEFAULT_IDLE_TIMEOUT = 15
+
+
+def _compact(value):
+    # None values and empty objects are the same as missing options.
+    if isinstance(value, dict):
+        compacted = dict((k, _compact(v)) for k, v in value.items())
+        return dict(
+            (k, v) for k, v in compacted.items() if v is not None and v != {}
+        )
+    if isinstance(value, list):
+        return [_compact(v) for v in value]
+    return value
+
+
+def _unwrap(value):
+    if isinstance(value, list) and len(value) == 1:
+        return value[0]
+    return value
+
+
+def _processes(processes):
+    if processes is None:
+        processes = 1
+    if isinstance(processes, int):
+        # Static number of processes.
+        return dict(max=processes, spare=processes)
+
+    processes = dict(
+        max=processes.get("max", 1),
+        spare=processes.get("spare", 0),
+        idle_timeout=processes.get("idle_timeout", _DEFAULT_IDLE_TIMEOUT),
+    )
+    if processes["spare"] == processes["max"]:
+        # Processes are never idle, so timeout is irrelevant.
+        del processes["idle_timeout"]
+    return processes
+
+
+def application(app):
+    if not app:
+        return {}
+
+    processes = app.get("processes")
+    if isinstance(processes, dict):
+        # Empty object is not the same as missing processes option.
+        processes = _compact(processes)
+
+    app = _compact(app)
+    app["processes"] = _processes(processes)
+    return app
+
+
+def applications(applications):
+    return dict(
+        (n, application(a)) for n, a in (applications or {}).items()
+    )
+
+
+def listener(listener):
+    if not listener:
+        return {}
+
+    listener = _compact(listener)
+    tls = listener.get("tls")
+    if tls and "certificate" in tls:
+        tls["certificate"] = _unwrap(tls["certificate"])
+    return listener
+
+
+def listeners(listeners):
+    return dict((p, listener(l)) for p, l in (listeners or {}).items())
+
+
+def _match(match):
+    for k in _SIMPLE_MATCHES + _COMPOUND_MATCHES:
+        if k in match:
+            match[k] = _unwrap(match[k])
+    return match
+
+
+def _action(action):
+    if "share" in action:
+        action["share"] = _unwrap(action["share"])
+    if "fallback" in action:
+        action["fallback"] = _action(action["fallback"])
+    return action
+
+
+def _step(step):
+    if "match" in step:
+        step["match"] = _match(step["match"])
+    if "action" in step:
+        step["action"] = _action(step["action"])
+    return step
+
+
+def route(steps):
+    if not steps:
+        return []
+    return [_step(s) for s in _compact(steps)]
+
+
+def config(config):
+    if not config:
+        return {}
+
+    config = _compact(config)
+    if "applications" in config:
+        config["applications"] = applications(config["applications"])
+    if "listeners" in config:
+        config["listeners"] = listeners(config["listeners"])
+    if isinstance(config.get("routes"), dict):
+        config["routes"] = dict(
+            (n, route(s)) for n, s in config["routes"].items()
+        )
+    elif "routes" in config:
+        config["routes"] = route(config["routes"])
+    return config
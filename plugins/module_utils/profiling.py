@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import time
+
+# Profiling is controlled by environment variables, which means that it can
+# be enabled for any task without changing its parameters:
+#
+#   UNIT_PROFILE=1            return the profile in the module result
+#   UNIT_PROFILE=/some/path   write the profile to a file on the target
+#   UNIT_PROFILE=0            profiling is disabled (same as unset)
+#   UNIT_PROFILE_TOP=N        number of entries to report (default: 20)
+PROFILE_VAR = "UNIT_PROFILE"
+PROFILE_TOP_VAR = "UNIT_PROFILE_TOP"
+DEFAULT_TOP = 20
+
+_ENABLED_VALUES = ("1", "true", "yes", "on")
+_DISABLED_VALUES = ("", "0", "false", "no", "off")
+
+# Active profiling session (profiler, start time).
+_session = None
+
+
+def _enabled():
+    value = os.environ.get(PROFILE_VAR, "").strip().lower()
+    return value not in _DISABLED_VALUES
+
+
+def start():
+    """
+    Start profiling if the UNIT_PROFILE environment variable is set.
+
+    Modules call this at the very beginning of the main function, which
+    means that the argument validation is part of the profile.
+    """
+    global _session
+
+    if not _enabled() or _session is not None:
+        return
+
+    # Profilers are only imported when they are needed.
+    import cProfile
+    try:
+        import tracemalloc
+        tracemalloc.start()
+    except ImportError:  # Python 2
+        pass
+
+    profiler = cProfile.Profile()
+    _session = profiler, time.time()
+    profiler.enable()
+
+
+def _functions(profiler, top):
+    import pstats
+
+    stats = pstats.Stats(profiler).stats
+    entries = sorted(stats.items(), key=lambda e: e[1][3], reverse=True)
+    return [
+        dict(
+            function="{0}:{1}({2})".format(*key),
+            calls=calls,
+            total_time=total_time,
+            cumulative_time=cumulative_time,
+        )
+        for key, (_cc, calls, total_time, cumulative_time, _callers)
+        in entries[:top]
+    ]
+
+
+def _allocations(top):
+    try:
+        import tracemalloc
+    except ImportError:  # Python 2
+        return None, None
+
+    if not tracemalloc.is_tracing():
+        return None, None
+
+    snapshot = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return [
+        dict(
+            location="{0}:{1}".format(
+                stat.traceback[0].filename, stat.traceback[0].lineno,
+            ),
+            size=stat.size,
+            count=stat.count,
+        )
+        for stat in snapshot.statistics("lineno")[:top]
+    ], peak
+
+
+def stop():
+    """
+    Stop profiling and return the collected data (or None if profiling is
+    not enabled).
+    """
+    global _session
+
+    if _session is None:
+        return None
+
+    profiler, start_time = _session
+    profiler.disable()
+    _session = None
+
+    try:
+        top = int(os.environ.get(PROFILE_TOP_VAR, DEFAULT_TOP))
+    except ValueError:
+        top = DEFAULT_TOP
+
+    allocations, peak = _allocations(top)
+    return dict(
+        wall_time=time.time() - start_time,
+        functions=_functions(profiler, top),
+        allocations=allocations,
+        peak_memory=peak,
+    )
+
+
+def report(result):
+    """
+    Add profile to the module result or write it to the requested file.
+    """
+    profile = stop()
+    if profile is None:
+        return result
+
+    destination = os.environ[PROFILE_VAR]
+    if destination.strip().lower() in _ENABLED_VALUES:
+        result["profile"] = profile
+        return result
+
+    try:
+        with open(destination, "w") as fd:
+            json.dump(profile, fd, indent=2)
+        result["profile"] = dict(path=destination)
+    except (IOError, OSError) as e:
+        # Profiling must not break the module.
+        result["profile"] = dict(path=destination, error=str(e))
+    return result
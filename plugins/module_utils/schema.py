@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+# AnsibleModule validates nested options by walking the argument spec for
+# each element of the input, copying parameters and recording context on the
+# way. This is fine for a handful of options but becomes the dominant cost
+# when a module receives thousands of route steps. Functions in this module
+# compile an option spec into a tree of small validators once and then check
+# and convert the input in a single pass.
+#
+# Validators use the same type checkers and produce the same results and
+# error messages as AnsibleModule: options are converted in spec order,
+# choices are checked after types, nested options after that, and missing
+# options are set to None. The first error is reported; unsupported
+# parameters are only reported if there are no other errors. AnsibleModule
+# also checks the shape of all nested options before anything else, which
+# we only repeat once we know that the input is invalid.
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+from ansible.module_utils.six import string_types
+from ansible.module_utils.common.validation import (
+    check_type_bool, check_type_dict, check_type_float, check_type_int,
+    check_type_list, check_type_path, check_type_raw, check_type_str,
+)
+
+from .errors import UnitError
+
+_CHECKERS = dict(
+    bool=check_type_bool,
+    dict=check_type_dict,
+    float=check_type_float,
+    int=check_type_int,
+    list=check_type_list,
+    path=check_type_path,
+    raw=check_type_raw,
+    str=check_type_str,
+)
+
+
+def _found_in(context, quote=False):
+    if not context:
+        return ""
+    template = " found in '{0}'" if quote else " found in {0}"
+    return template.format(" -> ".join(context))
+
+
+def _compile_field(name, spec, context):
+    wanted = spec.get("type", "str")
+    check = _CHECKERS[wanted]
+    required = spec.get("required", False)
+    elements = spec.get("elements")
+    check_element = _CHECKERS[elements] if elements else None
+    choices = spec.get("choices")
+
+    def convert(value):
+        if value is None and not required:
+            return None
+        try:
+            value = check(value)
+        except (TypeError, ValueError) as e:
+            raise UnitError(
+                "argument '{0}' is of type {1}{2} and we were unable to "
+                "convert to {3}: {4}".format(
+                    name, type(value),
+                    _found_in(context, True) + ("." if context else ""),
+                    wanted, e,
+                )
+            )
+        if check_element is None:
+            return value
+
+        result = []
+        for item in value:
+            try:
+                result.append(check_element(item))
+            except (TypeError, ValueError) as e:
+                raise UnitError(
+                    "Elements value for option '{0}'{1} is of type {2} and "
+                    "we were unable to convert to {3}: {4}".format(
+                        name, _found_in(context, True), type(item),
+                        elements, e,
+                    )
+                )
+        return result
+
+    def check_choices(value):
+        if choices is None or value in choices:
+            return
+        raise UnitError("value of {0} must be one of: {1}, got: {2}{3}".format(
+            name, ", ".join(str(c) for c in choices), value,
+            _found_in(context),
+        ))
+
+    nested = shape = None
+    if "options" in spec and (wanted == "dict" or elements == "dict"):
+        nested, shape = _compile_options(spec["options"], context + [name])
+
+    return convert, check_choices, nested, shape
+
+
+def _compile_shape(fields):
+    # Mirrors the no_log pass of the AnsibleModule, which converts all nested
+    # options into dictionaries before running any other check.
+    nested = [
+        (name, wanted, shape)
+        for name, wanted, (_c, _cc, _n, shape) in fields if shape is not None
+    ]
+
+    def check_shape(params):
+        for name, wanted, shape in nested:
+            value = params.get(name)
+            if value is None:
+                continue
+            if not isinstance(value, list):
+                value = [value]
+            for item in value:
+                if isinstance(item, string_types):
+                    try:
+                        item = check_type_dict(item)
+                    except (TypeError, ValueError) as e:
+                        raise UnitError(str(e))
+                if not isinstance(item, Mapping):
+                    raise UnitError(
+                        "Value '{1}' in the sub parameter field '{0}' must "
+                        "by a {2}, not '{3}'".format(
+                            name, item, wanted, item.__class__.__name__,
+                        )
+                    )
+                shape(item)
+
+    return check_shape
+
+
+def _compile_options(options, context):
+    names = list(options)
+    supported = sorted(names)
+    required = sorted(n for n in names if options[n].get("required"))
+    defaults = dict((n, options[n].get("default")) for n in names)
+    fields = [(n, _compile_field(n, options[n], context)) for n in names]
+    check_shape = _compile_shape([
+        (n, options[n].get("type", "str"), f) for n, f in fields
+    ])
+
+    def validate(params, unsupported):
+        if not isinstance(params, dict):
+            raise UnitError(
+                "value of '{0}' must be of type dict or list of "
+                "dicts".format(context[-1])
+            )
+
+        for key in params:
+            if key not in defaults:
+                unsupported[".".join(context + [key])] = supported
+
+        missing = [n for n in required if n not in params]
+        if missing:
+            raise UnitError("missing required arguments: {0}{1}".format(
+                ", ".join(missing), _found_in(context),
+            ))
+
+        result = {}
+        for name, (convert, _check_choices, _nested, _shape) in fields:
+            if name in params:
+                result[name] = convert(params[name])
+            else:
+                result[name] = defaults[name]
+
+        for name, (_convert, check_choices, _nested, _shape) in fields:
+            if name in params:
+                check_choices(result[name])
+
+        for name, (_convert, _check_choices, nested, _shape) in fields:
+            value = result[name]
+            if nested is None or value is None:
+                continue
+            if isinstance(value, list):
+                result[name] = [nested(v, unsupported) for v in value]
+            else:
+                result[name] = nested(value, unsupported)
+
+        return result
+
+    return validate, check_shape
+
+
+def compile_option(name, spec, module_name):
+    """
+    Compile validator for a single top-level module option.
+
+    Returned function accepts the raw value of the option and returns the
+    value that AnsibleModule would place into module parameters. Invalid
+    values raise UnitError with the message that AnsibleModule would report.
+    """
+    field = _compile_field(name, spec, [])
+    convert, check_choices, nested, _shape = field
+    check_shape = _compile_shape([(name, spec.get("type", "str"), field)])
+
+    def validate(value):
+        try:
+            return _validate(value)
+        except UnitError:
+            check_shape({name: value})
+            raise
+
+    def _validate(value):
+        value = convert(value)
+        if value is None:
+            return None
+        check_choices(value)
+        if nested is None:
+            return value
+
+        unsupported = {}
+        if isinstance(value, list):
+            value = [nested(v, unsupported) for v in value]
+        else:
+            value = nested(value, unsupported)
+
+        if unsupported:
+            paths = sorted(unsupported)
+            raise UnitError(
+                "Unsupported parameters for ({0}) module: {1}. Supported "
+                "parameters include: {2}.".format(
+                    module_name, ", ".join(paths),
+                    ", ".join(unsupported[paths[-1]]),
+                )
+            )
+        return value
+
+    return validate
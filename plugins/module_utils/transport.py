@@ -0,0 +1,538 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import base64
+import errno
+import socket
+import threading
+
+from ansible.module_utils.six.moves.urllib.parse import urlparse
+
+
+DEFAULT_TIMEOUT = 10
+
+
+class ProtocolError(socket.error):
+    """ Server sent something that is not a valid HTTP/1.1 response. """
+
+
+class ConnectionDropped(ProtocolError):
+    """ Server closed the connection before sending the response. """
+
+
+# Errors that can be raised while talking to the Unit. Client converts them
+# into UnitError.
+REQUEST_ERRORS = (socket.error, )
+
+# Errors that indicate that the server closed an idle keep-alive connection
+# before we managed to reuse it. We only retry requests on those.
+_STALE_ERRNOS = frozenset((
+    errno.EPIPE, errno.ECONNRESET, errno.ECONNABORTED, errno.ESHUTDOWN,
+))
+
+_CHUNK_SIZE = 65536
+
+
+def _is_stale(error):
+    if isinstance(error, ConnectionDropped):
+        return True
+    return isinstance(error, socket.error) and error.errno in _STALE_ERRNOS
+
+
+class FileBody:
+    """
+    Request body that is streamed from an open file in chunks.
+
+    Transports send the content of the file as is, without loading it into
+    memory. Streaming always starts at the beginning of the file, which
+    means that the same body can be sent more than once.
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        fd.seek(0, 2)
+        self.length = fd.tell()
+
+    def __len__(self):
+        return self.length
+
+    def chunks(self):
+        self.fd.seek(0)
+        while True:
+            data = self.fd.read(_CHUNK_SIZE)
+            if not data:
+                return
+            yield data
+
+    def read(self):
+        self.fd.seek(0)
+        return self.fd.read()
+
+
+class Response:
+    def __init__(self, status, headers, body, will_close):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.will_close = will_close
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    def read(self):
+        return self.body
+
+
+class HTTPConnection:
+    """
+    Minimal HTTP/1.1 client connection over a plain socket.
+
+    Unit control API only needs a small subset of HTTP (JSON requests with
+    Content-Length and responses with Content-Length or chunked bodies), so
+    we speak it ourselves instead of importing http.client and its email
+    parsing machinery.
+
+    Address is either a path to the unix socket or a (host, port) tuple.
+    Timeout applies to connecting and read_timeout to all subsequent socket
+    operations.
+    """
+
+    def __init__(self, address, timeout=DEFAULT_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self.read_timeout = timeout
+        self.sock = None
+        self._buffer = b""
+
+    def set_timeouts(self, connect, read):
+        self.timeout = connect
+        self.read_timeout = read
+        if self.sock:
+            self.sock.settimeout(read)
+
+    @property
+    def host(self):
+        if isinstance(self.address, tuple):
+            return "{0}:{1}".format(*self.address)
+        return "localhost"
+
+    def connect(self):
+        if isinstance(self.address, tuple):
+            sock = socket.create_connection(self.address, self.timeout)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.address)
+            except socket.error:
+                sock.close()
+                raise
+        sock.settimeout(self.read_timeout)
+        self.sock = sock
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+        self.sock = None
+        self._buffer = b""
+
+    def request(self, method, url, body=None, headers=None):
+        if self.sock is None:
+            self.connect()
+
+        lines = ["{0} {1} HTTP/1.1".format(method, url), "Host: " + self.host]
+        lines.extend(
+            "{0}: {1}".format(k, v) for k, v in (headers or {}).items()
+        )
+        if isinstance(body, FileBody):
+            lines.append("Content-Length: {0}".format(len(body)))
+            head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+            self.sock.sendall(head)
+            for chunk in body.chunks():
+                self.sock.sendall(chunk)
+            return
+
+        if body is not None:
+            body = body.encode("utf-8")
+            lines.append("Content-Length: {0}".format(len(body)))
+
+        data = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        self.sock.sendall(data + (body or b""))
+
+    def _fill(self):
+        data = self.sock.recv(_CHUNK_SIZE)
+        if not data:
+            raise ProtocolError("Connection closed while reading response")
+        self._buffer += data
+
+    def _readline(self):
+        while True:
+            pos = self._buffer.find(b"\r\n")
+            if pos >= 0:
+                line, self._buffer = self._buffer[:pos], self._buffer[pos + 2:]
+                return line
+            self._fill()
+
+    def _read(self, size):
+        if len(self._buffer) >= size:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+            return data
+
+        # Body is received straight into its final buffer. Appending parts
+        # to a bytes object would copy everything received so far on each
+        # append, and joining a list of parts would hold the body twice.
+        data = bytearray(size)
+        view = memoryview(data)
+        received = len(self._buffer)
+        view[:received] = self._buffer
+        self._buffer = b""
+        while received < size:
+            count = self.sock.recv_into(view[received:])
+            if not count:
+                raise ProtocolError("Connection closed while reading response")
+            received += count
+        return data
+
+    def _read_until_close(self):
+        data = bytearray(self._buffer)
+        self._buffer = b""
+        while True:
+            part = self.sock.recv(_CHUNK_SIZE)
+            if not part:
+                return data
+            data += part
+
+    def _read_chunked(self):
+        data = bytearray()
+        while True:
+            size = int(self._readline().split(b";", 1)[0], 16)
+            if size == 0:
+                break
+            data += self._read(size)
+            self._readline()
+        # Skip trailers.
+        while self._readline():
+            pass
+        return data
+
+    def getresponse(self):
+        try:
+            line = self._readline()
+        except ProtocolError:
+            raise ConnectionDropped(
+                "Remote end closed connection without response",
+            )
+
+        parts = line.decode("latin-1").split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise ProtocolError("Invalid status line: {0!r}".format(line))
+        try:
+            status = int(parts[1])
+        except ValueError:
+            raise ProtocolError("Invalid status line: {0!r}".format(line))
+
+        headers = {}
+        while True:
+            line = self._readline()
+            if not line:
+                break
+            name, _sep, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        will_close = (
+            connection == "close" or
+            (parts[0] == "HTTP/1.0" and connection != "keep-alive")
+        )
+
+        if status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = self._read_chunked()
+        elif "content-length" in headers:
+            body = self._read(int(headers["content-length"]))
+        else:
+            body = self._read_until_close()
+            will_close = True
+
+        return Response(status, headers, body, will_close)
+
+
+def UnixHTTPConnection(path, timeout=DEFAULT_TIMEOUT):
+    return HTTPConnection(path, timeout)
+
+
+def _https_connection_class():
+    # TLS is rare when talking to the Unit and ssl and http.client are
+    # costly to import, which is why we only load them when needed.
+    from ansible.module_utils.six.moves import http_client
+
+    class HTTPSConnection(http_client.HTTPSConnection):
+        def __init__(self, host, port, tls, timeout=DEFAULT_TIMEOUT):
+            http_client.HTTPSConnection.__init__(
+                self, host, port, timeout=timeout, context=tls.context,
+            )
+            self._tls = tls
+            self.read_timeout = timeout
+
+        def set_timeouts(self, connect, read):
+            self.timeout = connect
+            self.read_timeout = read
+            if self.sock:
+                self.sock.settimeout(read)
+
+        def connect(self):
+            # Timeout applies to the TLS handshake as well.
+            session = self._tls.session
+            if session is None:
+                http_client.HTTPSConnection.connect(self)
+            else:
+                # Same as HTTPSConnection.connect (minus the proxy tunnel that
+                # we never use), but with an abbreviated handshake.
+                http_client.HTTPConnection.connect(self)
+                self.sock = self._context.wrap_socket(
+                    self.sock, server_hostname=self.host, session=session,
+                )
+            self.sock.settimeout(self.read_timeout)
+
+        def request(self, method, url, body=None, headers=None):
+            headers = dict(headers or {})
+            if isinstance(body, FileBody):
+                # http.client sends file objects in blocks by itself.
+                headers["Content-Length"] = str(len(body))
+                body.fd.seek(0)
+                body = body.fd
+            http_client.HTTPSConnection.request(
+                self, method, url, body, headers,
+            )
+
+        def getresponse(self):
+            sock = self.sock
+            try:
+                resp = http_client.HTTPSConnection.getresponse(self)
+                # TLS 1.3 servers send session tickets after the handshake,
+                # so we wait for the response. Reading the body can close
+                # the socket, which is why we do not wait for the body.
+                self._tls.remember(sock)
+                body = resp.read()
+            except http_client.BadStatusLine as e:
+                # This also covers RemoteDisconnected on python 3.
+                raise ConnectionDropped(str(e))
+            except http_client.HTTPException as e:
+                raise ProtocolError(str(e))
+
+            headers = dict((k.lower(), v) for k, v in resp.getheaders())
+            return Response(resp.status, headers, body, resp.will_close)
+
+    return HTTPSConnection
+
+
+class ConnectionPool:
+    """
+    Small pool of HTTP/1.1 keep-alive connections to a single endpoint.
+
+    Connections are handed out one request at a time and returned to the
+    pool once the response is fully read. If Unit closed an idle connection
+    in the meantime, the request is transparently repeated on a fresh one.
+    """
+
+    def __init__(self, factory, prefix="", headers=None, maxsize=4):
+        self.factory = factory
+        self.prefix = prefix
+        self.headers = headers or {}
+        self.maxsize = maxsize
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self.factory(), False
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.maxsize:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, conn, method, url, body, timeouts):
+        conn.set_timeouts(*timeouts)
+        headers = dict(self.headers)
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        conn.request(method, url, body=body, headers=headers)
+        resp = conn.getresponse()
+        return resp, resp.read()
+
+    def _finish(self, conn, resp):
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+    def request(self, method, path, body=None, timeouts=None):
+        """
+        Send the request and return the response status and body.
+
+        Timeouts is a (connect, read) tuple of timeouts in seconds. Both
+        default to DEFAULT_TIMEOUT.
+        """
+        url = self.prefix + path
+        timeouts = timeouts or (DEFAULT_TIMEOUT, DEFAULT_TIMEOUT)
+        conn, reused = self._acquire()
+        try:
+            try:
+                resp, data = self._send(conn, method, url, body, timeouts)
+            except REQUEST_ERRORS as e:
+                if not (reused and _is_stale(e)):
+                    raise
+                # Unit closed the idle connection on us. Retry once on a
+                # brand new connection.
+                conn.close()
+                conn = self.factory()
+                resp, data = self._send(conn, method, url, body, timeouts)
+        except Exception:
+            conn.close()
+            raise
+
+        self._finish(conn, resp)
+        return resp.status, data
+
+    def probe(self, path, timeout):
+        """
+        Send a GET request over a fresh connection with a short timeout.
+
+        Returns response status and the content of the Server header. The
+        connection is added to the pool on success, which means that the
+        next request does not need to connect again.
+        """
+        conn = self.factory()
+        try:
+            resp, _data = self._send(
+                conn, "GET", self.prefix + path, None, (timeout, timeout),
+            )
+        except Exception:
+            conn.close()
+            raise
+
+        conn.set_timeouts(DEFAULT_TIMEOUT, DEFAULT_TIMEOUT)
+        self._finish(conn, resp)
+        return resp.status, resp.getheader("Server")
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class TLSState:
+    """
+    TLS settings and the most recent TLS session of a single endpoint.
+
+    New connections to the endpoint resume the session, which replaces the
+    full handshake (and certificate verification) with an abbreviated one.
+    """
+
+    def __init__(self, verify, ca_path):
+        self.verify = verify
+        self.ca_path = ca_path
+        self.session = None
+
+    @property
+    def context(self):
+        return _ssl_context(self.verify, self.ca_path)
+
+    def remember(self, sock):
+        # Sessions are only available on python 3.6 and newer.
+        session = getattr(sock, "session", None)
+        if session is not None:
+            self.session = session
+
+
+_SSL_CONTEXTS = {}
+_SSL_CONTEXTS_LOCK = threading.Lock()
+
+
+def _ssl_context(verify, ca_path):
+    # Loading CA bundle is costly, so all endpoints with the same settings
+    # share the context. Sessions can only be resumed with the context that
+    # created them, which sharing also takes care of.
+    key = verify, ca_path
+    with _SSL_CONTEXTS_LOCK:
+        if key not in _SSL_CONTEXTS:
+            _SSL_CONTEXTS[key] = _create_ssl_context(verify, ca_path)
+        return _SSL_CONTEXTS[key]
+
+
+def _create_ssl_context(verify, ca_path):
+    import ssl
+
+    context = ssl.create_default_context(cafile=ca_path)
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _basic_auth_header(username, password):
+    credentials = "{0}:{1}".format(username, password or "")
+    return "Basic " + base64.b64encode(
+        credentials.encode("utf-8"),
+    ).decode("ascii")
+
+
+def _create_pool(endpoint, username, password, verify, ca_path):
+    if endpoint.startswith("unix://"):
+        socket_path = endpoint[7:]
+        return ConnectionPool(lambda: UnixHTTPConnection(socket_path))
+
+    parts = urlparse(endpoint)
+    if parts.scheme == "https":
+        # SSL context is created lazily, since we do not need it until we
+        # open the first connection.
+        tls = TLSState(verify, ca_path)
+        classes = []
+
+        def factory():
+            if not classes:
+                classes.append(_https_connection_class())
+            return classes[0](parts.hostname, parts.port, tls)
+    else:
+        address = (parts.hostname, parts.port or 80)
+
+        def factory():
+            return HTTPConnection(address)
+
+    headers = {}
+    if username:
+        headers["Authorization"] = _basic_auth_header(username, password)
+
+    return ConnectionPool(
+        factory, prefix=parts.path.rstrip("/"), headers=headers,
+    )
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(endpoint, username, password, verify, ca_path):
+    # Clients that talk to the same endpoint using the same credentials share
+    # the pool, which means that connections opened while probing endpoints
+    # in get_client are reused by the modules.
+    key = (endpoint, username, password, verify, ca_path)
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = _create_pool(
+                endpoint, username, password, verify, ca_path,
+            )
+    return pool
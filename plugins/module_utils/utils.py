@@ -6,32 +6,255 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import hashlib
+import json
+
+from . import jsoncodec
+
 
 class Result(dict):
-    def __init__(self, current, desired):
+    def __init__(self, current, desired, diff_format="full", normalize=None):
         super(Result, self).__init__()
 
-        self["changed"] = current != desired
-        self["diff"] = dict(before=current, after=desired)
-        self["object"] = desired
+        # Unit accepts some options in more than one form, so we compare the
+        # canonical forms if the caller knows how to produce them.
+        if normalize:
+            canonical_current = normalize(current)
+            canonical_desired = normalize(desired)
+        else:
+            canonical_current, canonical_desired = current, desired
+
+        self["changed"] = canonical_current != canonical_desired
+        if diff_format == "full":
+            self["diff"] = dict(before=current, after=desired)
+            self["object"] = desired
+        elif diff_format == "summary":
+            # Summary only lists changed paths, which keeps the result small
+            # even when the managed object is huge.
+            self["diff"] = summarize(
+                diff(canonical_current, canonical_desired),
+            )
 
     @property
     def changed(self):
         return self["changed"]
 
     def add_object_fields(self, **kwargs):
-        self["object"].update(kwargs)
+        if "object" in self:
+            self["object"].update(kwargs)
+
+
+# Each request costs about as much as sending this many bytes of payload.
+REQUEST_COST = 512
+# Each request also triggers a separate reconfiguration in Unit, so we never
+# split a change into more than this many requests.
+MAX_CHANGES = 3
+
+
+# Size of the encoded JSON that we collect before updating the checksum.
+_CHECKSUM_BUFFER = 65536
+
+
+class _Digest:
+    """
+    SHA-256 digest that collects encoded JSON chunks before hashing them.
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self._chunks = []
+        self._size = 0
+
+    def update(self, chunk):
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        if self._size >= _CHECKSUM_BUFFER:
+            self._flush()
+
+    def _flush(self):
+        self._digest.update("".join(self._chunks).encode("utf-8"))
+        self._chunks, self._size = [], 0
+
+    def hexdigest(self):
+        self._flush()
+        return self._digest.hexdigest()
+
+
+def _encoder():
+    return json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+
+
+def checksum(value):
+    """
+    Compute SHA-256 checksum of the canonical JSON encoding of the value.
+
+    Value is encoded in chunks, which means that we never hold the complete
+    encoded document in memory.
+    """
+    digest = _Digest()
+    for chunk in _encoder().iterencode(value):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checksum_by_object(config, normalize):
+    """
+    Compute the same checksum as checksum(normalize(config)).
+
+    Instead of building the complete canonical form of the configuration,
+    we normalize and encode one top-level section (or one object from a
+    dictionary section) at a time. This only works if normalize handles
+    sections and objects independently, which is true for
+    normalization.config.
+    """
+    if not isinstance(config, dict):
+        return checksum(normalize(config))
+
+    encoder = _encoder()
+    digest = _Digest()
+    digest.update("{")
+    sections = 0
+    for section in sorted(config):
+        value = config[section]
+        if isinstance(value, dict):
+            objects = 0
+            for name in sorted(value):
+                canonical = normalize({section: {name: value[name]}})
+                if name not in canonical.get(section, {}):
+                    continue  # Empty objects are the same as missing ones.
+                if objects == 0:
+                    digest.update("," if sections else "")
+                    digest.update(encoder.encode(section) + ":{")
+                    sections += 1
+                digest.update("," if objects else "")
+                digest.update(encoder.encode(name) + ":")
+                for chunk in encoder.iterencode(canonical[section][name]):
+                    digest.update(chunk)
+                objects += 1
+            if objects:
+                digest.update("}")
+            continue
+
+        canonical = normalize({section: value})
+        if section in canonical:
+            digest.update("," if sections else "")
+            digest.update(encoder.encode(section) + ":")
+            for chunk in encoder.iterencode(canonical[section]):
+                digest.update(chunk)
+            sections += 1
+    digest.update("}")
+    return digest.hexdigest()
+
+
+def diff(current, desired, path=(), whole_objects=False):
+    """
+    Compute changes that transform current into desired.
+
+    Changes are returned as a list of (op, path, value) tuples, where op is
+    one of "add", "replace" or "remove" (same as in JSON patch, RFC 6902).
+    Dictionaries are compared key by key and lists
+    of the same length element by element. Everything else (including lists
+    whose length changed) is replaced as a whole.
+
+    If whole_objects is set, dictionaries that gained or lost keys are also
+    replaced as a whole. Unit validates the configuration after each
+    request, and some objects (route actions, for example, need exactly
+    one of pass, share, proxy, or return) are only valid with the right
+    combination of keys. Such objects cannot be changed one key at a time.
+    """
+    if current == desired:
+        return []
+
+    if isinstance(current, dict) and isinstance(desired, dict):
+        if whole_objects and set(current) != set(desired):
+            return [("replace", path, desired)]
+        changes = [
+            ("remove", path + (k, ), None) for k in current if k not in desired
+        ]
+        for k, v in desired.items():
+            if k in current:
+                changes.extend(
+                    diff(current[k], v, path + (k, ), whole_objects),
+                )
+            else:
+                changes.append(("add", path + (k, ), v))
+        return changes
+
+    if (
+            isinstance(current, list) and isinstance(desired, list) and
+            len(current) == len(desired)
+    ):
+        changes = []
+        for i, (c, d) in enumerate(zip(current, desired)):
+            changes.extend(diff(c, d, path + (str(i), ), whole_objects))
+        return changes
+
+    return [("replace", path, desired)]
+
+
+def _json_pointer(path):
+    return "".join(
+        "/" + str(s).replace("~", "~0").replace("/", "~1") for s in path
+    )
+
+
+def summarize(changes):
+    counts = dict(add=0, replace=0, remove=0)
+    for op, _path, _value in changes:
+        counts[op] += 1
+    return dict(
+        changes=[dict(op=op, path=_json_pointer(p)) for op, p, _ in changes],
+        counts=counts,
+    )
+
+
+def _cost(value):
+    return REQUEST_COST + len(jsoncodec.dumps(value))
+
+
+def apply_changes(client, path, current, desired, single_write=False):
+    """
+    Update the configuration on the path with as little traffic as possible.
+
+    If the object already exists and only a few of its parts changed, we
+    update those parts. Otherwise (or if targeted updates would not save at
+    least one request worth of traffic), we replace the whole object at once.
+    Parts are only updated in place if they keep the same keys, so each
+    request leaves the configuration in a state that Unit accepts.
+
+    If single_write is set, the whole object is always replaced with a
+    single request, which triggers exactly one Unit reconfiguration.
+    """
+    changes = []
+    if current and not single_write:
+        changes = diff(current, desired, whole_objects=True)
+    if (
+            not changes or len(changes) > MAX_CHANGES or
+            sum(_cost(v) for _, _, v in changes) + REQUEST_COST >=
+            _cost(desired)
+    ):
+        client.put(path, desired)
+        return
+
+    for _op, subpath, value in changes:
+        # The parent of the changed part is present in the current
+        # configuration, so client does not need to look for it.
+        client.mark_existing(path + subpath[:-1])
+        client.put(path + subpath, value)
 
 
-def create(client, path, payload, check_mode):
-    result = Result(client.get(path), payload)
+def create(client, path, payload, check_mode, diff_format="full",
+           normalize=None, single_write=False):
+    path = tuple(path)
+    current = client.get(path)
+    result = Result(current, payload, diff_format, normalize)
     if result.changed and not check_mode:
-        client.put(path, payload)
+        apply_changes(client, path, current, payload, single_write)
     return result
 
 
-def delete(client, path, check_mode):
-    result = Result(client.get(path), {})
+def delete(client, path, check_mode, diff_format="full"):
+    result = Result(client.get(path), {}, diff_format)
     if result.changed and not check_mode:
         client.delete(path)
     return result
@@ -6,6 +6,8 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+from ansible.module_utils.six import string_types
+
 from .errors import UnitError
 
 
@@ -14,18 +16,211 @@ def report_error(msgs):
         raise UnitError("\n".join(msgs))
 
 
-def validate_pass(client, path):
+def _check_destination(path, destination):
     segments = path.split("/")
-    destination = client.get(["config"] + segments[:2])
 
     if not destination:
         return ["Destination '{0}' does not exist.".format(path)]
 
     if (
             segments[0] == "applications" and
-            len(segments) == 3 and
-            segments[2] not in destination.get("targets", {})
+            len(segments) == 3 and (
+                not isinstance(destination, dict) or
+                segments[2] not in (destination.get("targets") or {})
+            )
     ):
         return ["PHP application target {0} does not exist.".format(path)]
 
     return []
+
+
+def certificate_exists(client, name):
+    # Bundles contain the whole certificate chain, but all we need to know
+    # is whether the bundle exists, so we only decode its key description.
+    return bool(client.get(("certificates", name), ("key", )))
+
+
+def validate_pass(client, path):
+    segments = path.split("/")
+    return _check_destination(
+        path, client.get(["config"] + segments[:2]),
+    )
+
+
+class DestinationIndex:
+    """
+    Index of all destinations that the pass option can point to.
+
+    Index is built from a single copy of the Unit configuration and can then
+    check any number of destinations without talking to the Unit.
+    """
+
+    def __init__(self, config):
+        self._destinations = {}
+        for section, content in config.items():
+            if isinstance(content, dict):
+                for name, destination in content.items():
+                    self._destinations[(section, name)] = destination
+            # Sections themselves can also be destinations (global route).
+            self._destinations[(section, )] = content
+
+    @classmethod
+    def from_client(cls, client):
+        return cls(client.get(("config", )))
+
+    def validate(self, path):
+        destination = self._destinations.get(tuple(path.split("/")[:2]))
+        return _check_destination(path, destination)
+
+
+def action_passes(action):
+    passes = []
+
+    # Values of the wrong type are reported by check_action.
+    if not isinstance(action, dict):
+        return passes
+    destination = action.get("pass")
+    if destination and isinstance(destination, string_types):
+        passes.append(destination)
+    if "fallback" in action and action["fallback"]:
+        passes.extend(action_passes(action["fallback"]))
+
+    return passes
+
+
+def check_action(action, where):
+    msgs = []
+
+    while action:
+        if not isinstance(action, dict):
+            msgs.append("Action in {0} should be a dictionary.".format(where))
+            break
+        destination = action.get("pass")
+        if destination and not isinstance(destination, string_types):
+            msgs.append(
+                "Destination in {0} should be a string.".format(where),
+            )
+        action = action.get("fallback")
+        where = "fallback of " + where
+
+    return msgs
+
+
+def validate_steps(steps, route_name=None):
+    """
+    Check route steps for structural errors and collect their destinations.
+
+    Returns a list of error messages and a list of destinations that need to
+    be validated.
+    """
+    msgs = []
+    passes = []
+    suffix = " of route '{0}'".format(route_name) if route_name else ""
+
+    if not isinstance(steps, list):
+        msgs.append("Route{0} should be a list of steps.".format(
+            " '{0}'".format(route_name) if route_name else "",
+        ))
+        return msgs, passes
+
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict):
+            msgs.append(
+                "Step {0}{1} should be a dictionary.".format(i, suffix),
+            )
+            continue
+        action = step.get("action")
+        if not action:
+            msgs.append(
+                "Missing action field in step {0}{1}".format(i, suffix),
+            )
+        else:
+            msgs.extend(
+                check_action(action, "step {0}{1}".format(i, suffix)),
+            )
+            passes.extend(action_passes(action))
+
+    return msgs, passes
+
+
+def validate_config(config):
+    """
+    Validate references in the configuration without talking to the Unit.
+
+    All destinations must point to applications, routes, and upstreams that
+    are present in the same configuration.
+    """
+    if not isinstance(config, dict):
+        return ["Configuration should be a dictionary."]
+
+    msgs = []
+    passes = []
+
+    listeners = config.get("listeners") or {}
+    if not isinstance(listeners, dict):
+        msgs.append("Listeners should be a dictionary keyed by patterns.")
+        listeners = {}
+    for pattern, listener in sorted(listeners.items()):
+        if not isinstance(listener, dict):
+            msgs.append(
+                "Listener '{0}' should be a dictionary.".format(pattern),
+            )
+        elif not listener.get("pass"):
+            msgs.append("Listener '{0}' has no destination.".format(pattern))
+        elif not isinstance(listener["pass"], string_types):
+            msgs.append(
+                "Destination of listener '{0}' should be a string.".format(
+                    pattern,
+                ),
+            )
+        else:
+            passes.append(listener["pass"])
+
+    routes = config.get("routes") or {}
+    if isinstance(routes, list):
+        routes = {None: routes}
+    if not isinstance(routes, dict):
+        msgs.append(
+            "Routes should be a dictionary of named routes or a list of "
+            "global route steps."
+        )
+        routes = {}
+    for name, steps in sorted(routes.items(), key=lambda r: r[0] or ""):
+        step_msgs, step_passes = validate_steps(steps, name)
+        msgs.extend(step_msgs)
+        passes.extend(step_passes)
+
+    index = DestinationIndex(config)
+    seen = set()
+    for path in passes:
+        if path not in seen:
+            seen.add(path)
+            msgs.extend(index.validate(path))
+
+    return msgs
+
+
+def validate_passes(client, paths):
+    """
+    Validate all destinations and report all broken ones at once.
+
+    If there is more than one destination to check, we fetch the whole
+    configuration once and check all of them against it.
+    """
+    seen = set()
+    unique_paths = []
+    for path in paths:
+        if path not in seen:
+            seen.add(path)
+            unique_paths.append(path)
+
+    if len(unique_paths) == 1:
+        return validate_pass(client, unique_paths[0])
+    if not unique_paths:
+        return []
+
+    index = DestinationIndex.from_client(client)
+    msgs = []
+    for path in unique_paths:
+        msgs.extend(index.validate(path))
+    return msgs
@@ -131,8 +131,10 @@ object:
 
 from ansible.module_utils.basic import AnsibleModule
 
-from ..module_utils import errors, utils
-from ..module_utils.client import get_client
+from ..module_utils import errors, profiling, utils
+from ..module_utils.client import (
+    add_metrics, get_client, run_on_endpoints, use_connection,
+)
 
 
 def run(params):
@@ -150,6 +152,8 @@ def run(params):
 
 
 def main():
+    profiling.start()
+
     # AUTOMATIC MODULE ARGUMENTS
     argument_spec = {
         "name": {"type": "str"},
@@ -157,10 +161,17 @@ def main():
             "type": "dict",
             "options": {
                 "ca_path": {"type": "path"},
+                "connect_timeout": {"type": "float"},
+                "deadline": {"type": "float"},
                 "endpoint": {"type": "str"},
+                "endpoints": {"type": "list", "elements": "str"},
+                "metrics": {"default": False, "type": "bool"},
                 "password": {"type": "str"},
+                "read_timeout": {"type": "float"},
+                "snapshot": {"default": False, "type": "bool"},
                 "username": {"type": "str"},
                 "verify": {"default": True, "type": "bool"},
+                "workers": {"type": "int"},
             },
             "apply_defaults": True,
         },
@@ -172,10 +183,13 @@ def main():
         argument_spec=argument_spec,
     )
 
+    use_connection(module._socket_path)
+
     try:
-        module.exit_json(**run(module.params))
+        result = run_on_endpoints(run, module.params)
     except errors.UnitError as e:
-        module.fail_json(msg=str(e))
+        module.fail_json(**profiling.report(add_metrics(dict(msg=str(e)))))
+    module.exit_json(**profiling.report(add_metrics(result)))
 
 
 if __name__ == "__main__":
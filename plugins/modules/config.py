@@ -0,0 +1,377 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = """
+module: config
+author:
+  - Tadej Borovšak (@tadeboro)
+short_description: Manage complete NGINX Unit configuration
+description:
+  - Manage applications, routes, listeners, upstreams, and settings of the
+    NGINX Unit in a single task.
+  - Module validates all references in the desired configuration before
+    talking to the Unit, compares the desired configuration with the current
+    one, and applies all changes at once. This triggers at most one Unit
+    reconfiguration instead of one per changed object.
+  - Upstream docs are at U(https://unit.nginx.org/configuration/).
+  - The C(steampunk.unit.flush) action uses this module to apply all
+    changes that were deferred during the play.
+extends_documentation_fragment:
+  - steampunk.unit.provider
+  - steampunk.unit.diff_format
+options:
+  applications:
+    description:
+      - Applications, keyed by their names.
+      - See U(https://unit.nginx.org/configuration/#applications) for the
+        format of application objects.
+      - If this parameter is not set, module leaves the applications as they
+        are. Set it to an empty dictionary to remove all applications.
+    type: dict
+  routes:
+    description:
+      - Named routes (a dictionary of route step lists) or a global route (a
+        list of route steps).
+      - See U(https://unit.nginx.org/configuration/#routes) for the format of
+        route steps.
+      - If this parameter is not set, module leaves the routes as they are.
+    type: raw
+  listeners:
+    description:
+      - Listeners, keyed by their patterns.
+      - See U(https://unit.nginx.org/configuration/#listeners) for the format
+        of listener objects.
+      - If this parameter is not set, module leaves the listeners as they
+        are.
+    type: dict
+  upstreams:
+    description:
+      - Upstreams, keyed by their names.
+      - See U(https://unit.nginx.org/configuration/#upstreams) for the format
+        of upstream objects.
+      - If this parameter is not set, module leaves the upstreams as they
+        are.
+    type: dict
+  settings:
+    description:
+      - Global Unit settings.
+      - See U(https://unit.nginx.org/configuration/#settings) for the
+        available settings.
+      - If this parameter is not set, module leaves the settings as they are.
+    type: dict
+  access_log:
+    description:
+      - Path to the access log file.
+      - If this parameter is not set, module leaves the access log setting as
+        it is.
+    type: str
+  merge:
+    description:
+      - If set to C(true), objects from the I(applications), I(listeners),
+        I(routes), I(upstreams), and I(settings) dictionaries are added to
+        the current ones (or replace the objects with the same name) instead
+        of replacing the whole section.
+      - In this mode, setting the object to C(null) removes it.
+      - Ignored if I(src) is set.
+    type: bool
+    default: false
+  src:
+    description:
+      - Path to the JSON file on the managed host that contains the complete
+        NGINX Unit configuration.
+      - Module compares the checksum of the configuration from the file with
+        the checksum of the current configuration and, if they differ,
+        streams the file to the Unit as is.
+      - Module keeps one decoded copy of the configuration from the file and
+        one of the current configuration in memory. Checksums are computed
+        one object at a time and the file is not encoded again before it is
+        sent.
+      - Results with I(diff_format) set to C(full) contain both complete
+        configurations, and C(summary) compares their canonical forms.
+        Set I(diff_format) to C(none) when applying large configurations.
+      - Mutually exclusive with I(applications), I(routes), I(listeners),
+        I(upstreams), I(settings), and I(access_log).
+    type: path
+"""
+
+EXAMPLES = """
+- name: Configure complete site with a single reconfiguration
+  steampunk.unit.config:
+    applications:
+      blog:
+        type: python
+        module: wsgi
+        path: /www/blog
+    routes:
+      main:
+        - match:
+            uri: /static/*
+          action:
+            share: /www/static/
+        - action:
+            pass: applications/blog
+    listeners:
+      "*:80":
+        pass: routes/main
+
+- name: Remove all listeners and leave other parts of configuration alone
+  steampunk.unit.config:
+    listeners: {}
+
+- name: Add one listener and remove another one
+  steampunk.unit.config:
+    merge: true
+    listeners:
+      "*:8080":
+        pass: applications/blog
+      "*:8081": null
+
+- name: Apply large configuration that was rendered on the managed host
+  steampunk.unit.config:
+    src: /etc/unit/config.json
+    diff_format: none
+"""
+
+RETURN = """
+object:
+  description: Object representing complete NGINX Unit configuration.
+  returned: On success and if I(diff_format) == C(full)
+  type: dict
+  sample:
+    applications:
+      blog:
+        type: python
+        module: wsgi
+    listeners:
+      "*:80":
+        pass: applications/blog
+checksum:
+  description: >-
+    SHA-256 checksum of the canonical form of the configuration from the
+    I(src) file.
+  returned: On success and if I(src) is set
+  type: str
+  sample: 1c0ba4ae2c6a7bd9e8d6d8a0ab7ae4e1b7c2e6ae77a0b0e69ff08dc8cb9f1b5e
+"""
+
+import json
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.six import string_types
+
+from ..module_utils import errors, profiling, normalization, validation, utils
+from ..module_utils.client import (
+    add_metrics, get_client, run_on_endpoints, use_connection,
+)
+
+SECTIONS = (
+    "settings", "access_log", "applications", "upstreams", "routes",
+    "listeners",
+)
+
+
+def merge_section(current, changes):
+    section = dict(current) if isinstance(current, dict) else {}
+    for name, value in changes.items():
+        if value is None:
+            section.pop(name, None)
+        else:
+            section[name] = value
+    return section
+
+
+def build_payload(params, current):
+    payload = dict(current)
+    for section in SECTIONS:
+        value = params[section]
+        if value is None:
+            continue
+        if params["merge"] and isinstance(value, dict):
+            value = merge_section(current.get(section), value)
+        payload[section] = value
+
+    if not isinstance(payload.get("routes", {}), (dict, list)):
+        raise errors.UnitError(
+            "Routes should be a dictionary of named routes or a list of "
+            "global route steps."
+        )
+    return payload
+
+
+def validate_current_state(client, payload):
+    msgs = validation.validate_config(payload)
+    # Certificates are only checked for structurally valid configurations.
+    validation.report_error(msgs)
+
+    certs = set()
+    for pattern, listener in sorted(
+            (payload.get("listeners") or {}).items()):
+        tls = listener.get("tls") or {}
+        if not isinstance(tls, dict):
+            msgs.append(
+                "TLS settings of listener '{0}' should be a dictionary."
+                .format(pattern)
+            )
+            continue
+        # Unit also accepts a list of certificate bundles.
+        cert = tls.get("certificate")
+        for name in cert if isinstance(cert, list) else [cert]:
+            if not isinstance(name, string_types) or name in certs:
+                continue
+            certs.add(name)
+            if not validation.certificate_exists(client, name):
+                msgs.append("Certificate '{0}' does not exist.".format(name))
+
+    validation.report_error(msgs)
+
+
+def read_src(fd, path):
+    try:
+        return json.load(fd)
+    except ValueError as e:
+        raise errors.UnitError(
+            "Cannot read configuration from '{0}': {1}".format(path, e),
+        )
+
+
+def src_result(current, desired, changed, diff_format):
+    if diff_format == "full":
+        return dict(
+            changed=changed, diff=dict(before=current, after=desired),
+            object=desired,
+        )
+    if diff_format == "summary":
+        changes = []
+        if changed:
+            changes = utils.diff(
+                normalization.config(current), normalization.config(desired),
+            )
+        return dict(changed=changed, diff=utils.summarize(changes))
+    return dict(changed=changed)
+
+
+def run_src(client, params, check_mode):
+    path = ("config", )
+    try:
+        fd = open(params["src"], "rb")
+    except (IOError, OSError) as e:
+        raise errors.UnitError(
+            "Cannot read configuration from '{0}': {1}".format(
+                params["src"], e,
+            )
+        )
+
+    with fd:
+        desired = read_src(fd, params["src"])
+        validate_current_state(client, desired)
+
+        # Comparing checksums means that we never need to keep canonical
+        # forms of the configurations around. Checksums are computed one
+        # object at a time, so we do not even build them.
+        current = client.get(path)
+        desired_checksum = utils.checksum_by_object(
+            desired, normalization.config,
+        )
+        changed = utils.checksum_by_object(
+            current, normalization.config,
+        ) != desired_checksum
+        if changed and not check_mode:
+            client.put_file(path, fd)
+
+    result = src_result(current, desired, changed, params["diff_format"])
+    result["checksum"] = desired_checksum
+    return result
+
+
+def run(params, check_mode):
+    client = get_client(params["provider"])
+    if params["src"]:
+        return run_src(client, params, check_mode)
+
+    # We read the configuration once and serve all subsequent reads from
+    # memory.
+    client.snapshot = True
+    path = ("config", )
+
+    payload = build_payload(params, client.get(path))
+    validate_current_state(client, payload)
+    # Changes to different sections often depend on each other (a new
+    # listener that passes requests to a new application, for example), so
+    # we always replace the whole configuration with a single request. Unit
+    # applies it atomically or not at all.
+    return utils.create(
+        client, path, payload, check_mode, params["diff_format"],
+        normalization.config, single_write=True,
+    )
+
+
+def main():
+    profiling.start()
+
+    # AUTOMATIC MODULE ARGUMENTS
+    argument_spec = {
+        "access_log": {"type": "str"},
+        "applications": {"type": "dict"},
+        "diff_format": {
+            "choices": ["full", "summary", "none"],
+            "default": "full",
+            "type": "str",
+        },
+        "listeners": {"type": "dict"},
+        "merge": {"default": False, "type": "bool"},
+        "provider": {
+            "type": "dict",
+            "options": {
+                "ca_path": {"type": "path"},
+                "connect_timeout": {"type": "float"},
+                "deadline": {"type": "float"},
+                "endpoint": {"type": "str"},
+                "endpoints": {"type": "list", "elements": "str"},
+                "metrics": {"default": False, "type": "bool"},
+                "password": {"type": "str"},
+                "read_timeout": {"type": "float"},
+                "snapshot": {"default": False, "type": "bool"},
+                "username": {"type": "str"},
+                "verify": {"default": True, "type": "bool"},
+                "workers": {"type": "int"},
+            },
+            "apply_defaults": True,
+        },
+        "routes": {"type": "raw"},
+        "settings": {"type": "dict"},
+        "src": {"type": "path"},
+        "upstreams": {"type": "dict"},
+    }
+    mutually_exclusive = [
+        ("src", "applications"),
+        ("src", "routes"),
+        ("src", "listeners"),
+        ("src", "upstreams"),
+        ("src", "settings"),
+        ("src", "access_log"),
+    ]
+    # AUTOMATIC MODULE ARGUMENTS
+
+    module = AnsibleModule(
+        supports_check_mode=True,
+        argument_spec=argument_spec,
+        mutually_exclusive=mutually_exclusive,
+    )
+
+    use_connection(module._socket_path)
+
+    try:
+        result = run_on_endpoints(run, module.params, module.check_mode)
+    except errors.UnitError as e:
+        module.fail_json(**profiling.report(add_metrics(dict(msg=str(e)))))
+    module.exit_json(**profiling.report(add_metrics(result)))
+
+
+if __name__ == "__main__":
+    main()
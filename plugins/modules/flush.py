@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+DOCUMENTATION = """
+module: flush
+author:
+  - Tadej Borovšak (@tadeboro)
+short_description: Apply deferred NGINX Unit changes
+description:
+  - If the I(steampunk_unit_defer) variable is set to C(true), the
+    C(steampunk.unit.listener), C(steampunk.unit.route), and
+    C(steampunk.unit.python_app) tasks do not talk to the Unit. Instead,
+    they record the desired state of their object on the controller (in the
+    I(steampunk_unit_pending) host fact), report no change, and set the
+    I(deferred) flag in their result.
+  - This module merges all pending changes and applies them to the Unit
+    using the C(steampunk.unit.config) module, which means that Unit
+    reconfigures once per host instead of once per task. Only this module
+    reports whether the configuration changed.
+  - Since deferred tasks report no change, they do not notify handlers. Add
+    this module as a regular task after the deferred ones. If you want to
+    run it as a handler, notify it from a task that always reports a change
+    or use I(listen) with a task that runs after the deferred ones.
+  - Deferred tasks validate their options on the controller the same way
+    the modules do and fail if they are not valid. References between
+    objects are validated when the changes are flushed.
+  - Batch invocations (I(listeners) and I(applications) options), removal
+    of the global route, tasks that set their own I(provider), and tasks
+    with paths that start with C(~) or contain environment variables are
+    never deferred. This module applies all changes using its own
+    I(provider) and I(diff_format).
+  - Pending changes are regular host facts. If fact caching is enabled and
+    the play fails before this module runs, the next run of this module
+    applies them together with the new changes. Set the
+    I(steampunk_unit_pending) fact to an empty list (using
+    C(ansible.builtin.set_fact) with I(cacheable) set to C(true)) to drop
+    them.
+  - This module is implemented as an action plugin and runs on the
+    controller. Actual configuration change runs on the managed host.
+extends_documentation_fragment:
+  - steampunk.unit.provider
+  - steampunk.unit.diff_format
+"""
+
+EXAMPLES = """
+- name: Configure Unit with one reconfiguration
+  hosts: all
+  vars:
+    steampunk_unit_defer: true
+  tasks:
+    - name: Create application
+      steampunk.unit.python_app:
+        name: blog
+        module: wsgi
+
+    - name: Create listener
+      steampunk.unit.listener:
+        pattern: "*:80"
+        pass: applications/blog
+
+    - name: Apply Unit changes
+      steampunk.unit.flush:
+"""
+
+RETURN = """
+object:
+  description: Object representing complete NGINX Unit configuration.
+  returned: On success, if there were pending changes and I(diff_format) ==
+    C(full)
+  type: dict
+"""
+
+from ansible.module_utils.basic import AnsibleModule
+
+
+def main():
+    # AUTOMATIC MODULE ARGUMENTS
+    argument_spec = {
+        "diff_format": {
+            "choices": ["full", "summary", "none"],
+            "default": "full",
+            "type": "str",
+        },
+        "provider": {
+            "type": "dict",
+            "options": {
+                "ca_path": {"type": "path"},
+                "connect_timeout": {"type": "float"},
+                "deadline": {"type": "float"},
+                "endpoint": {"type": "str"},
+                "endpoints": {"type": "list", "elements": "str"},
+                "metrics": {"default": False, "type": "bool"},
+                "password": {"type": "str"},
+                "read_timeout": {"type": "float"},
+                "snapshot": {"default": False, "type": "bool"},
+                "username": {"type": "str"},
+                "verify": {"default": True, "type": "bool"},
+                "workers": {"type": "int"},
+            },
+            "apply_defaults": True,
+        },
+    }
+    # AUTOMATIC MODULE ARGUMENTS
+
+    module = AnsibleModule(
+        supports_check_mode=True,
+        argument_spec=argument_spec,
+    )
+    module.fail_json(
+        msg="This module must be run through its action plugin.",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,23 +14,28 @@ author:
 short_description: Manage NGINX Unit listener
 description:
   - Manage NGINX Unit listener configuration.
+  - Module can manage a single listener (I(pattern)) or a whole set of
+    listeners (I(listeners)). In the latter case, module reads the
+    configuration once, validates all listeners against it, and applies all
+    changes at once.
   - Upstream docs are at U(https://unit.nginx.org/configuration/#listeners).
 extends_documentation_fragment:
   - steampunk.unit.provider
   - steampunk.unit.state
+  - steampunk.unit.diff_format
 options:
   pattern:
     description:
       - A pattern that listener will listen to. Pattern also serves as an id
         that module uses to enforce state.
+      - Mutually exclusive with I(listeners). One of them is required.
     type: str
-    required: true
   pass:
     description:
       - Destination that should receive the incomming requests.
       - If the destination is not defined at the time of module's execution,
         module will abort the operation.
-      - Required if I(state) is C(present).
+      - Required if I(state) is C(present) and I(pattern) is set.
     type: str
   tls:
     description:
@@ -43,6 +48,40 @@ options:
           - If the certificate chain is not already defined, module will
             report an error.
         type: str
+  listeners:
+    description:
+      - List of listeners to manage in a single run.
+      - If I(state) is C(absent), module removes all listed listeners and
+        ignores their I(pass) and I(tls) options.
+      - Mutually exclusive with I(pattern). One of them is required.
+    type: list
+    elements: dict
+    suboptions:
+      pattern:
+        description:
+          - A pattern that listener will listen to.
+        type: str
+        required: true
+      pass:
+        description:
+          - Destination that should receive the incomming requests.
+          - Required if I(state) is C(present).
+        type: str
+      tls:
+        description:
+          - SSL/TLS configuration.
+        type: dict
+        suboptions:
+          certificate:
+            description:
+              - Name of the certificate chain.
+            type: str
+  purge:
+    description:
+      - Remove all listeners that are not present in the I(listeners) list.
+      - Only used if I(listeners) is set and I(state) is C(present).
+    type: bool
+    default: false
 """
 
 EXAMPLES = """
@@ -62,12 +101,26 @@ EXAMPLES = """
   steampunk.unit.listener:
     pattern: "*:3000"
     state: absent
+
+- name: Make sure these are the only listeners
+  steampunk.unit.listener:
+    listeners:
+      - pattern: "*:80"
+        pass: routes/main
+      - pattern: "*:443"
+        pass: routes/main
+        tls:
+          certificate: bundle
+    purge: true
 """
 
 RETURN = """
 object:
-  description: Object representing NGINX Unit listener.
-  returned: On success and if I(state) == C(present)
+  description:
+    - Object representing NGINX Unit listener.
+    - If I(listeners) is set, this is a dictionary of all listener objects,
+      keyed by their patterns.
+  returned: On success, if I(state) == C(present) and I(diff_format) == C(full)
   type: complex
   contains:
     pattern:
@@ -94,47 +147,140 @@ object:
 
 from ansible.module_utils.basic import AnsibleModule
 
-from ..module_utils import errors, validation, utils
-from ..module_utils.client import get_client
+from ..module_utils import errors, profiling, normalization, validation, utils
+from ..module_utils.client import (
+    add_metrics, get_client, run_on_endpoints, use_connection,
+)
 
 
 def validate_current_state(client, payload):
-    msgs = validation.validate_pass(client, payload["pass"])
+    msgs = validation.validate_passes(client, [payload["pass"]])
 
     cert = payload.get("tls", {}).get("certificate")
-    if cert and not client.get(("certificates", cert)):
+    if cert and not validation.certificate_exists(client, cert):
         msgs.append("Certificate '{0}' does not exist.".format(cert))
 
     validation.report_error(msgs)
 
 
+def validate_batch(client, listeners):
+    # Single read of the configuration (client is in snapshot mode) and the
+    # certificate store serves all the checks.
+    index = validation.DestinationIndex.from_client(client)
+    certs = None
+    msgs = []
+    seen_passes = set()
+    seen_certs = set()
+
+    for pattern, listener in sorted(listeners.items()):
+        if not listener.get("pass"):
+            msgs.append("Listener '{0}' has no destination.".format(pattern))
+        elif listener["pass"] not in seen_passes:
+            seen_passes.add(listener["pass"])
+            msgs.extend(index.validate(listener["pass"]))
+
+        cert = (listener.get("tls") or {}).get("certificate")
+        if cert and cert not in seen_certs:
+            seen_certs.add(cert)
+            if certs is None:
+                certs = client.get(("certificates", ))
+            if cert not in certs:
+                msgs.append("Certificate '{0}' does not exist.".format(cert))
+
+    validation.report_error(msgs)
+
+
+def build_batch_payload(params, current):
+    if params["state"] == "present" and params["purge"]:
+        payload = {}
+    else:
+        payload = dict(current)
+
+    for listener in params["listeners"]:
+        if params["state"] == "absent":
+            payload.pop(listener["pattern"], None)
+        else:
+            payload[listener["pattern"]] = utils.filter_dict(
+                listener, "pass", "tls",
+            )
+    return payload
+
+
+def run_batch(params, check_mode):
+    client = get_client(params["provider"])
+    client.snapshot = True
+    path = ("config", "listeners")
+
+    payload = build_batch_payload(params, client.get(path))
+    if params["state"] == "present":
+        validate_batch(client, dict(
+            (l["pattern"], payload[l["pattern"]]) for l in params["listeners"]
+        ))
+    # All listeners (including the purged ones) go out in a single request,
+    # which means a single Unit reconfiguration.
+    return utils.create(
+        client, path, payload, check_mode, params["diff_format"],
+        normalization.listeners, single_write=True,
+    )
+
+
 def run(params, check_mode):
+    if params["listeners"] is not None:
+        return run_batch(params, check_mode)
+
     client = get_client(params["provider"])
     path = ("config", "listeners", params["pattern"])
 
     if params["state"] == "absent":
-        return utils.delete(client, path, check_mode)
+        return utils.delete(client, path, check_mode, params["diff_format"])
 
     payload = utils.filter_dict(params, "pass", "tls")
     validate_current_state(client, payload)
-    result = utils.create(client, path, payload, check_mode)
+    result = utils.create(
+        client, path, payload, check_mode, params["diff_format"],
+        normalization.listener,
+    )
     result.add_object_fields(pattern=params["pattern"])
     return result
 
 
-def main():
+def module_args():
     # AUTOMATIC MODULE ARGUMENTS
     argument_spec = {
+        "diff_format": {
+            "choices": ["full", "summary", "none"],
+            "default": "full",
+            "type": "str",
+        },
+        "listeners": {
+            "type": "list",
+            "elements": "dict",
+            "options": {
+                "pass": {"type": "str"},
+                "pattern": {"required": True, "type": "str"},
+                "tls": {
+                    "type": "dict",
+                    "options": {"certificate": {"type": "str"}},
+                },
+            },
+        },
         "pass": {"type": "str"},
-        "pattern": {"required": True, "type": "str"},
+        "pattern": {"type": "str"},
         "provider": {
             "type": "dict",
             "options": {
                 "ca_path": {"type": "path"},
+                "connect_timeout": {"type": "float"},
+                "deadline": {"type": "float"},
                 "endpoint": {"type": "str"},
+                "endpoints": {"type": "list", "elements": "str"},
+                "metrics": {"default": False, "type": "bool"},
                 "password": {"type": "str"},
+                "read_timeout": {"type": "float"},
+                "snapshot": {"default": False, "type": "bool"},
                 "username": {"type": "str"},
                 "verify": {"default": True, "type": "bool"},
+                "workers": {"type": "int"},
             },
             "apply_defaults": True,
         },
@@ -143,25 +289,48 @@ def main():
             "default": "present",
             "type": "str",
         },
+        "purge": {"default": False, "type": "bool"},
         "tls": {"type": "dict", "options": {"certificate": {"type": "str"}}},
     }
-    required_if = [("state", "present", ("pass",))]
+    mutually_exclusive = [("pattern", "listeners")]
+    required_one_of = [("pattern", "listeners")]
     # AUTOMATIC MODULE ARGUMENTS
 
     # We added no_log=False because Ansible thinks that the pass parameter
     # contains a password. Crazzy bugger ;)
     argument_spec["pass"]["no_log"] = False
+    argument_spec["listeners"]["options"]["pass"]["no_log"] = False
 
-    module = AnsibleModule(
-        supports_check_mode=True,
+    # Action plugin validates deferred tasks against the same arguments.
+    return dict(
         argument_spec=argument_spec,
-        required_if=required_if,
+        mutually_exclusive=mutually_exclusive,
+        required_one_of=required_one_of,
     )
 
+
+def main():
+    profiling.start()
+
+    module = AnsibleModule(supports_check_mode=True, **module_args())
+
+    # Listeners in the batch mode are validated in run.
+    if (
+            module.params["pattern"] is not None and
+            module.params["state"] == "present" and
+            module.params["pass"] is None
+    ):
+        module.fail_json(
+            msg="state is present but all of the following are missing: pass",
+        )
+
+    use_connection(module._socket_path)
+
     try:
-        module.exit_json(**run(module.params, module.check_mode))
+        result = run_on_endpoints(run, module.params, module.check_mode)
     except errors.UnitError as e:
-        module.fail_json(msg=str(e))
+        module.fail_json(**profiling.report(add_metrics(dict(msg=str(e)))))
+    module.exit_json(**profiling.report(add_metrics(result)))
 
 
 if __name__ == "__main__":
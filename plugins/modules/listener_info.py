@@ -65,8 +65,10 @@ objects:
 
 from ansible.module_utils.basic import AnsibleModule
 
-from ..module_utils import errors
-from ..module_utils.client import get_client
+from ..module_utils import errors, profiling
+from ..module_utils.client import (
+    add_metrics, get_client, run_on_endpoints, use_connection,
+)
 
 
 def run(params):
@@ -84,6 +86,8 @@ def run(params):
 
 
 def main():
+    profiling.start()
+
     # AUTOMATIC MODULE ARGUMENTS
     argument_spec = {
         "pattern": {"type": "str"},
@@ -91,10 +95,17 @@ def main():
             "type": "dict",
             "options": {
                 "ca_path": {"type": "path"},
+                "connect_timeout": {"type": "float"},
+                "deadline": {"type": "float"},
                 "endpoint": {"type": "str"},
+                "endpoints": {"type": "list", "elements": "str"},
+                "metrics": {"default": False, "type": "bool"},
                 "password": {"type": "str"},
+                "read_timeout": {"type": "float"},
+                "snapshot": {"default": False, "type": "bool"},
                 "username": {"type": "str"},
                 "verify": {"default": True, "type": "bool"},
+                "workers": {"type": "int"},
             },
             "apply_defaults": True,
         },
@@ -105,10 +116,13 @@ def main():
         argument_spec=argument_spec,
     )
 
+    use_connection(module._socket_path)
+
     try:
-        module.exit_json(**run(module.params))
+        result = run_on_endpoints(run, module.params)
     except errors.UnitError as e:
-        module.fail_json(msg=str(e))
+        module.fail_json(**profiling.report(add_metrics(dict(msg=str(e)))))
+    module.exit_json(**profiling.report(add_metrics(result)))
 
 
 if __name__ == "__main__":
@@ -14,11 +14,15 @@ author:
 short_description: Manage NGINX Unit python application
 description:
   - Manage NGINX Unit python application configuration.
+  - Module can manage a single application (I(name)) or a list of
+    applications (I(applications)). In the latter case, module reads all
+    applications once and writes all changes in a single request.
   - Upstream docs are at U(https://unit.nginx.org/configuration/#python).
 extends_documentation_fragment:
   - steampunk.unit.application
   - steampunk.unit.provider
   - steampunk.unit.state
+  - steampunk.unit.diff_format
 options:
 
   version:
@@ -46,6 +50,107 @@ options:
       - Virtual environment to use. Absolute, or relative to
         I(working_directory).
     type: path
+
+  applications:
+    description:
+      - List of python applications to manage in a single run.
+      - Each element accepts the same options as a single application
+        (I(name), I(module), I(version), I(path), I(home), I(callable),
+        I(limits), I(no_processes), I(processes), I(working_directory),
+        I(user), I(group), I(environment), I(stdout), and I(stderr)).
+      - If I(state) is C(absent), module removes all listed applications and
+        only uses their names.
+      - Mutually exclusive with I(name). One of them is required.
+    type: list
+    elements: dict
+    suboptions:
+      name:
+        description:
+          - Application name.
+        type: str
+        required: true
+      module:
+        description:
+          - WSGI module to run.
+          - Required if I(state) is C(present).
+        type: str
+      version:
+        description:
+          - Version of python module to use.
+        type: str
+      path:
+        description:
+          - Additional lookup path for Python modules.
+        type: str
+      home:
+        description:
+          - Virtual environment to use.
+        type: path
+      callable:
+        description:
+          - Name of the module-based callable that Unit runs as the app.
+        type: str
+      limits:
+        description:
+          - Set the application's lifecycle parameters.
+        type: dict
+        suboptions:
+          timeout:
+            description:
+              - Request timeout in seconds.
+            type: int
+          requests:
+            description:
+              - Maximum number of requests Unit allows an app process to
+                serve.
+            type: int
+      no_processes:
+        description:
+          - Number of processes that should be running at one time.
+          - Mutually exclusive with I(processes).
+        type: int
+      processes:
+        description:
+          - Dynamic process limits.
+          - Mutually exclusive with I(no_processes).
+        type: dict
+        suboptions:
+          max:
+            description:
+              - Maximum number of application processes.
+            type: int
+          spare:
+            description:
+              - Minimum number of idle processes.
+            type: int
+          idle_timeout:
+            description:
+              - Time in seconds before terminating an idle process.
+            type: int
+      working_directory:
+        description:
+          - The app's working directory.
+        type: path
+      user:
+        description:
+          - Username that runs the app process.
+        type: str
+      group:
+        description:
+          - Group name that runs the app process.
+        type: str
+      environment:
+        description:
+          - Environment variables to be passed to the application.
+        type: dict
+      stdout:
+        description:
+          - Filename where Unit redirects the application's stdout output.
+        type: path
+      stderr:
+        description:
+          - Filename where Unit redirects the application's stderr output.
+        type: path
 """
 
 EXAMPLES = """
@@ -66,12 +171,26 @@ EXAMPLES = """
   steampunk.unit.python_app:
     name: demo
     state: absent
+
+- name: Create or update applications in one go
+  steampunk.unit.python_app:
+    applications:
+      - name: shop
+        module: wsgi
+        path: /www/shop
+      - name: blog
+        module: wsgi
+        path: /www/blog
+        no_processes: 4
 """
 
 RETURN = """
 object:
-  description: Object representing NGINX Unit Python application.
-  returned: On success and if I(state) == C(present)
+  description:
+    - Object representing NGINX Unit Python application.
+    - If I(applications) is set, this is a dictionary of all application
+      objects, keyed by their names.
+  returned: On success, if I(state) == C(present) and I(diff_format) == C(full)
   type: dict
   contains:
 
@@ -170,29 +289,119 @@ object:
 
 from ansible.module_utils.basic import AnsibleModule
 
-from ..module_utils import errors, utils
-from ..module_utils.client import get_client
+from ..module_utils import errors, profiling, normalization, utils, validation
+from ..module_utils.client import (
+    add_metrics, get_client, run_on_endpoints, use_connection,
+)
+
+
+def app_payload(params):
+    return utils.app_params_to_payload(
+        params, "python", "module", "path", "home",
+    )
+
+
+def build_batch_payload(params, current):
+    payload = dict(current)
+    msgs = []
+
+    for app in params["applications"]:
+        if params["state"] == "absent":
+            payload.pop(app["name"], None)
+        elif not app["module"]:
+            msgs.append(
+                "Application '{0}' has no module.".format(app["name"]),
+            )
+        else:
+            payload[app["name"]] = app_payload(app)
+
+    validation.report_error(msgs)
+    return payload
+
+
+def run_batch(params, check_mode):
+    client = get_client(params["provider"])
+    client.snapshot = True
+    path = ("config", "applications")
+
+    payload = build_batch_payload(params, client.get(path))
+    # All changed applications go out in a single request, which means a
+    # single Unit reconfiguration.
+    result = utils.create(
+        client, path, payload, check_mode, params["diff_format"],
+        normalization.applications, single_write=True,
+    )
+    if "object" in result:
+        result["object"] = dict(
+            (name, utils.patch_app_object(dict(app), name))
+            for name, app in result["object"].items()
+        )
+    return result
 
 
 def run(params, check_mode):
+    if params["applications"] is not None:
+        return run_batch(params, check_mode)
+
     client = get_client(params["provider"])
     path = ("config", "applications", params["name"])
 
     if params["state"] == "absent":
-        return utils.delete(client, path, check_mode)
+        return utils.delete(client, path, check_mode, params["diff_format"])
 
-    payload = utils.app_params_to_payload(
-        params, "python", "module", "path", "home",
+    payload = app_payload(params)
+    result = utils.create(
+        client, path, payload, check_mode, params["diff_format"],
+        normalization.application,
     )
-
-    result = utils.create(client, path, payload, check_mode)
-    utils.patch_app_object(result["object"], params["name"])
+    if "object" in result:
+        utils.patch_app_object(result["object"], params["name"])
     return result
 
 
-def main():
+def module_args():
     # AUTOMATIC MODULE ARGUMENTS
     argument_spec = {
+        "applications": {
+            "type": "list",
+            "elements": "dict",
+            "options": {
+                "environment": {"type": "dict"},
+                "group": {"type": "str"},
+                "home": {"type": "path"},
+                "limits": {
+                    "type": "dict",
+                    "options": {
+                        "requests": {"type": "int"},
+                        "timeout": {"type": "int"},
+                    },
+                },
+                "module": {"type": "str"},
+                "name": {"required": True, "type": "str"},
+                "no_processes": {"type": "int"},
+                "path": {"type": "str"},
+                "callable": {"type": "str"},
+                "processes": {
+                    "type": "dict",
+                    "options": {
+                        "idle_timeout": {"type": "int"},
+                        "max": {"type": "int"},
+                        "spare": {"type": "int"},
+                    },
+                },
+                "user": {"type": "str"},
+                "version": {"type": "str"},
+                "working_directory": {"type": "path"},
+                "stdout": {"type": "path"},
+                "stderr": {"type": "path"},
+            },
+            "mutually_exclusive": [("no_processes", "processes")],
+        },
+        "diff_format": {
+            "choices": ["full", "summary", "none"],
+            "default": "full",
+            "type": "str",
+        },
         "environment": {"type": "dict"},
         "group": {"type": "str"},
         "home": {"type": "path"},
@@ -204,7 +413,7 @@ def main():
             },
         },
         "module": {"type": "str"},
-        "name": {"required": True, "type": "str"},
+        "name": {"type": "str"},
         "no_processes": {"type": "int"},
         "path": {"type": "str"},
         "callable": {"type": "str"},
@@ -220,10 +429,17 @@ def main():
             "type": "dict",
             "options": {
                 "ca_path": {"type": "path"},
+                "connect_timeout": {"type": "float"},
+                "deadline": {"type": "float"},
                 "endpoint": {"type": "str"},
+                "endpoints": {"type": "list", "elements": "str"},
+                "metrics": {"default": False, "type": "bool"},
                 "password": {"type": "str"},
+                "read_timeout": {"type": "float"},
+                "snapshot": {"default": False, "type": "bool"},
                 "username": {"type": "str"},
                 "verify": {"default": True, "type": "bool"},
+                "workers": {"type": "int"},
             },
             "apply_defaults": True,
         },
@@ -238,21 +454,43 @@ def main():
         "stdout": {"type": "path"},
         "stderr": {"type": "path"},
     }
-    required_if = [("state", "present", ("module",))]
-    mutually_exclusive = [("no_processes", "processes")]
+    mutually_exclusive = [
+        ("no_processes", "processes"), ("name", "applications"),
+    ]
+    required_one_of = [("name", "applications")]
     # AUTOMATIC MODULE ARGUMENTS
 
-    module = AnsibleModule(
-        supports_check_mode=True,
+    # Action plugin validates deferred tasks against the same arguments.
+    return dict(
         argument_spec=argument_spec,
-        required_if=required_if,
         mutually_exclusive=mutually_exclusive,
+        required_one_of=required_one_of,
     )
 
+
+def main():
+    profiling.start()
+
+    module = AnsibleModule(supports_check_mode=True, **module_args())
+
+    # Applications in the batch mode are validated in run.
+    if (
+            module.params["name"] is not None and
+            module.params["state"] == "present" and
+            module.params["module"] is None
+    ):
+        module.fail_json(
+            msg="state is present but all of the following are missing: "
+            "module",
+        )
+
+    use_connection(module._socket_path)
+
     try:
-        module.exit_json(**run(module.params, module.check_mode))
+        result = run_on_endpoints(run, module.params, module.check_mode)
     except errors.UnitError as e:
-        module.fail_json(msg=str(e))
+        module.fail_json(**profiling.report(add_metrics(dict(msg=str(e)))))
+    module.exit_json(**profiling.report(add_metrics(result)))
 
 
 if __name__ == "__main__":
@@ -18,6 +18,7 @@ description:
 extends_documentation_fragment:
   - steampunk.unit.provider
   - steampunk.unit.state
+  - steampunk.unit.diff_format
 options:
   name:
     description:
@@ -33,7 +34,8 @@ options:
   steps:
     description:
       - Route steps that are matched sequentially.
-      - Required if I(state) is C(present).
+      - One of I(steps), I(raw_steps), or I(steps_file) is required if
+        I(state) is C(present).
     type: list
     elements: dict
     suboptions:
@@ -147,6 +149,23 @@ options:
             description:
               - The location taht request should be redirected to.
             type: str
+  raw_steps:
+    description:
+      - Route steps in the same format as I(steps).
+      - Module validates raw steps with a precompiled validator in a single
+        pass instead of the generic Ansible argument validation, which is
+        considerably faster for routes with many steps. The result and the
+        error messages are the same as for I(steps).
+      - Mutually exclusive with I(steps) and I(steps_file).
+    type: list
+    elements: raw
+  steps_file:
+    description:
+      - Path to the JSON file on the managed host that contains a list of
+        route steps in the same format as I(steps).
+      - File is validated the same way as I(raw_steps).
+      - Mutually exclusive with I(steps) and I(raw_steps).
+    type: path
 """
 
 EXAMPLES = """
@@ -195,12 +214,17 @@ EXAMPLES = """
             share: /old/static/
             fallback:
               return 404
+
+- name: Large route generated by some other tool
+  steampunk.unit.route:
+    name: redirects
+    steps_file: /etc/unit/redirects.json
 """
 
 RETURN = """
 object:
   description: Object representing NGINX Unit route.
-  returned: On success and if I(state) == C(present)
+  returned: On success, if I(state) == C(present) and I(diff_format) == C(full)
   type: dict
   contains:
     name:
@@ -296,33 +320,21 @@ object:
               type: str
 """
 
-from ansible.module_utils.basic import AnsibleModule
-
-from ..module_utils import errors, validation, utils
-from ..module_utils.client import get_client
+import json
 
+from ansible.module_utils.basic import AnsibleModule
 
-def validate_action(client, action):
-    msgs = []
-
-    if "pass" in action and action["pass"]:
-        msgs.extend(validation.validate_pass(client, action["pass"]))
-    if "fallback" in action and action["fallback"]:
-        msgs.extend(validate_action(client, action["fallback"]))
-
-    return msgs
+from ..module_utils import (
+    errors, profiling, normalization, schema, validation, utils,
+)
+from ..module_utils.client import (
+    add_metrics, get_client, run_on_endpoints, use_connection,
+)
 
 
 def validate_current_state(client, steps):
-    msgs = []
-
-    for i, step in enumerate(steps):
-        action = step.get("action")
-        if not action:
-            msgs.append("Missing action field in step {0}".format(i))
-        else:
-            msgs.extend(validate_action(client, action))
-
+    msgs, passes = validation.validate_steps(steps)
+    msgs.extend(validation.validate_passes(client, passes))
     validation.report_error(msgs)
 
 
@@ -335,6 +347,28 @@ def build_payload(steps):
     ]
 
 
+def read_steps_file(path):
+    try:
+        with open(path) as fd:
+            return json.load(fd)
+    except (IOError, OSError, ValueError) as e:
+        raise errors.UnitError(
+            "Cannot read steps from '{0}': {1}".format(path, e),
+        )
+
+
+def load_steps(params, spec, module_name):
+    if params["steps_file"]:
+        steps = read_steps_file(params["steps_file"])
+    else:
+        steps = params["raw_steps"]
+    if steps is None:
+        return None
+
+    validate = schema.compile_option("steps", spec, module_name)
+    return validate(steps)
+
+
 def run(params, check_mode):
     client = get_client(params["provider"])
     if params["global"]:
@@ -345,35 +379,54 @@ def run(params, check_mode):
     if params["state"] == "present":
         payload = build_payload(params["steps"])
         validate_current_state(client, payload)
-        result = utils.create(client, path, payload, check_mode)
+        result = utils.create(
+            client, path, payload, check_mode, params["diff_format"],
+            normalization.route,
+        )
 
         # Route object is a bit different because normally it would be
         # just an array of steps, which is useless for consumers. This is
         # why we "wrap" the array into object that can contain some more
         # metadata.
-        result["object"] = dict(name=params["name"], steps=result["object"])
+        if "object" in result:
+            result["object"] = dict(
+                name=params["name"], steps=result["object"],
+            )
     else:
-        result = utils.delete(client, path, check_mode)
+        result = utils.delete(client, path, check_mode, params["diff_format"])
 
     return result
 
 
-def main():
+def module_args():
     # AUTOMATIC MODULE ARGUMENTS
     argument_spec = {
+        "diff_format": {
+            "choices": ["full", "summary", "none"],
+            "default": "full",
+            "type": "str",
+        },
         "global": {"default": False, "type": "bool"},
         "name": {"type": "str"},
         "provider": {
             "type": "dict",
             "options": {
                 "ca_path": {"type": "path"},
+                "connect_timeout": {"type": "float"},
+                "deadline": {"type": "float"},
                 "endpoint": {"type": "str"},
+                "endpoints": {"type": "list", "elements": "str"},
+                "metrics": {"default": False, "type": "bool"},
                 "password": {"type": "str"},
+                "read_timeout": {"type": "float"},
+                "snapshot": {"default": False, "type": "bool"},
                 "username": {"type": "str"},
                 "verify": {"default": True, "type": "bool"},
+                "workers": {"type": "int"},
             },
             "apply_defaults": True,
         },
+        "raw_steps": {"elements": "raw", "type": "list"},
         "state": {
             "choices": ["present", "absent"],
             "default": "present",
@@ -414,23 +467,39 @@ def main():
                 },
             },
         },
+        "steps_file": {"type": "path"},
     }
+    mutually_exclusive = [("steps", "raw_steps", "steps_file")]
     required_if = [
         ("global", False, ("name",)),
-        ("state", "present", ("steps",)),
+        ("state", "present", ("steps", "raw_steps", "steps_file"), True),
     ]
     # AUTOMATIC MODULE ARGUMENTS
 
-    module = AnsibleModule(
-        supports_check_mode=True,
+    # Action plugin validates deferred tasks against the same arguments.
+    return dict(
         argument_spec=argument_spec,
+        mutually_exclusive=mutually_exclusive,
         required_if=required_if,
     )
 
+
+def main():
+    profiling.start()
+
+    module = AnsibleModule(supports_check_mode=True, **module_args())
+
+    use_connection(module._socket_path)
+
     try:
-        module.exit_json(**run(module.params, module.check_mode))
+        if module.params["steps"] is None:
+            module.params["steps"] = load_steps(
+                module.params, module.argument_spec["steps"], module._name,
+            )
+        result = run_on_endpoints(run, module.params, module.check_mode)
     except errors.UnitError as e:
-        module.fail_json(msg=str(e))
+        module.fail_json(**profiling.report(add_metrics(dict(msg=str(e)))))
+    module.exit_json(**profiling.report(add_metrics(result)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import copy
+
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.module_utils.errors import UnsupportedError
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.module_utils.six import string_types
+from ansible.plugins.action import ActionBase
+
+from ..module_utils.errors import UnitError
+
+# Variable that enables deferred mode.
+DEFER_VAR = "steampunk_unit_defer"
+# Host fact that holds the pending changes.
+PENDING_FACT = "steampunk_unit_pending"
+
+
+def is_enabled(task_vars):
+    return boolean(task_vars.get(DEFER_VAR, False), strict=False)
+
+
+def get_pending(task_vars):
+    facts = task_vars.get("ansible_facts") or {}
+    if PENDING_FACT in facts:
+        return list(facts[PENDING_FACT] or [])
+    return list(task_vars.get(PENDING_FACT) or [])
+
+
+def controller_args(module_args):
+    """
+    Adapt module arguments for validation on the controller.
+
+    Modules expand user directories and environment variables in path
+    options on the managed host, so the controller must leave those values
+    alone. Returns the adapted arguments and the names of the path options.
+    """
+    module_args = copy.deepcopy(module_args)
+    paths = []
+    for name, option in module_args["argument_spec"].items():
+        if option.get("type") == "path":
+            option["type"] = "str"
+            paths.append(name)
+    return module_args, paths
+
+
+def needs_host(value):
+    # Values that os.path.expanduser or os.path.expandvars would change.
+    return isinstance(value, string_types) and (
+        value.startswith("~") or "$" in value
+    )
+
+
+def merge_pending(pending):
+    """
+    Merge pending changes into steampunk.unit.config parameters.
+
+    Changes are applied in the order they were recorded, which means that
+    the last change of an object wins. Removals are represented with None
+    values (this is how merge mode of the config module expects them).
+    """
+    sections = {}
+    for change in pending:
+        section, name = change["section"], change["name"]
+        value = change["value"]
+        if name is None:
+            sections[section] = value
+            continue
+        if not isinstance(sections.get(section), dict):
+            sections[section] = {}
+        sections[section][name] = value
+    return sections
+
+
+class DeferredAction(ActionBase):
+    """
+    Base for the actions that can defer changes until steampunk.unit.flush.
+
+    If the steampunk_unit_defer variable is set to true, the action records
+    the object that the module would create (or remove) in the pending
+    changes host fact instead of running the module. Subclasses implement
+    the module_args method that returns the arguments of their module (the
+    same ones that the module passes to AnsibleModule) and the defer method
+    that converts validated task parameters into (section, name, value)
+    triplet or return None if the task cannot be deferred.
+
+    Task arguments are validated on the controller the same way the module
+    would validate them, and invalid arguments fail the task. Tasks with
+    path options that need to be expanded on the managed host are not
+    deferred.
+
+    Deferred tasks do not know whether their change will modify the
+    configuration, so they report no change. The flush task reports the
+    actual change. Tasks with their own provider are never deferred, since
+    the flush task applies all changes using its own provider.
+    """
+
+    TRANSFERS_FILES = False
+
+    def module_args(self):
+        raise NotImplementedError()
+
+    def defer(self, args):
+        raise NotImplementedError()
+
+    def validate(self):
+        """
+        Validate task arguments and return parameters of the deferred task.
+
+        Returns None if the task should run on the managed host. Raises
+        UnitError if the arguments are not valid.
+        """
+        module_args, paths = controller_args(self.module_args())
+        validator = ArgumentSpecValidator(**module_args)
+        validation = validator.validate(self._task.args)
+        if validation.error_messages:
+            # Same messages as the ones from AnsibleModule.
+            raise UnitError("\n".join(
+                "Unsupported parameters for ({0}) module: {1}".format(
+                    self._task.action, e,
+                ) if isinstance(e, UnsupportedError) else str(e)
+                for e in validation.errors
+            ))
+
+        params = validation.validated_parameters
+        if any(needs_host(params[name]) for name in paths):
+            return None
+        return params
+
+    def run(self, tmp=None, task_vars=None):
+        task_vars = task_vars or {}
+        result = super(DeferredAction, self).run(tmp, task_vars)
+
+        change = None
+        warning = None
+        if is_enabled(task_vars):
+            if self._task.args.get("provider"):
+                warning = (
+                    "Task was not deferred because it sets its own provider."
+                )
+            else:
+                try:
+                    params = self.validate()
+                    if params is None:
+                        warning = (
+                            "Task was not deferred because its paths need "
+                            "to be expanded on the managed host."
+                        )
+                    else:
+                        change = self.defer(params)
+                except UnitError as e:
+                    result.update(failed=True, msg=str(e))
+                    return result
+
+        if change is None:
+            result.update(self._execute_module(
+                task_vars=task_vars, wrap_async=self._task.async_val,
+            ))
+            if warning:
+                result["warnings"] = result.get("warnings", []) + [warning]
+            return result
+
+        section, name, value = change
+        pending = get_pending(task_vars)
+        pending.append(dict(section=section, name=name, value=value))
+        result.update(
+            changed=False,
+            deferred=True,
+            msg="Change was deferred until the steampunk.unit.flush task.",
+            ansible_facts={PENDING_FACT: pending},
+        )
+        return result
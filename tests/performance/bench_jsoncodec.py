@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Micro-benchmark of the JSON codec that the client uses. It encodes and
+# decodes generated Unit configurations of different sizes with the
+# standard json module and with the codec (which uses orjson if installed).
+#
+# Run it from the root of the ansible_collections tree:
+#
+#   python -m ansible_collections.steampunk.unit.tests.performance.\
+#       bench_jsoncodec
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import timeit
+
+from ansible_collections.steampunk.unit.plugins.module_utils import (
+    jsoncodec,
+)
+
+
+def listener(i):
+    return {"pass": "routes/r{0}".format(i)}
+
+
+def build_config(apps, routes, steps):
+    return dict(
+        listeners=dict(
+            ("127.0.0.1:{0}".format(8000 + i), listener(i))
+            for i in range(routes)
+        ),
+        applications=dict(
+            ("app{0}".format(i), dict(
+                type="python 3.8",
+                module="wsgi",
+                path="/srv/app{0}".format(i),
+                home="/srv/app{0}/venv".format(i),
+                environment=dict(APP_NAME="app{0}".format(i), DEBUG="0"),
+                processes=dict(max=4, spare=1, idle_timeout=20),
+                limits=dict(timeout=30, requests=1000),
+            )) for i in range(apps)
+        ),
+        routes=dict(
+            ("r{0}".format(r), [
+                dict(
+                    match=dict(
+                        uri=["/api/v{0}/*".format(s), "!/api/internal/*"],
+                        method=["GET", "POST"],
+                        headers=[{"Accept": "application/json"}],
+                    ),
+                    action={"pass": "applications/app{0}".format(s % apps)},
+                ) for s in range(steps)
+            ] + [dict(action=dict(share="/www/static/", fallback={
+                "return": 404,
+            }))])
+            for r in range(routes)
+        ),
+        settings=dict(http=dict(
+            header_read_timeout=30, body_read_timeout=30, send_timeout=30,
+            idle_timeout=180, max_body_size=8388608,
+        )),
+    )
+
+
+CONFIGS = [
+    ("small", build_config(5, 2, 5)),
+    ("medium", build_config(100, 50, 20)),
+    ("large", build_config(2000, 500, 50)),
+]
+
+
+def _best(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    print("JSON backend: {0}".format(jsoncodec.BACKEND))
+    print("{0:8} {1:>10} {2:>12} {3:>12} {4:>12} {5:>12}".format(
+        "config", "size", "dumps json", "dumps codec", "loads json",
+        "loads codec",
+    ))
+    for name, config in CONFIGS:
+        encoded = json.dumps(config, separators=(",", ":"))
+        data = encoded.encode("utf-8")
+        assert jsoncodec.dumps(config) == encoded
+        assert jsoncodec.loads(data) == config
+
+        number = max(1, 2000000 // len(data))
+        times = [
+            _best(lambda: json.dumps(config, separators=(",", ":")), number),
+            _best(lambda: jsoncodec.dumps(config), number),
+            _best(lambda: json.loads(data), number),
+            _best(lambda: jsoncodec.loads(data), number),
+        ]
+        print("{0:8} {1:>10} {2}".format(name, len(data), " ".join(
+            "{0:>9.3f} ms".format(t * 1000) for t in times
+        )))
+
+
+if __name__ == "__main__":
+    main()
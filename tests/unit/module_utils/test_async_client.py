@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import sys
+
+import pytest
+
+if sys.version_info < (3, 5):
+    pytest.skip("Async client requires python 3.5+", allow_module_level=True)
+
+import asyncio  # noqa: E402
+
+from ansible.module_utils.six.moves.urllib.parse import unquote  # noqa: E402
+
+from ansible_collections.steampunk.unit.plugins.module_utils import (  # noqa
+    async_client, errors,
+)
+
+
+class FakeUnit:
+    """ Unix socket server that mimics the Unit's configuration API. """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.requests = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _parent(self, segments):
+        node = self.tree
+        for segment in segments[:-1]:
+            if not isinstance(node, dict) or segment not in node:
+                return None
+            node = node[segment]
+        return node if isinstance(node, dict) else None
+
+    def _handle(self, method, path, body):
+        segments = [unquote(s) for s in path.split("/") if s]
+        if len(segments) == 1 and segments[0] not in self.tree:
+            return 400, {"error": "Unknown section."}
+        parent = self._parent(segments)
+        if method == "GET":
+            if parent is None or segments[-1] not in parent:
+                return 404, {"error": "Value doesn't exist."}
+            return 200, parent[segments[-1]]
+        missing = parent is None or segments[-1] not in parent
+        if parent is None or (method == "DELETE" and missing):
+            return 404, {"error": "Value doesn't exist."}
+        if method == "PUT":
+            parent[segments[-1]] = json.loads(body)
+        else:
+            del parent[segments[-1]]
+        return 200, {"success": "Reconfiguration done."}
+
+    async def serve(self, reader, writer):
+        self.connections += 1
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            method, path, _version = line.decode().split()
+            length = 0
+            while True:
+                header = (await reader.readline()).strip()
+                if not header:
+                    break
+                name, value = header.decode().split(":", 1)
+                if name.lower() == "content-length":
+                    length = int(value)
+            body = await reader.readexactly(length)
+
+            self.requests.append((method, path))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+
+            status, data = self._handle(method, path, body)
+            data = json.dumps(data).encode()
+            writer.write(
+                "HTTP/1.1 {0} X\r\nContent-Length: {1}\r\n\r\n".format(
+                    status, len(data),
+                ).encode() + data
+            )
+            await writer.drain()
+        writer.close()
+
+
+def _run(tmp_path, tree, scenario):
+    unit = FakeUnit(tree)
+
+    async def main():
+        path = str(tmp_path / "control.sock")
+        server = await asyncio.start_unix_server(unit.serve, path)
+        client = async_client.AsyncClient("unix://" + path, max_in_flight=3)
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+
+    return unit, async_client.run(main())
+
+
+class TestAsyncClient:
+    def test_get_many(self, tmp_path):
+        tree = dict(config=dict(applications=dict(
+            ("app{0}".format(i), dict(type="python")) for i in range(10)
+        )))
+
+        unit, result = _run(tmp_path, tree, lambda c: c.get_many([
+            ("config", "applications", "app{0}".format(i))
+            for i in range(10)
+        ] + [("config", "applications", "missing")]))
+
+        assert result == [dict(type="python")] * 10 + [{}]
+        assert unit.max_in_flight == 3
+        assert unit.connections == 3
+
+    def test_get_many_coalesces_identical_paths(self, tmp_path):
+        tree = dict(config=dict(applications=dict(a=dict(type="php"))))
+
+        unit, result = _run(tmp_path, tree, lambda c: c.get_many([
+            ("config", "applications", "a"),
+            ("config", "applications", "missing"),
+            ("config", "applications", "a"),
+            ("config", "applications", "missing"),
+        ]))
+
+        assert result == [dict(type="php"), {}, dict(type="php"), {}]
+        assert result[0] is not result[2]
+        assert sorted(unit.requests) == [
+            ("GET", "/config/applications/a"),
+            ("GET", "/config/applications/missing"),
+        ]
+
+    def test_sequential_gets_are_not_coalesced(self, tmp_path):
+        async def scenario(client):
+            await client.get(("config", ))
+            await client.get(("config", ))
+
+        unit, _result = _run(tmp_path, dict(config={}), scenario)
+
+        assert len(unit.requests) == 2
+
+    def test_put_creates_parents(self, tmp_path):
+        tree = dict(config={})
+
+        async def scenario(client):
+            await asyncio.gather(*(
+                client.put(("config", "listeners", "*:{0}".format(p)), dict(
+                    **{"pass": "routes"}
+                )) for p in (80, 81, 82)
+            ))
+            await client.delete(("config", "listeners", "*:81"))
+
+        unit, _result = _run(tmp_path, tree, scenario)
+
+        # Concurrent parent creation must not lose any of the listeners.
+        assert tree == dict(config=dict(listeners={
+            "*:80": {"pass": "routes"}, "*:82": {"pass": "routes"},
+        }))
+
+    def test_errors(self, tmp_path):
+        async def scenario(client):
+            with pytest.raises(errors.UnitError, match="404"):
+                await client.delete(("config", "missing"))
+            with pytest.raises(errors.UnitError, match="400"):
+                await client.put(("missing", "a"), {})
+
+        _run(tmp_path, dict(config={}), scenario)
+
+    def test_connection_failure(self, tmp_path):
+        client = async_client.AsyncClient(
+            "unix://" + str(tmp_path / "missing"),
+        )
+
+        with pytest.raises(errors.UnitError, match="GET request failed"):
+            async_client.run(client.get(("config", )))
+
+    def test_invalid_endpoint(self):
+        with pytest.raises(errors.UnitError, match="Endpoint"):
+            async_client.AsyncClient("ftp://host")
+
+    def test_tcp_auth_prefix(self):
+        client = async_client.AsyncClient(
+            "http://host:8080/unit/", username="user", password="pass",
+        )
+
+        assert client._address == ("host", 8080)
+        assert client._prefix == "/unit"
+        assert client._headers == {"Authorization": "Basic dXNlcjpwYXNz"}
@@ -6,14 +6,18 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
-import pytest
+import socket
+import threading
+import time
 
-from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+import pytest
 
 from ansible_collections.steampunk.unit.plugins.module_utils import (
-    client, errors,
+    client, errors, transport,
 )
 
+TIMEOUTS = transport.DEFAULT_TIMEOUT, transport.DEFAULT_TIMEOUT
+
 
 class TestResponseInit:
     def test_with_valid_json(self):
@@ -31,6 +35,34 @@ class TestResponseInit:
         with pytest.raises(errors.UnitError, match="invalid json"):
             resp.json
 
+    def test_binary_body(self):
+        resp = client.Response(200, bytearray(b'{"a": "\xc4\x8d"}'))
+
+        assert resp.json == {"a": u"\u010d"}
+        # Raw body is released once we decode it.
+        assert resp._raw is None
+        assert resp.data == '{"a":"\\u010d"}'
+
+    def test_extract(self):
+        resp = client.Response(200, b'{"a": [{"b": 1}, {"c": [2]}], "d": 3}')
+
+        assert resp.extract(("a", "1", "c")) == (True, [2])
+        assert resp.extract(("a", "2")) == (False, None)
+        assert resp._raw is not None
+
+    def test_extract_decoded(self):
+        resp = client.Response(200, '{"a": {"b": 1}}')
+        resp.json["a"]["b"] = 2
+
+        found, value = resp.extract(("a", ))
+        value["b"] = 3
+
+        assert (found, resp.json) == (True, {"a": {"b": 2}})
+
+    def test_extract_invalid_json(self):
+        with pytest.raises(errors.UnitError, match="invalid json"):
+            client.Response(200, b'{"a": ').extract(("a", ))
+
 
 class TestClientInit:
     @pytest.mark.parametrize("prefix", [
@@ -40,126 +72,97 @@ class TestClientInit:
         "unix://",  # missing / at the end (socket paths should be absolute)
     ])
     def test_invalid_prefix(self, mocker, prefix):
-        mocker.patch.object(client, "Request")
+        mocker.patch.object(transport, "get_pool")
 
         with pytest.raises(errors.UnitError, match="start with"):
             client.Client(prefix + "some/path", None, None, False, None)
 
     def test_unix_socket_parse(self, mocker):
-        request = mocker.patch.object(client, "Request")
+        get_pool = mocker.patch.object(transport, "get_pool")
 
         client.Client("unix:///var/run/sock", "u", "p", True, "ca")
 
-        request.assert_called_once_with(unix_socket="/var/run/sock")
+        get_pool.assert_called_once_with(
+            "unix:///var/run/sock", "u", "p", True, "ca",
+        )
 
     @pytest.mark.parametrize("prefix", ["http", "https"])
     def test_ip_socket_parse(self, mocker, prefix):
-        request = mocker.patch.object(client, "Request")
+        get_pool = mocker.patch.object(transport, "get_pool")
 
         client.Client(prefix + "://domain.name", "u", "p", True, "ca")
 
-        request.assert_called_once_with(
-            url_username="u", url_password="p", force_basic_auth=True,
-            validate_certs=True, ca_path="ca",
+        get_pool.assert_called_once_with(
+            prefix + "://domain.name", "u", "p", True, "ca",
         )
 
+    def test_invalid_put_strategy(self, mocker):
+        mocker.patch.object(transport, "get_pool")
 
-class TestClientRequest:
-    def test_ok_using_unix_socket_no_data(self, mocker):
-        request = mocker.patch.object(client, "Request").return_value
-        request.open.return_value.getcode.return_value = 200
-        request.open.return_value.read.return_value = '{"k": "v"}'
-        c = client.Client("unix:///path", "u", "p", True, "ca")
+        with pytest.raises(errors.UnitError, match="PUT strategy"):
+            client.Client("https://host", "u", "p", True, "ca", "fast")
 
-        r = c.request("GET", ("config", "routes"))
 
-        request.open.assert_called_once_with(
-            method="GET", url="http://localhost/config/routes", data=None,
-        )
-        assert r.status == 200
-        assert r.json == dict(k="v")
-
-    def test_ok_using_unix_socket_with_data(self, mocker):
-        request = mocker.patch.object(client, "Request").return_value
-        request.open.return_value.getcode.return_value = 404
-        request.open.return_value.read.return_value = '{"k": "v"}'
+class TestClientRequest:
+    def test_ok_no_data(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.return_value = 200, b'{"k": "v"}'
         c = client.Client("unix:///path", "u", "p", True, "ca")
 
-        r = c.request("PUT", ("config", "listeners"), dict(my="data"))
-
-        request.open.assert_called_once_with(
-            method="PUT", url="http://localhost/config/listeners",
-            data='{"my":"data"}',
-        )
-        assert r.status == 404
-        assert r.json == dict(k="v")
-
-    def test_ok_using_ip_socket_no_data(self, mocker):
-        request = mocker.patch.object(client, "Request").return_value
-        request.open.return_value.getcode.return_value = 200
-        request.open.return_value.read.return_value = '{"k": "v"}'
-        c = client.Client("http://host/", "u", "p", True, "ca")
-
         r = c.request("GET", ("config", "routes"))
 
-        request.open.assert_called_once_with(
-            method="GET", url="http://host/config/routes", data=None,
+        pool.request.assert_called_once_with(
+            "GET", "/config/routes", None, TIMEOUTS,
         )
         assert r.status == 200
         assert r.json == dict(k="v")
 
-    def test_ok_using_ip_socket_with_data(self, mocker):
-        request = mocker.patch.object(client, "Request").return_value
-        request.open.return_value.getcode.return_value = 404
-        request.open.return_value.read.return_value = '{"k": "v"}'
+    def test_ok_with_data(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.return_value = 404, b'{"k": "v"}'
         c = client.Client("https://host", "u", "p", True, "ca")
 
-        r = c.request("PUT", ("config", "applications"), dict(number=4))
+        r = c.request("PUT", ("config", "listeners"), dict(my="data"))
 
-        request.open.assert_called_once_with(
-            method="PUT", url="https://host/config/applications",
-            data='{"number":4}',
+        pool.request.assert_called_once_with(
+            "PUT", "/config/listeners", '{"my":"data"}', TIMEOUTS,
         )
         assert r.status == 404
         assert r.json == dict(k="v")
 
     def test_path_escaping(self, mocker):
-        request = mocker.patch.object(client, "Request").return_value
-        request.open.return_value.getcode.return_value = 200
-        request.open.return_value.read.return_value = ""
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.return_value = 200, b""
         c = client.Client("https://host", "u", "p", True, "ca")
 
         c.request("PUT", ("config", "a/b"))
 
-        request.open.assert_called_once_with(
-            method="PUT", url="https://host/config/a%2Fb", data=None,
+        pool.request.assert_called_once_with(
+            "PUT", "/config/a%2Fb", None, TIMEOUTS,
         )
 
     def test_empty_path(self, mocker):
-        request = mocker.patch.object(client, "Request").return_value
-        request.open.return_value.getcode.return_value = 200
-        request.open.return_value.read.return_value = ""
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.return_value = 200, b""
         c = client.Client("https://host", "u", "p", True, "ca")
 
         c.request("PUT", ())
 
-        request.open.assert_called_once_with(
-            method="PUT", url="https://host", data=None,
-        )
+        pool.request.assert_called_once_with("PUT", "/", None, TIMEOUTS)
 
     def test_http_error_handling(self, mocker):
-        request = mocker.patch.object(client, "Request").return_value
-        request.open.side_effect = HTTPError("url", 404, "missing", {}, None)
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.return_value = 404, b'{"error": "missing"}'
         c = client.Client("https://host", "u", "p", True, "ca")
 
         r = c.request("PUT", ("config", "a/b"))
 
         assert r.status == 404
-        assert r.data == "missing"
+        assert r.data == '{"error": "missing"}'
 
-    def test_url_error_handling(self, mocker):
-        request = mocker.patch.object(client, "Request").return_value
-        request.open.side_effect = URLError("bad error")
+    def test_connection_error_handling(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.side_effect = socket.error("bad error")
         c = client.Client("https://host", "u", "p", True, "ca")
 
         with pytest.raises(errors.UnitError, match="request failed"):
@@ -198,10 +201,389 @@ class TestClientGet:
         request.assert_called_once_with("GET", ("a", "b"))
 
 
-class TestClientPut:
-    def test_ok_on_first_try(self, mocker):
+class TestClientGetSubtree:
+    def test_truncated_response(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(200, b'{"a": [' + b"1," * 20)
+
+        with pytest.raises(errors.UnitError, match="invalid json"):
+            c.get(("config", "applications"), ("b", ))
+
+    def test_only_subtree_is_decoded(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(
+            200, b'{"a": {"type": "python"}, "b": {"type": "php"}}',
+        )
+        loads = mocker.spy(client.json, "loads")
+
+        assert c.get(("config", "applications"), ("b", )) == dict(type="php")
+
+        assert [call[0][0] for call in loads.call_args_list] == [
+            '{"type": "php"}',
+        ]
+
+    def test_missing_subtree(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(200, b'{"a": {}}')
+
+        assert c.get(("config", "applications"), ("b", "type")) == {}
+
+
+class TestClientMemo:
+    def test_repeated_get(self, mocker):
         c = client.Client("https://host", "u", "p", True, "ca")
         request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(200, b'{"a": {"type": "php"}}'),
+            Exception("Should not reach this"),
+        )
+
+        first = c.get(("config", "applications"))
+        first["b"] = {}
+
+        assert c.get(("config", "applications")) == dict(a=dict(type="php"))
+        assert c.get(("config", "applications"), ("a", "type")) == "php"
+        request.assert_called_once_with("GET", ("config", "applications"))
+
+    def test_missing_path(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(404, "")
+
+        assert c.get(("config", "applications", "a")) == {}
+        assert c.get(("config", "applications", "a")) == {}
+
+        assert request.call_count == 1
+
+    def test_failure_is_not_memoized(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(503, ""),
+            client.Response(200, '{"k": "v"}'),
+        )
+
+        with pytest.raises(errors.UnitError, match="503"):
+            c.get(("a", "b"))
+
+        assert c.get(("a", "b")) == dict(k="v")
+
+    @pytest.mark.parametrize("changed", [
+        ("a", ), ("a", "b"), ("a", "b", "c"),
+    ])
+    def test_put_invalidates(self, mocker, changed):
+        c = client.Client("https://host", "u", "p", True, "ca", "walk")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = lambda *args: client.Response(200, "{}")
+        c.get(("a", "b"))
+        c.get(("x", "y"))
+
+        c.put(changed, {})
+        c.get(("a", "b"))
+        c.get(("x", "y"))
+
+        assert request.call_args_list == [
+            mocker.call("GET", ("a", "b")),
+            mocker.call("GET", ("x", "y")),
+            mocker.call("PUT", changed, {}),
+            mocker.call("GET", ("a", "b")),
+        ]
+
+    @pytest.mark.parametrize("changed", [
+        ("a", ), ("a", "b"), ("a", "b", "c"),
+    ])
+    def test_delete_invalidates(self, mocker, changed):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = lambda *args: client.Response(200, "{}")
+        c.get(("a", "b"))
+        c.get(("x", "y"))
+
+        c.delete(changed)
+        c.get(("a", "b"))
+        c.get(("x", "y"))
+
+        assert request.call_args_list == [
+            mocker.call("GET", ("a", "b")),
+            mocker.call("GET", ("x", "y")),
+            mocker.call("DELETE", changed),
+            mocker.call("GET", ("a", "b")),
+        ]
+
+    def test_sibling_is_kept(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", "walk")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = lambda *args: client.Response(200, "{}")
+        c.get(("a", "b"))
+
+        c.delete(("a", "bb"))
+        c.get(("a", "b"))
+
+        assert request.call_count == 2
+
+    def test_large_response_is_not_memoized(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        c.MEMO_ENTRY_LIMIT = len('{"k": "small"}')
+        request = mocker.patch.object(c, "request")
+        request.side_effect = lambda *args: client.Response(
+            200, '{{"k": "{0}"}}'.format(args[1][-1]),
+        )
+
+        assert c.get(("a", "small")) == dict(k="small")
+        assert c.get(("a", "larger")) == dict(k="larger")
+        c.get(("a", "small"))
+        c.get(("a", "larger"))
+
+        assert request.call_args_list == [
+            mocker.call("GET", ("a", "small")),
+            mocker.call("GET", ("a", "larger")),
+            mocker.call("GET", ("a", "larger")),
+        ]
+
+    def test_memo_size_is_limited(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", "walk")
+        c.MEMO_LIMIT = 2 * len('{"k": 1}')
+        request = mocker.patch.object(c, "request")
+        request.side_effect = lambda *args: client.Response(200, '{"k": 1}')
+
+        for name in ("a", "b", "c", "a", "b", "c"):
+            c.get(("x", name))
+        c.delete(("x", "a"))
+        c.get(("x", "c"))
+        c.get(("x", "c"))
+
+        assert [call[0][:2] for call in request.call_args_list] == [
+            ("GET", ("x", "a")),
+            ("GET", ("x", "b")),
+            ("GET", ("x", "c")),
+            ("GET", ("x", "c")),
+            ("DELETE", ("x", "a")),
+            ("GET", ("x", "c")),
+        ]
+
+    def test_put_file(self, mocker, tmp_path):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = lambda *args: client.Response(200, "{}")
+        path = tmp_path / "config.json"
+        path.write_text(u"{}")
+        c.get(("config", "listeners"))
+
+        with path.open("rb") as fd:
+            c.put_file(("config", ), fd)
+        c.get(("config", "listeners"))
+
+        assert request.call_count == 3
+
+    def test_get_during_change_is_not_memoized(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", "walk")
+        responses = iter((
+            client.Response(200, '{"old": 1}'),
+            client.Response(200, '{"new": 1}'),
+        ))
+
+        def request(method, path, data=None):
+            if method == "PUT":
+                # Concurrent read that completes while PUT is in flight.
+                assert c.get(("a", )) == dict(old=1)
+                return client.Response(200, "")
+            return next(responses)
+
+        mocker.patch.object(c, "request", side_effect=request)
+
+        c.put(("a", "b"), 1)
+
+        assert c.get(("a", )) == dict(new=1)
+
+    def test_concurrent_gets_are_coalesced(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        started = threading.Event()
+        release = threading.Event()
+
+        def request(method, path, data=None):
+            started.set()
+            release.wait(5)
+            return client.Response(200, '{"k": "v"}')
+
+        request = mocker.patch.object(c, "request", side_effect=request)
+        results = []
+
+        def get():
+            results.append(c.get(("a", "b")))
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        request.assert_called_once_with("GET", ("a", "b"))
+        assert results == [dict(k="v")] * 4
+        assert len(set(id(r) for r in results)) == 4
+
+    def test_waiters_retry_after_failure(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def request(method, path, data=None):
+            calls.append(path)
+            if len(calls) == 1:
+                started.set()
+                release.wait(5)
+                raise errors.UnitError("GET request failed: boom")
+            return client.Response(200, '{"k": "v"}')
+
+        mocker.patch.object(c, "request", side_effect=request)
+        results = []
+
+        def first():
+            with pytest.raises(errors.UnitError, match="boom"):
+                c.get(("a", ))
+
+        leader = threading.Thread(target=first)
+        leader.start()
+        started.wait(5)
+        waiter = threading.Thread(
+            target=lambda: results.append(c.get(("a", ))),
+        )
+        waiter.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join(5)
+        waiter.join(5)
+
+        assert results == [dict(k="v")]
+        assert len(calls) == 2
+
+
+class TestClientSnapshot:
+    CONFIG = (
+        '{"applications": {"a": {"type": "python"}, "b": {"type": "php"}},'
+        ' "routes": [{"action": {"pass": "applications/a"}}]}'
+    )
+
+    def test_single_request(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", snapshot=True)
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(200, self.CONFIG),
+            Exception("Should not reach this"),
+        )
+
+        assert c.get(("config", "applications", "a")) == dict(type="python")
+        assert c.get(("config", "applications", "b")) == dict(type="php")
+        assert c.get(("config", "applications", "c")) == {}
+        assert c.get(("config", "routes", "0", "action")) == dict(
+            **{"pass": "applications/a"}
+        )
+        assert c.get(("config", "routes", "1")) == {}
+
+        request.assert_called_once_with("GET", ("config", ))
+
+    def test_returns_copies(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", snapshot=True)
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(200, self.CONFIG)
+
+        c.get(("config", "applications", "a"))["type"] = "perl"
+
+        assert c.get(("config", "applications", "a")) == dict(type="python")
+
+    def test_paths_outside_config(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", snapshot=True)
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(200, '{"a": 1}')
+
+        c.get(("certificates", "bundle"))
+        c.get(("certificates", "bundle"))
+
+        request.assert_called_once_with("GET", ("certificates", "bundle"))
+
+    def test_put_patches_snapshot(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", snapshot=True)
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(200, self.CONFIG),
+            client.Response(200, ""),
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.get(("config", "applications", "a"))
+        c.put(("config", "listeners", "*:80"), {"pass": "applications/a"})
+        c.put(("config", "applications", "b", "processes"), 3)
+
+        assert c.get(("config", "listeners")) == {
+            "*:80": {"pass": "applications/a"},
+        }
+        assert c.get(("config", "applications", "b")) == dict(
+            type="php", processes=3,
+        )
+        # Ancestors were found in the snapshot, so no GET was needed.
+        request.assert_has_calls((
+            mocker.call("GET", ("config", )),
+            mocker.call(
+                "PUT", ("config", "listeners"),
+                {"*:80": {"pass": "applications/a"}},
+            ),
+            mocker.call(
+                "PUT", ("config", "applications", "b", "processes"), 3,
+            ),
+        ))
+
+    def test_delete_patches_snapshot(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", snapshot=True)
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(200, self.CONFIG),
+            client.Response(200, ""),
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.get(("config", ))
+        c.delete(("config", "applications", "a"))
+        c.delete(("config", "routes", "0"))
+
+        assert c.get(("config", )) == dict(applications=dict(b=dict(
+            type="php",
+        )), routes=[])
+
+    def test_subtree(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", snapshot=True)
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(200, self.CONFIG)
+
+        assert c.get(("config", ), ("applications", "b")) == dict(type="php")
+        request.assert_called_once_with("GET", ("config", ))
+
+    def test_disabled_by_default(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = lambda *args: client.Response(200, '{"a": 1}')
+
+        c.get(("config", "applications"))
+        c.get(("config", "listeners"))
+
+        request.assert_has_calls((
+            mocker.call("GET", ("config", "applications")),
+            mocker.call("GET", ("config", "listeners")),
+        ))
+
+
+class TestClientPutWalk:
+    def test_ok_on_first_try(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", "walk")
+        request = mocker.patch.object(c, "request")
         request.side_effect = (
             client.Response(200, '{"k":"v"}'),
             Exception("Should not reach this"),
@@ -212,7 +594,7 @@ class TestClientPut:
         request.assert_called_once_with("PUT", ("a", "b"), dict(my=5))
 
     def test_ok_on_third_retry(self, mocker):
-        c = client.Client("https://host", "u", "p", True, "ca")
+        c = client.Client("https://host", "u", "p", True, "ca", "walk")
         request = mocker.patch.object(c, "request")
         request.side_effect = (
             client.Response(404, ""),
@@ -231,7 +613,7 @@ class TestClientPut:
         ))
 
     def test_run_out_of_path_segments(self, mocker):
-        c = client.Client("https://host", "u", "p", True, "ca")
+        c = client.Client("https://host", "u", "p", True, "ca", "walk")
         request = mocker.patch.object(c, "request")
         request.side_effect = (
             client.Response(404, ""),
@@ -245,7 +627,7 @@ class TestClientPut:
         assert request.call_count == 2
 
     def test_error_during_retry(self, mocker):
-        c = client.Client("https://host", "u", "p", True, "ca")
+        c = client.Client("https://host", "u", "p", True, "ca", "walk")
         request = mocker.patch.object(c, "request")
         request.side_effect = (
             client.Response(404, ""),
@@ -259,6 +641,232 @@ class TestClientPut:
         assert request.call_count == 2
 
 
+class TestClientPutLookup:
+    def test_parent_is_root_section(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.put(("a", "b"), dict(my=5))
+
+        request.assert_called_once_with("PUT", ("a", "b"), dict(my=5))
+        assert c.saved_round_trips == 0
+
+    def test_parent_known_from_get(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(200, '{"x": 1}'),
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.get(("a", "b", "c", "d"))
+        c.put(("a", "b", "c", "d", "e"), dict(my=5))
+
+        assert request.call_count == 2
+        request.assert_called_with(
+            "PUT", ("a", "b", "c", "d", "e"), dict(my=5),
+        )
+        assert c.saved_round_trips == 0
+
+    def test_new_object_in_existing_section(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.put(("config", "applications", "new"), dict(type="php"))
+
+        request.assert_called_once_with(
+            "PUT", ("config", "applications", "new"), dict(type="php"),
+        )
+        assert c.saved_round_trips == 0
+
+    def test_missing_section_under_root(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(404, ""),
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.put(("a", "b", "c"), dict(my=5))
+
+        # Root section always exists, so there is nothing to look up.
+        assert request.call_args_list == [
+            mocker.call("PUT", ("a", "b", "c"), dict(my=5)),
+            mocker.call("PUT", ("a", "b"), dict(c=dict(my=5))),
+        ]
+        assert c.saved_round_trips == 0
+
+    def test_missing_section(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(404, ""),
+            client.Response(404, ""),
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.put(("a", "b", "c", "d", "e"), dict(my=5))
+
+        assert request.call_args_list == [
+            mocker.call("PUT", ("a", "b", "c", "d", "e"), dict(my=5)),
+            mocker.call("GET", ("a", "b")),
+            mocker.call("PUT", ("a", "b"), dict(c=dict(d=dict(e=dict(
+                my=5,
+            ))))),
+        ]
+        assert c.saved_round_trips == 1
+
+    def test_missing_nested_section(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(404, ""),
+            client.Response(200, '{"c": {"x": 1}}'),
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.put(("a", "b", "c", "d", "e", "f", "g"), dict(my=5))
+
+        assert request.call_args_list == [
+            mocker.call("PUT", ("a", "b", "c", "d", "e", "f", "g"), dict(
+                my=5,
+            )),
+            mocker.call("GET", ("a", "b")),
+            mocker.call("PUT", ("a", "b", "c", "d"), dict(e=dict(f=dict(
+                g=dict(my=5),
+            )))),
+        ]
+        assert c.saved_round_trips == 1
+
+    def test_grandparent_known(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        c.mark_existing(("a", "b", "c"))
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(404, ""),
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.put(("a", "b", "c", "d", "e"), dict(my=5))
+
+        assert request.call_args_list == [
+            mocker.call("PUT", ("a", "b", "c", "d", "e"), dict(my=5)),
+            mocker.call("PUT", ("a", "b", "c", "d"), dict(e=dict(my=5))),
+        ]
+
+    def test_snapshot_knows_ancestors(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca", snapshot=True)
+        c._config = dict(applications={})
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.put(("config", "applications", "a", "limits", "timeout"), 3)
+
+        request.assert_called_once_with(
+            "PUT", ("config", "applications", "a"), dict(limits=dict(
+                timeout=3,
+            )),
+        )
+        assert c.saved_round_trips == 2
+
+    def test_stale_lookup_falls_back_to_walk(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(404, ""),
+            client.Response(200, '{}'),
+            client.Response(404, ""),
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.put(("a", "b", "c", "d"), dict(my=5))
+
+        assert request.call_args_list == [
+            mocker.call("PUT", ("a", "b", "c", "d"), dict(my=5)),
+            mocker.call("GET", ("a", "b")),
+            mocker.call("PUT", ("a", "b", "c"), dict(d=dict(my=5))),
+            mocker.call("PUT", ("a", "b"), dict(c=dict(d=dict(my=5)))),
+        ]
+        assert c.saved_round_trips == -2
+
+    def test_error(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(400, "")
+
+        with pytest.raises(errors.UnitError, match="400"):
+            c.put(("a", "b"), dict(my=5))
+
+    def test_deleted_parent_is_forgotten(self, mocker):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.side_effect = (
+            client.Response(200, ""),
+            client.Response(200, ""),
+            client.Response(404, ""),
+            client.Response(404, ""),
+            client.Response(200, ""),
+            Exception("Should not reach this"),
+        )
+
+        c.put(("a", "b", "c", "d"), dict(my=5))
+        c.delete(("a", "b"))
+        c.put(("a", "b", "c", "d"), dict(my=6))
+
+        assert request.call_args_list == [
+            mocker.call("PUT", ("a", "b", "c", "d"), dict(my=5)),
+            mocker.call("DELETE", ("a", "b")),
+            mocker.call("PUT", ("a", "b", "c", "d"), dict(my=6)),
+            mocker.call("GET", ("a", "b")),
+            mocker.call("PUT", ("a", "b"), dict(c=dict(d=dict(my=6)))),
+        ]
+
+
+class TestClientPutFile:
+    def test_ok(self, mocker, tmp_path):
+        c = client.Client("https://host", "u", "p", True, "ca", snapshot=True)
+        c._config = {}
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(200, "")
+        path = tmp_path / "config.json"
+        path.write_text(u'{"listeners": {}}')
+
+        with path.open("rb") as fd:
+            c.put_file(("config", ), fd)
+
+        (method, url, body), _kwargs = request.call_args
+        assert (method, url, len(body)) == ("PUT", ("config", ), 17)
+        assert c._config is None
+
+    def test_error(self, mocker, tmp_path):
+        c = client.Client("https://host", "u", "p", True, "ca")
+        request = mocker.patch.object(c, "request")
+        request.return_value = client.Response(400, "")
+        path = tmp_path / "config.json"
+        path.write_text(u"{}")
+
+        with path.open("rb") as fd:
+            with pytest.raises(errors.UnitError, match="400"):
+                c.put_file(("config", ), fd)
+
+
 class TestClientDelete:
     def test_ok(self, mocker):
         c = client.Client("https://host", "u", "p", True, "ca")
@@ -280,11 +888,238 @@ class TestClientDelete:
         request.assert_called_once_with("DELETE", ("a", "b"))
 
 
+class TestClientTimeouts:
+    def test_custom_timeouts(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.return_value = 200, b"{}"
+        c = client.Client(
+            "unix:///sock", None, None, True, None, connect_timeout=0.5,
+            read_timeout=30,
+        )
+
+        c.get(("config", ))
+
+        pool.request.assert_called_once_with("GET", "/config", None, (0.5, 30))
+
+    @pytest.mark.parametrize("option", ["connect_timeout", "read_timeout"])
+    def test_invalid_timeout(self, option):
+        with pytest.raises(errors.UnitError, match="positive"):
+            client.Client("unix:///sock", None, None, True, None, **{
+                option: -1,
+            })
+
+    def test_deadline_caps_timeouts(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.return_value = 200, b"{}"
+        c = client.Client("unix:///sock", None, None, True, None)
+        c.deadline = client.Deadline(3)
+
+        c.get(("config", ))
+
+        (_method, _url, _body, timeouts), _kwargs = pool.request.call_args
+        assert 2 < timeouts[0] <= 3
+        assert 2 < timeouts[1] <= 3
+        assert client.READS in c.deadline.spent
+
+    def test_expired_deadline(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        c = client.Client("unix:///sock", None, None, True, None)
+        c.deadline = client.Deadline(3)
+        c.deadline.expires = time.time() - 1
+
+        with pytest.raises(errors.UnitError, match="during configuration ch"):
+            c.delete(("config", "listeners", "*:80"))
+
+        pool.request.assert_not_called()
+
+    def test_request_runs_out_of_time(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        c = client.Client("unix:///sock", None, None, True, None)
+        c.deadline = client.Deadline(3)
+
+        def request(*args):
+            c.deadline.expires = time.time()
+            raise socket.timeout("timed out")
+
+        pool.request.side_effect = request
+
+        with pytest.raises(errors.UnitError, match="Deadline of 3 seconds"):
+            c.put(("config", "listeners", "*:80"), {"pass": "routes"})
+
+
+class TestDeadline:
+    def test_error_reports_phases(self):
+        deadline = client.Deadline(5)
+        start = time.time()
+        deadline.spend(client.DISCOVERY, start - 1)
+        deadline.spend(client.READS, start - 3)
+        deadline.spend(client.READS, start - 1)
+
+        assert str(deadline.error(client.READS)) == (
+            "Deadline of 5 seconds expired during configuration reads (time "
+            "spent: configuration reads 4.00 s, endpoint discovery 1.00 s)."
+        )
+
+    def test_remaining(self):
+        deadline = client.Deadline(5)
+
+        assert 4 < deadline.remaining(client.READS) <= 5
+        assert deadline.expired() is False
+
+        deadline.expires = time.time()
+        assert deadline.expired() is True
+        with pytest.raises(errors.UnitError, match="endpoint discovery"):
+            deadline.remaining(client.DISCOVERY)
+
+    def test_invalid_budget(self):
+        with pytest.raises(errors.UnitError, match="positive"):
+            client.Deadline(0)
+
+
+class TestClientProbe:
+    def test_alive(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.probe.return_value = 200, "Unit/1.18.0"
+        c = client.Client("unix:///sock", None, None, True, None)
+
+        assert c.probe(3) is True
+
+        pool.probe.assert_called_once_with("/config/settings", 3)
+        assert c.version == "1.18.0"
+
+    def test_deadline_caps_timeout(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.probe.return_value = 200, "Unit/1.18.0"
+        c = client.Client("unix:///sock", None, None, True, None)
+        c.deadline = client.Deadline(1)
+
+        c.probe(3)
+
+        (_path, timeout), _kwargs = pool.probe.call_args
+        assert 0 < timeout <= 1
+        assert client.DISCOVERY in c.deadline.spent
+
+    def test_alive_no_settings(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.probe.return_value = 404, None
+        c = client.Client("unix:///sock", None, None, True, None)
+
+        assert c.probe(3) is True
+        assert c.version is None
+
+    def test_bad_status(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.probe.return_value = 401, "Unit/1.18.0"
+        c = client.Client("https://host", None, None, True, None)
+
+        assert c.probe(3) is False
+
+    def test_connection_error(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.probe.side_effect = socket.error("missing")
+        c = client.Client("unix:///sock", None, None, True, None)
+
+        assert c.probe(3) is False
+
+
+class TestMetrics:
+    @pytest.fixture(autouse=True)
+    def clients(self, mocker):
+        return mocker.patch.object(client, "_CLIENTS", [])
+
+    def test_disabled(self, mocker):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.return_value = 200, b"{}"
+        c = client.Client("unix:///sock", None, None, True, None)
+        c.get(("config", ))
+
+        assert c.requests == []
+        assert client.add_metrics(dict(changed=True)) == dict(changed=True)
+
+    def test_requests(self, mocker, clients):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        pool.request.side_effect = [
+            (404, b"{}"), (200, b'{"success": "done"}'), socket.error("x"),
+        ]
+        c = client.Client(
+            "unix:///sock", None, None, True, None, "walk", metrics=True,
+        )
+        clients.append(c)
+
+        c.put(("config", "a"), {"b": 1})
+        with pytest.raises(errors.UnitError):
+            c.get(("config", "a"))
+
+        metrics = client.add_metrics({})["metrics"]
+        assert [
+            (r["method"], r["path"], r["status"], r["request_bytes"],
+             r["response_bytes"]) for r in metrics["requests"]
+        ] == [
+            ("PUT", "/config/a", 404, 7, 2),
+            ("PUT", "/config", 200, 13, 19),
+            ("GET", "/config/a", None, 0, 0),
+        ]
+        assert metrics["request_count"] == 3
+        assert metrics["request_bytes"] == 20
+        assert metrics["response_bytes"] == 21
+        assert metrics["put_retries"] == 1
+        assert metrics["saved_round_trips"] == 0
+        assert metrics["request_time"] >= 0
+
+    def test_sizes_are_in_bytes(self, mocker, clients):
+        pool = mocker.patch.object(transport, "get_pool").return_value
+        # Persistent connection returns text.
+        pool.request.return_value = 200, u'{"a": "\u010d"}'
+        c = client.Client(
+            "unix:///sock", None, None, True, None, metrics=True,
+        )
+        clients.append(c)
+
+        c.put(("config", ), {"a": u"\u010d"})
+
+        request, = client.add_metrics({})["metrics"]["requests"]
+        assert request["request_bytes"] == len(b'{"a":"\\u010d"}')
+        assert request["response_bytes"] == len(u'{"a": "\u010d"}') + 1
+
+    def test_discovery(self, mocker, clients):
+        mocker.patch.object(client, "_get_cached_endpoint").return_value = (
+            dict(endpoint="unix:///sock", version="1.18.0")
+        )
+        mocker.patch.object(transport, "get_pool")
+
+        c = client.get_client(dict(
+            endpoint=None, username=None, password=None, verify=True,
+            ca_path=None, snapshot=False, metrics=True,
+        ))
+
+        assert clients == [c]
+        metrics = client.add_metrics({})["metrics"]
+        assert metrics["discovery_cached"] is True
+        assert metrics["discovery_time"] >= 0
+        assert metrics["request_count"] == 0
+
+
+def _client_mock(mocker, endpoint, alive):
+    c = mocker.Mock(endpoint=endpoint, version="1.18.0")
+    c.probe.return_value = alive
+    return c
+
+
 class TestGetClient:
+    @pytest.fixture(autouse=True)
+    def discovery_cache(self, mocker, tmp_path):
+        path = str(tmp_path / "discovery.json")
+        mocker.patch.object(client, "_DISCOVERY_CACHE", path)
+        mocker.patch.object(client, "_CLIENTS", [])
+        return path
+
     def test_no_endpoint_first_default(self, mocker):
+        c1 = _client_mock(mocker, "unix:///var/run/unit/control.sock", True)
+        c2 = _client_mock(mocker, "unix:///var/run/control.unit.sock", True)
         cmock = mocker.patch.object(client, "Client")
+        cmock.side_effect = (c1, c2)
 
-        client.get_client(dict(
+        c = client.get_client(dict(
             endpoint=None,
             username=None,
             password=None,
@@ -292,19 +1127,25 @@ class TestGetClient:
             ca_path=None,
         ))
 
-        cmock.assert_called_once_with(
-            "unix:///var/run/unit/control.sock", username=None, password=None,
-            verify=True, ca_path=None,
-        )
+        assert c is c1
+        cmock.assert_has_calls((
+            mocker.call(
+                "unix:///var/run/unit/control.sock", username=None,
+                password=None, verify=True, ca_path=None,
+            ),
+            mocker.call(
+                "unix:///var/run/control.unit.sock", username=None,
+                password=None, verify=True, ca_path=None,
+            ),
+        ))
 
     def test_no_endpoint_second_default(self, mocker):
-        c1 = mocker.Mock()
-        c1.get.side_effect = errors.UnitError("Fail")
-        c2 = mocker.Mock()
+        c1 = _client_mock(mocker, "unix:///var/run/unit/control.sock", False)
+        c2 = _client_mock(mocker, "unix:///var/run/control.unit.sock", True)
         cmock = mocker.patch.object(client, "Client")
         cmock.side_effect = (c1, c2)
 
-        client.get_client(dict(
+        c = client.get_client(dict(
             endpoint=None,
             username=None,
             password=None,
@@ -312,6 +1153,7 @@ class TestGetClient:
             ca_path="ca_path",
         ))
 
+        assert c is c2
         assert cmock.call_count == 2
         cmock.assert_has_calls((
             mocker.call(
@@ -325,10 +1167,8 @@ class TestGetClient:
         ))
 
     def test_no_endpoint_none_of_defauls(self, mocker):
-        c1 = mocker.Mock()
-        c1.get.side_effect = errors.UnitError("Fail1")
-        c2 = mocker.Mock()
-        c2.get.side_effect = errors.UnitError("Fail2")
+        c1 = _client_mock(mocker, "unix:///var/run/unit/control.sock", False)
+        c2 = _client_mock(mocker, "unix:///var/run/control.unit.sock", False)
         cmock = mocker.patch.object(client, "Client")
         cmock.side_effect = (c1, c2)
 
@@ -342,22 +1182,13 @@ class TestGetClient:
             ))
 
         assert cmock.call_count == 2
-        cmock.assert_has_calls((
-            mocker.call(
-                "unix:///var/run/unit/control.sock", username=None,
-                password="pass", verify=False, ca_path=None,
-            ),
-            mocker.call(
-                "unix:///var/run/control.unit.sock", username=None,
-                password="pass", verify=False, ca_path=None,
-            ),
-        ))
 
     def test_endpoint_ok(self, mocker):
         cmock = mocker.patch.object(client, "Client")
+        cmock.return_value = _client_mock(mocker, "unix:///var/sock", True)
 
         client.get_client(dict(
-            endpoint="unix:///var/sock.path",
+            endpoint="unix:///var/sock",
             username="user",
             password=None,
             verify=True,
@@ -365,26 +1196,270 @@ class TestGetClient:
         ))
 
         cmock.assert_called_once_with(
-            "unix:///var/sock.path", username="user", password=None,
+            "unix:///var/sock", username="user", password=None,
             verify=True, ca_path=None,
         )
 
     def test_endpoint_fail(self, mocker):
-        c1 = mocker.Mock()
-        c1.get.side_effect = errors.UnitError("Fail1")
         cmock = mocker.patch.object(client, "Client")
-        cmock.side_effect = (c1, )
+        cmock.return_value = _client_mock(mocker, "unix:///var/sock", False)
 
         with pytest.raises(errors.UnitError, match="valid endpoints"):
             client.get_client(dict(
-                endpoint="unix:///var/sock.path",
+                endpoint="unix:///var/sock",
                 username=None,
                 password=None,
                 verify=False,
                 ca_path=None,
             ))
 
-        cmock.called_once_with(
-            "unix:///var/sock.path", username=None, password=None,
+        cmock.assert_called_once_with(
+            "unix:///var/sock", username=None, password=None,
             verify=False, ca_path=None,
         )
+
+    def test_discovery_is_cached(self, mocker, tmp_path):
+        sock = tmp_path / "control.sock"
+        sock.write_text(u"")
+        endpoint = "unix://" + str(sock)
+        cmock = mocker.patch.object(client, "Client")
+        cmock.return_value = _client_mock(mocker, endpoint, True)
+        provider = dict(
+            endpoint=endpoint,
+            username=None,
+            password=None,
+            verify=True,
+            ca_path=None,
+        )
+
+        client.get_client(provider)
+        c = client.get_client(provider)
+
+        assert cmock.call_count == 2
+        assert c.probe.call_count == 1
+        assert c.version == "1.18.0"
+
+    def test_deadline_is_shared(self, mocker):
+        mocker.patch.object(client, "_DEADLINE", None)
+        mocker.patch.object(client, "Client").side_effect = [
+            _client_mock(mocker, "unix:///a", True),
+            _client_mock(mocker, "unix:///b", True),
+        ]
+        provider = dict(
+            endpoint=None, username=None, password=None, verify=True,
+            ca_path=None, deadline=10, connect_timeout=None,
+        )
+
+        c1 = client.get_client(dict(provider, endpoint="unix:///a"))
+        c2 = client.get_client(dict(provider, endpoint="unix:///b"))
+
+        assert c1.deadline is c2.deadline
+        assert c1.deadline.budget == 10
+
+    def test_connect_timeout_limits_probes(self, mocker):
+        cmock = mocker.patch.object(client, "Client")
+        cmock.return_value = _client_mock(mocker, "unix:///var/sock", True)
+
+        c = client.get_client(dict(
+            endpoint="unix:///var/sock", username=None, password=None,
+            verify=True, ca_path=None, connect_timeout=0.5,
+        ))
+
+        c.probe.assert_called_once_with(0.5)
+        cmock.assert_called_once_with(
+            "unix:///var/sock", username=None, password=None, verify=True,
+            ca_path=None, connect_timeout=0.5,
+        )
+
+    def test_deadline_expires_during_discovery(self, mocker):
+        mocker.patch.object(client, "_DEADLINE", None)
+        cmock = mocker.patch.object(client, "Client")
+        c = _client_mock(mocker, "unix:///var/sock", False)
+        cmock.return_value = c
+
+        def probe(timeout):
+            c.deadline.expires = time.time()
+            return False
+
+        c.probe.side_effect = probe
+
+        with pytest.raises(errors.UnitError, match="endpoint discovery"):
+            client.get_client(dict(
+                endpoint="unix:///var/sock", username=None, password=None,
+                verify=True, ca_path=None, deadline=1,
+            ))
+
+    def test_cache_expired(self, mocker, tmp_path):
+        mocker.patch.object(client, "_DISCOVERY_TTL", -1)
+        sock = tmp_path / "control.sock"
+        sock.write_text(u"")
+        endpoint = "unix://" + str(sock)
+        cmock = mocker.patch.object(client, "Client")
+        cmock.return_value = _client_mock(mocker, endpoint, True)
+        provider = dict(
+            endpoint=endpoint,
+            username=None,
+            password=None,
+            verify=True,
+            ca_path=None,
+        )
+
+        client.get_client(provider)
+        c = client.get_client(provider)
+
+        assert c.probe.call_count == 2
+
+    def test_cached_socket_missing(self, mocker, tmp_path):
+        sock = tmp_path / "control.sock"
+        sock.write_text(u"")
+        endpoint = "unix://" + str(sock)
+        cmock = mocker.patch.object(client, "Client")
+        cmock.return_value = _client_mock(mocker, endpoint, True)
+        provider = dict(
+            endpoint=endpoint,
+            username=None,
+            password=None,
+            verify=True,
+            ca_path=None,
+        )
+
+        client.get_client(provider)
+        sock.unlink()
+        c = client.get_client(provider)
+
+        assert c.probe.call_count == 2
+
+    def test_broken_cache_file(self, mocker, discovery_cache):
+        with open(discovery_cache, "w") as fd:
+            fd.write("not json")
+        cmock = mocker.patch.object(client, "Client")
+        cmock.return_value = _client_mock(mocker, "https://host", True)
+
+        c = client.get_client(dict(
+            endpoint="https://host",
+            username=None,
+            password=None,
+            verify=True,
+            ca_path=None,
+        ))
+
+        assert c.probe.call_count == 1
+
+    def test_endpoint_options_are_not_passed_to_client(self, mocker):
+        cmock = mocker.patch.object(client, "Client")
+        cmock.return_value = _client_mock(mocker, "unix:///var/sock", True)
+
+        client.get_client(dict(
+            endpoint="unix:///var/sock",
+            endpoints=None,
+            workers=None,
+            username=None,
+            password=None,
+            verify=True,
+            ca_path=None,
+        ))
+
+        cmock.assert_called_once_with(
+            "unix:///var/sock", username=None, password=None, verify=True,
+            ca_path=None,
+        )
+
+
+def _params(**provider):
+    return dict(provider=dict(dict(endpoint=None, endpoints=None), **provider))
+
+
+class TestRunOnEndpoints:
+    def test_single_endpoint(self, mocker):
+        run = mocker.Mock(return_value=dict(changed=True))
+        params = _params(endpoint="unix:///a")
+
+        result = client.run_on_endpoints(run, params, False)
+
+        assert result == dict(changed=True)
+        run.assert_called_once_with(params, False)
+
+    def test_persistent_connection(self, mocker):
+        mocker.patch.object(client, "_SOCKET_PATH", "/socket")
+        run = mocker.Mock(return_value=dict(changed=False))
+        params = _params(endpoints=["unix:///a", "unix:///b"])
+
+        client.run_on_endpoints(run, params)
+
+        run.assert_called_once_with(params)
+
+    def test_all_endpoints(self, mocker):
+        def run(params, check_mode):
+            assert check_mode is True
+            assert params["provider"]["endpoints"] is None
+            return dict(changed=params["provider"]["endpoint"] == "http://b")
+
+        result = client.run_on_endpoints(run, _params(endpoints=[
+            "unix:///a", "http://b", "unix:///a",
+        ]), True)
+
+        assert result["changed"] is True
+        assert "failed" not in result
+        assert [
+            (r["endpoint"], r["changed"]) for r in result["endpoints"]
+        ] == [("unix:///a", False), ("http://b", True)]
+        assert all(r["time"] >= 0 for r in result["endpoints"])
+
+    def test_failed_endpoint(self, mocker):
+        def run(params):
+            if params["provider"]["endpoint"] == "unix:///b":
+                raise errors.UnitError("No valid endpoints found")
+            return dict(changed=True)
+
+        result = client.run_on_endpoints(run, _params(endpoints=[
+            "unix:///a", "unix:///b", "unix:///c",
+        ]))
+
+        assert result["failed"] is True
+        assert result["changed"] is True
+        assert result["msg"] == (
+            "Failed on 1 of 3 endpoints: unix:///b: No valid endpoints found"
+        )
+        assert [r.get("failed", False) for r in result["endpoints"]] == [
+            False, True, False,
+        ]
+
+    def test_bounded_concurrency(self, mocker):
+        lock = threading.Lock()
+        active = [0, 0]  # Current, maximum
+
+        def run(params):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return dict(changed=False)
+
+        result = client.run_on_endpoints(run, _params(
+            endpoints=["unix:///{0}".format(i) for i in range(6)], workers=2,
+        ))
+
+        assert len(result["endpoints"]) == 6
+        assert active[1] == 2
+
+    def test_unexpected_error_is_raised(self, mocker):
+        run = mocker.Mock(side_effect=KeyError("bug"))
+
+        with pytest.raises(KeyError, match="bug"):
+            client.run_on_endpoints(run, _params(
+                endpoints=["unix:///a", "unix:///b"],
+            ))
+
+    def test_endpoint_and_endpoints(self, mocker):
+        with pytest.raises(errors.UnitError, match="mutually exclusive"):
+            client.run_on_endpoints(mocker.Mock(), _params(
+                endpoint="unix:///a", endpoints=["unix:///b"],
+            ))
+
+    def test_invalid_workers(self, mocker):
+        with pytest.raises(errors.UnitError, match="workers"):
+            client.run_on_endpoints(mocker.Mock(), _params(
+                endpoints=["unix:///a"], workers=-1,
+            ))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible.module_utils.connection import ConnectionError
+
+from ansible_collections.steampunk.unit.plugins.module_utils import (
+    client, errors, httpapi, transport,
+)
+
+
+@pytest.fixture
+def connection(mocker):
+    return mocker.patch.object(httpapi, "Connection").return_value
+
+
+@pytest.fixture
+def socket_path():
+    client.use_connection("/tmp/socket")
+    yield "/tmp/socket"
+    client.use_connection(None)
+
+
+class TestConnectionTransport:
+    def test_request(self, connection):
+        connection.send_request.return_value = 200, '{"a":1}', "Unit/1.18.0"
+
+        status, data = httpapi.ConnectionTransport("/s").request(
+            "PUT", "/config", '{"a":1}',
+        )
+
+        assert (status, data) == (200, '{"a":1}')
+        connection.send_request.assert_called_once_with(
+            "PUT", "/config", '{"a":1}',
+        )
+
+    def test_file_body(self, connection, tmp_path):
+        connection.send_request.return_value = 200, "{}", "Unit/1.18.0"
+        path = tmp_path / "config.json"
+        path.write_text(u'{"a":1}')
+
+        with path.open("rb") as fd:
+            httpapi.ConnectionTransport("/s").request(
+                "PUT", "/config", transport.FileBody(fd),
+            )
+
+        connection.send_request.assert_called_once_with(
+            "PUT", "/config", '{"a":1}',
+        )
+
+    def test_probe(self, connection):
+        connection.send_request.return_value = 404, "{}", "Unit/1.18.0"
+
+        status, server = httpapi.ConnectionTransport("/s").probe("/x", 2)
+
+        assert (status, server) == (404, "Unit/1.18.0")
+
+
+class TestGetClient:
+    def test_use_connection(self, mocker, connection, socket_path):
+        get_pool = mocker.patch.object(transport, "get_pool")
+        connection.send_request.return_value = 200, '{"a":1}', None
+
+        c = client.get_client(dict(endpoint="http://ignored", snapshot=False))
+
+        assert c.get(("config", "a")) == {"a": 1}
+        assert c._pool.socket_path == socket_path
+        connection.send_request.assert_called_once_with(
+            "GET", "/config/a", None,
+        )
+        get_pool.assert_not_called()
+
+    def test_connection_error(self, connection, socket_path):
+        connection.send_request.side_effect = ConnectionError("closed")
+
+        c = client.get_client(dict(endpoint=None, snapshot=True))
+
+        assert c.snapshot is True
+        with pytest.raises(errors.UnitError, match="closed"):
+            c.get(("config", ))
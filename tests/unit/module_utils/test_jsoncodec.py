@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.module_utils import (
+    jsoncodec,
+)
+
+VALUES = [
+    None,
+    {},
+    [],
+    {"listeners": {"127.0.0.1:8080": {"pass": "routes/main"}}},
+    {"routes": [
+        {"match": {"uri": ["/a/*", "!/b"]}, "action": {"return": 301}},
+    ]},
+    {"a": 1.5, "b": 1e16, "c": 1e-5, "d": -0.0, "e": 0.0001, "f": 1e15},
+    [1.2345e-9, -3.5e200, 123.456, 10.00001],
+    {"a": [1, 2 ** 63, 2 ** 64, -2 ** 70]},
+    {"a": u"čšž   \x7f \n \x1f / \\ \""},
+    {"a": None, "b": True, "c": False},
+    {1: "integer key"},
+    1.5,
+    "string",
+]
+
+
+class _OldBytes(bytes):
+    @property
+    def isascii(self):
+        raise AttributeError("isascii")
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, mocker):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        mocker.patch.object(jsoncodec, "orjson", None)
+    return request.param
+
+
+class TestDumps:
+    @pytest.mark.parametrize("value", VALUES)
+    def test_same_as_json(self, backend, value):
+        expected = json.dumps(value, separators=(",", ":"))
+
+        assert jsoncodec.dumps(value) == expected
+
+    @pytest.mark.parametrize("value", [
+        float("nan"), [float("inf")], {"a": -float("inf")},
+    ])
+    def test_special_floats(self, backend, value):
+        expected = json.dumps(value, separators=(",", ":"))
+
+        assert jsoncodec.dumps(value) == expected
+
+    def test_unserializable(self, backend):
+        with pytest.raises(TypeError):
+            jsoncodec.dumps(dict(a=object()))
+
+    @pytest.mark.parametrize("value", VALUES)
+    def test_without_isascii(self, mocker, value):
+        # Python 3.6 does not have bytes.isascii.
+        orjson = pytest.importorskip("orjson")
+        mocker.patch.object(jsoncodec, "orjson", mocker.Mock(
+            dumps=lambda v: _OldBytes(orjson.dumps(v)),
+        ))
+        expected = json.dumps(value, separators=(",", ":"))
+
+        assert jsoncodec.dumps(value) == expected
+
+
+class TestLoads:
+    @pytest.mark.parametrize("value", VALUES)
+    def test_same_as_json(self, backend, value):
+        text = json.dumps(value, ensure_ascii=False)
+
+        for data in (text, text.encode("utf-8"), bytearray(text, "utf-8")):
+            assert jsoncodec.loads(data) == json.loads(text)
+
+    @pytest.mark.parametrize("number", [
+        123456789012345678901234567890,
+        2 ** 64 - 1,
+        -2 ** 63,
+        -2 ** 63 - 1,
+        -9999999999999999999,
+        -123456789012345678901234567890,
+    ])
+    def test_big_integers_stay_integers(self, backend, number):
+        value = jsoncodec.loads('{{"a": [{0}]}}'.format(number).encode())
+
+        assert value == {"a": [number]}
+        assert isinstance(value["a"][0], int)
+
+    @pytest.mark.parametrize("data", [b"", b"{", u'{"a": 1,}'])
+    def test_invalid(self, backend, data):
+        with pytest.raises(ValueError):
+            jsoncodec.loads(data)
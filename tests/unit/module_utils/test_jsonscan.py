@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+import time
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.module_utils import jsonscan
+
+DOCUMENT = {
+    "listeners": {"*:80": {"pass": "routes/main"}},
+    "routes": {
+        "main": [
+            {"match": {"uri": ["/a/*", "/b\\"]}, "action": {"return": 301}},
+            {"action": {"share": "/www/{[\"]}"}},
+        ],
+        "empty": [],
+    },
+    "applications": {},
+    "settings": {"http": {"max_body_size": 1e6, "idle": True, "x": None}},
+    u"ključ": u"vrednost",
+    "esc\"aped": 1,
+}
+
+
+@pytest.fixture(params=[
+    dict(separators=(",", ":")), dict(indent=2), dict(ensure_ascii=False),
+])
+def encoded(request):
+    return json.dumps(DOCUMENT, **request.param).encode("utf-8")
+
+
+class TestExtract:
+    @pytest.mark.parametrize("path", [
+        (),
+        ("listeners", ),
+        ("routes", "main", "0", "match", "uri"),
+        ("routes", "main", 1, "action", "share"),
+        ("routes", "empty"),
+        ("settings", "http", "max_body_size"),
+        ("settings", "http", "idle"),
+        ("settings", "http", "x"),
+        (u"ključ", ),
+        ("esc\"aped", ),
+    ])
+    def test_found(self, encoded, path):
+        value = DOCUMENT
+        for segment in path:
+            value = value[int(segment) if isinstance(value, list) else segment]
+
+        assert jsonscan.extract(encoded, path) == (True, value)
+
+    @pytest.mark.parametrize("path", [
+        ("missing", ),
+        ("applications", "a"),
+        ("routes", "main", "2"),
+        ("routes", "main", "x"),
+        ("routes", "empty", "0"),
+        ("listeners", "*:80", "pass", "x"),
+    ])
+    def test_missing(self, encoded, path):
+        assert jsonscan.extract(encoded, path) == (False, None)
+
+    def test_bytearray(self):
+        assert jsonscan.extract(bytearray(b'{"a": [1, 2]}'), ("a", "1")) == (
+            True, 2,
+        )
+
+    @pytest.mark.parametrize("data", [
+        b"", b'{"b": 1 "a": 2}', b'{"b": [1, 2}', b'{"b": "x',
+    ])
+    def test_invalid(self, data):
+        with pytest.raises(ValueError):
+            jsonscan.extract(data, ("a", ))
+
+    @pytest.mark.parametrize("data", [
+        b'{"a": [' + b"1," * 100000,
+        b'{"a": [' + b'"x", ' * 100000 + b'"y',
+        b'{"a": {"b": [{"c": "' + b"x" * 100000,
+    ])
+    def test_truncated_is_rejected_quickly(self, data):
+        start = time.time()
+
+        with pytest.raises(ValueError, match="Unterminated"):
+            jsonscan.extract(data, ("b", ))
+
+        assert time.time() - start < 1
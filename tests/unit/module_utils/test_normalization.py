@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.module_utils import (
+    normalization,
+)
+
+
+class TestApplication:
+    def test_missing(self):
+        assert normalization.application({}) == {}
+
+    @pytest.mark.parametrize("processes", [
+        None, 1, dict(max=1, spare=1), dict(max=1, spare=1, idle_timeout=9),
+    ])
+    def test_single_static_process(self, processes):
+        assert normalization.application(
+            dict(type="python", module="wsgi"),
+        ) == normalization.application(
+            dict(type="python", module="wsgi", processes=processes),
+        )
+
+    def test_process_limit_defaults(self):
+        assert normalization.application(
+            dict(type="python", processes=dict(max=4)),
+        ) == normalization.application(dict(type="python", processes=dict(
+            max=4, spare=0, idle_timeout=15,
+        )))
+
+    def test_empty_processes_is_not_missing(self):
+        assert normalization.application(
+            dict(type="python", processes={}),
+        ) != normalization.application(dict(type="python"))
+
+    def test_different_processes(self):
+        assert normalization.application(
+            dict(type="python", processes=4),
+        ) != normalization.application(
+            dict(type="python", processes=dict(max=4)),
+        )
+
+    def test_empty_and_none_options(self):
+        assert normalization.application(dict(
+            type="python", module="wsgi", environment={}, user=None,
+            limits=dict(timeout=None, requests=None),
+        )) == normalization.application(dict(type="python", module="wsgi"))
+
+    def test_changed_option(self):
+        assert normalization.application(
+            dict(type="python", environment=dict(A="1")),
+        ) != normalization.application(
+            dict(type="python", environment=dict(A="2")),
+        )
+
+
+class TestListener:
+    def test_missing(self):
+        assert normalization.listener({}) == {}
+
+    def test_certificate_list(self):
+        assert normalization.listener({
+            "pass": "routes", "tls": dict(certificate=["bundle"]),
+        }) == normalization.listener({
+            "pass": "routes", "tls": dict(certificate="bundle"),
+        })
+
+    def test_empty_tls(self):
+        assert normalization.listener(
+            {"pass": "routes", "tls": None},
+        ) == normalization.listener({"pass": "routes"})
+
+
+class TestRoute:
+    def test_missing(self):
+        assert normalization.route({}) == []
+
+    def test_single_element_matches(self):
+        assert normalization.route([
+            dict(
+                match=dict(
+                    uri=["/admin/*"], method=["GET"],
+                    arguments=[dict(mode="strict")], scheme=None,
+                ),
+                action=dict(share=["/www/"], fallback={"pass": "routes/x"}),
+            ),
+        ]) == normalization.route([
+            dict(
+                match=dict(uri="/admin/*", method="GET", arguments=dict(
+                    mode="strict",
+                )),
+                action=dict(share="/www/", fallback={"pass": "routes/x"}),
+            ),
+        ])
+
+    def test_multiple_element_matches(self):
+        assert normalization.route([
+            dict(match=dict(uri=["/a", "/b"]), action=dict(share="/www/")),
+        ]) != normalization.route([
+            dict(match=dict(uri="/a"), action=dict(share="/www/")),
+        ])
+
+    def test_empty_match(self):
+        assert normalization.route([
+            dict(match={}, action=dict(share="/www/")),
+        ]) == normalization.route([dict(action=dict(share="/www/"))])
+
+    def test_nested_fallback(self):
+        assert normalization.route([dict(action=dict(
+            share="/a", fallback=dict(share="/b", fallback=dict(share=["/c"])),
+        ))]) == normalization.route([dict(action=dict(
+            share="/a", fallback=dict(share="/b", fallback=dict(share="/c")),
+        ))])
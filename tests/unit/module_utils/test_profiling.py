@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.module_utils import (
+    profiling,
+)
+
+
+def _work():
+    return [dict(a=i) for i in range(1000)]
+
+
+@pytest.fixture(autouse=True)
+def session(mocker):
+    mocker.patch.object(profiling, "_session", None)
+
+
+class TestProfiling:
+    def test_disabled(self, monkeypatch):
+        monkeypatch.delenv("UNIT_PROFILE", raising=False)
+
+        profiling.start()
+        _work()
+
+        assert profiling.report(dict(changed=True)) == dict(changed=True)
+
+    @pytest.mark.parametrize("value", ["0", "false", "No", "off", " "])
+    def test_disabled_by_false_value(self, monkeypatch, tmp_path, value):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("UNIT_PROFILE", value)
+
+        profiling.start()
+        _work()
+
+        assert profiling.report(dict(changed=True)) == dict(changed=True)
+        assert list(tmp_path.iterdir()) == []
+
+    def test_result(self, monkeypatch):
+        monkeypatch.setenv("UNIT_PROFILE", "1")
+        monkeypatch.setenv("UNIT_PROFILE_TOP", "5")
+
+        profiling.start()
+        _work()
+        result = profiling.report(dict(changed=True))
+
+        profile = result["profile"]
+        assert result["changed"] is True
+        assert profile["wall_time"] >= 0
+        assert len(profile["functions"]) == 5
+        assert any("_work" in f["function"] for f in profile["functions"])
+        assert set(profile["functions"][0]) == set((
+            "function", "calls", "total_time", "cumulative_time",
+        ))
+        assert len(profile["allocations"]) <= 5
+        assert profile["peak_memory"] > 0
+        # Profiling is over.
+        assert profiling.stop() is None
+
+    def test_file(self, monkeypatch, tmp_path):
+        path = str(tmp_path / "profile.json")
+        monkeypatch.setenv("UNIT_PROFILE", path)
+
+        profiling.start()
+        _work()
+        result = profiling.report({})
+
+        assert result == dict(profile=dict(path=path))
+        with open(path) as fd:
+            assert "functions" in json.load(fd)
+
+    def test_file_error(self, monkeypatch, tmp_path):
+        path = str(tmp_path / "missing" / "profile.json")
+        monkeypatch.setenv("UNIT_PROFILE", path)
+
+        profiling.start()
+        result = profiling.report({})
+
+        assert result["profile"]["path"] == path
+        assert "error" in result["profile"]
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.module_utils import (
+    errors, schema,
+)
+
+SPEC = dict(
+    type="list",
+    elements="dict",
+    options=dict(
+        name=dict(type="str", required=True),
+        mode=dict(type="str", choices=["a", "b"], default="a"),
+        size=dict(type="int"),
+        tags=dict(type="list", elements="str"),
+        nested=dict(type="dict", options=dict(flag=dict(type="bool"))),
+    ),
+)
+
+
+class TestCompileOption:
+    def test_conversion_and_defaults(self):
+        validate = schema.compile_option("items", SPEC, "test")
+
+        assert validate([
+            dict(name=1, size="3", tags="x,y", nested=dict(flag="yes")),
+        ]) == [
+            dict(
+                name="1", mode="a", size=3, tags=["x", "y"],
+                nested=dict(flag=True),
+            ),
+        ]
+
+    def test_none(self):
+        assert schema.compile_option("items", SPEC, "test")(None) is None
+
+    def test_without_options(self):
+        validate = schema.compile_option(
+            "mode", dict(type="str", choices=["a"]), "test",
+        )
+
+        assert validate("a") == "a"
+        with pytest.raises(errors.UnitError, match="must be one of: a"):
+            validate("b")
+
+    def test_first_error_is_reported(self):
+        validate = schema.compile_option("items", SPEC, "test")
+
+        with pytest.raises(errors.UnitError) as exc:
+            validate([dict(name="a", mode="c"), dict(size="x")])
+
+        assert str(exc.value) == (
+            "value of mode must be one of: a, b, got: c found in items"
+        )
+
+    def test_unsupported_reported_last(self):
+        validate = schema.compile_option("items", SPEC, "test")
+
+        with pytest.raises(errors.UnitError) as exc:
+            validate([dict(name="a", nested=dict(flag=True, other=1))])
+
+        assert str(exc.value) == (
+            "Unsupported parameters for (test) module: items.nested.other. "
+            "Supported parameters include: flag."
+        )
+
+    def test_shape_errors_take_precedence(self):
+        validate = schema.compile_option("items", SPEC, "test")
+
+        with pytest.raises(errors.UnitError) as exc:
+            validate([dict(size="x"), dict(name="b", nested=3)])
+
+        assert str(exc.value) == (
+            "Value '3' in the sub parameter field 'nested' must by a dict, "
+            "not 'int'"
+        )
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import os
+import socket
+import threading
+
+import pytest
+
+from ansible.module_utils.six.moves import BaseHTTPServer, socketserver
+
+from ansible_collections.steampunk.unit.plugins.module_utils import (
+    transport,
+)
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8")
+        self.server.seen.append((
+            self.command, self.path, body, self.headers.get("Authorization"),
+        ))
+        data = '{{"path": "{0}"}}'.format(self.path).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_PUT = do_DELETE = _reply
+
+    def address_string(self):
+        return "unix"
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path):
+        socketserver.UnixStreamServer.__init__(self, path, Handler)
+        self.seen = []
+        self.connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return socketserver.UnixStreamServer.get_request(self)
+
+
+@pytest.fixture
+def server(tmp_path):
+    srv = Server(str(tmp_path / "control.sock"))
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def connection():
+    # Connection that is already connected to a socket that we control.
+    ours, theirs = socket.socketpair()
+    conn = transport.HTTPConnection("/unused")
+    conn.sock = ours
+    yield conn, theirs
+    conn.close()
+    theirs.close()
+
+
+class TestHTTPConnection:
+    def test_request(self, connection):
+        conn, peer = connection
+
+        conn.request("PUT", "/config/a", '{"b":"č"}', {"Authorization": "x"})
+
+        assert peer.recv(4096) == (
+            b"PUT /config/a HTTP/1.1\r\n"
+            b"Host: localhost\r\n"
+            b"Authorization: x\r\n"
+            b"Content-Length: 10\r\n"
+            b"\r\n"
+            b'{"b":"\xc4\x8d"}'
+        )
+
+    def test_file_body(self, connection, mocker, tmp_path):
+        conn, peer = connection
+        mocker.patch.object(transport, "_CHUNK_SIZE", 4)
+        path = tmp_path / "config.json"
+        path.write_bytes(b'{"listeners":{}}')
+
+        with path.open("rb") as fd:
+            body = transport.FileBody(fd)
+            fd.read()  # Streaming always starts at the beginning.
+            conn.request("PUT", "/config", body)
+
+        assert peer.recv(4096) == (
+            b"PUT /config HTTP/1.1\r\n"
+            b"Host: localhost\r\n"
+            b"Content-Length: 16\r\n"
+            b"\r\n"
+            b'{"listeners":{}}'
+        )
+
+    def test_content_length(self, connection):
+        conn, peer = connection
+        peer.sendall(
+            b"HTTP/1.1 200 OK\r\nServer: Unit/1.18.0\r\n"
+            b"Content-Length: 2\r\n\r\n{}HTTP/1.1 404 Not Found\r\n"
+            b"Content-Length: 0\r\n\r\n"
+        )
+
+        first = conn.getresponse()
+        second = conn.getresponse()
+
+        assert (first.status, first.read()) == (200, b"{}")
+        assert first.getheader("Server") == "Unit/1.18.0"
+        assert first.will_close is False
+        assert (second.status, second.read()) == (404, b"")
+
+    def test_large_body(self, connection):
+        conn, peer = connection
+        body = b"[" + b"1," * 100000 + b"1]"
+        peer.sendall(
+            b"HTTP/1.1 200 OK\r\nContent-Length: 200003\r\n\r\n" +
+            body[:1000],
+        )
+        thread = threading.Thread(target=peer.sendall, args=(body[1000:], ))
+        thread.start()
+
+        resp = conn.getresponse()
+        thread.join()
+
+        assert resp.read() == body
+
+    def test_chunked(self, connection):
+        conn, peer = connection
+        peer.sendall(
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"3\r\n{\"a\r\n5;ext=1\r\n\": 1}\r\n0\r\n\r\n"
+        )
+
+        assert conn.getresponse().read() == b'{"a": 1}'
+
+    def test_read_until_close(self, connection):
+        conn, peer = connection
+        peer.sendall(b"HTTP/1.0 200 OK\r\n\r\n{}")
+        peer.close()
+
+        resp = conn.getresponse()
+
+        assert resp.read() == b"{}"
+        assert resp.will_close is True
+
+    def test_connection_close(self, connection):
+        conn, peer = connection
+        peer.sendall(
+            b"HTTP/1.1 200 OK\r\nConnection: close\r\n"
+            b"Content-Length: 0\r\n\r\n"
+        )
+
+        assert conn.getresponse().will_close is True
+
+    def test_dropped(self, connection):
+        conn, peer = connection
+        peer.close()
+
+        with pytest.raises(transport.ConnectionDropped):
+            conn.getresponse()
+
+    def test_timeouts(self, server):
+        conn = transport.UnixHTTPConnection(server.server_address)
+        conn.set_timeouts(1, 5)
+        conn.connect()
+
+        assert conn.sock.gettimeout() == 5
+
+        conn.set_timeouts(1, 2)
+
+        assert conn.sock.gettimeout() == 2
+        conn.close()
+
+    def test_invalid_status_line(self, connection):
+        conn, peer = connection
+        peer.sendall(b"garbage\r\n")
+
+        with pytest.raises(transport.ProtocolError, match="status line"):
+            conn.getresponse()
+
+
+class TestHTTPSConnection:
+    @pytest.fixture
+    def tls(self, mocker):
+        mocker.patch.object(transport, "_ssl_context")
+        return transport.TLSState(True, None)
+
+    def test_connect_without_session(self, mocker, tls):
+        from ansible.module_utils.six.moves import http_client
+
+        sock = mocker.Mock()
+
+        def connect(self):
+            self.sock = sock
+
+        mocker.patch.object(http_client.HTTPSConnection, "connect", connect)
+        conn = transport._https_connection_class()("host", 8443, tls)
+        conn.set_timeouts(1, 5)
+
+        conn.connect()
+
+        assert conn.sock is sock
+        sock.settimeout.assert_called_once_with(5)
+        tls.context.wrap_socket.assert_not_called()
+
+    def test_connect_resumes_session(self, mocker, tls):
+        from ansible.module_utils.six.moves import http_client
+
+        def connect(self):
+            self.sock = "plain"
+
+        mocker.patch.object(http_client.HTTPConnection, "connect", connect)
+        tls.session = "session"
+        conn = transport._https_connection_class()("host", 8443, tls)
+
+        conn.connect()
+
+        assert conn.sock == tls.context.wrap_socket.return_value
+        tls.context.wrap_socket.assert_called_once_with(
+            "plain", server_hostname="host", session="session",
+        )
+
+
+class TestTLSState:
+    def test_remember(self, mocker):
+        tls = transport.TLSState(True, None)
+
+        tls.remember(mocker.Mock(session="session"))
+        tls.remember(mocker.Mock(session=None))
+        tls.remember(object())  # No session support
+
+        assert tls.session == "session"
+
+    def test_shared_context(self, mocker):
+        mocker.patch.object(transport, "_SSL_CONTEXTS", {})
+        create = mocker.patch.object(transport, "_create_ssl_context")
+        create.side_effect = lambda verify, ca_path: object()
+
+        c1 = transport.TLSState(True, "ca").context
+        c2 = transport.TLSState(True, "ca").context
+        c3 = transport.TLSState(False, "ca").context
+
+        assert c1 is c2
+        assert c1 is not c3
+        assert create.call_count == 2
+
+
+class TestConnectionPool:
+    def test_reuse_connection(self, server):
+        pool = transport.get_pool(
+            "unix://" + server.server_address, None, None, True, None,
+        )
+
+        assert pool.request("GET", "/config") == (200, b'{"path": "/config"}')
+        assert pool.request("PUT", "/config/a", '{"b":1}')[0] == 200
+        assert pool.request("DELETE", "/config/a")[0] == 200
+
+        assert server.connections == 1
+        assert server.seen == [
+            ("GET", "/config", "", None),
+            ("PUT", "/config/a", '{"b":1}', None),
+            ("DELETE", "/config/a", "", None),
+        ]
+        pool.close()
+
+    def test_reconnect_after_idle_close(self, server):
+        pool = transport.ConnectionPool(
+            lambda: transport.UnixHTTPConnection(server.server_address),
+        )
+        pool.request("GET", "/config")
+        # Simulate Unit dropping the idle connection from its side.
+        pool._idle[0].sock.shutdown(2)
+
+        assert pool.request("GET", "/certificates")[0] == 200
+        assert server.connections == 2
+        pool.close()
+
+    def test_probe_connection_is_reused(self, server):
+        pool = transport.ConnectionPool(
+            lambda: transport.UnixHTTPConnection(server.server_address),
+        )
+
+        status, server_header = pool.probe("/config/settings", 1)
+        pool.request("GET", "/config")
+
+        assert status == 200
+        assert server_header.startswith("BaseHTTP/")
+        assert server.connections == 1
+        assert pool._idle[0].sock.gettimeout() == transport.DEFAULT_TIMEOUT
+        pool.close()
+
+    def test_read_timeout(self, connection):
+        conn, _peer = connection  # Peer never responds.
+        pool = transport.ConnectionPool(lambda: conn)
+
+        with pytest.raises(socket.timeout):
+            pool.request("GET", "/config", timeouts=(1, 0.05))
+
+    def test_missing_socket(self, tmp_path):
+        pool = transport.ConnectionPool(
+            lambda: transport.UnixHTTPConnection(str(tmp_path / "missing")),
+        )
+
+        with pytest.raises(transport.REQUEST_ERRORS):
+            pool.request("GET", "/")
+        assert pool._idle == []
+
+
+class TestGetPool:
+    def test_same_endpoint_shares_pool(self):
+        p1 = transport.get_pool("unix:///a/b", None, None, True, None)
+        p2 = transport.get_pool("unix:///a/b", None, None, True, None)
+
+        assert p1 is p2
+
+    def test_different_credentials(self):
+        p1 = transport.get_pool("http://host", "u", "p1", True, None)
+        p2 = transport.get_pool("http://host", "u", "p2", True, None)
+
+        assert p1 is not p2
+
+    def test_auth_and_prefix(self):
+        pool = transport.get_pool(
+            "https://host:8443/unit/", "user", "pass", True, None,
+        )
+
+        assert pool.prefix == "/unit"
+        assert pool.headers == {"Authorization": "Basic dXNlcjpwYXNz"}
+
+    def test_plain_http_does_not_load_http_client(self):
+        pool = transport.get_pool("http://host:8080", None, None, True, None)
+        conn = pool.factory()
+
+        assert isinstance(conn, transport.HTTPConnection)
+        assert conn.address == ("host", 8080)
+
+    def test_https_connections_share_tls_state(self, mocker):
+        mocker.patch.object(transport, "_ssl_context")
+        pool = transport.get_pool("https://host:8443", None, None, True, "ca")
+
+        c1 = pool.factory()
+        c2 = pool.factory()
+
+        assert c1._tls is c2._tls
+        assert (c1.host, c1.port) == ("host", 8443)
+
+    def test_no_auth_on_unix_socket(self):
+        pool = transport.get_pool(
+            "unix://" + os.path.join("/tmp", "sock"), "u", "p", True, None,
+        )
+
+        assert pool.prefix == ""
+        assert pool.headers == {}
@@ -6,7 +6,11 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
-from ansible_collections.steampunk.unit.plugins.module_utils import utils
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.module_utils import (
+    normalization, utils,
+)
 
 
 class TestResultInit:
@@ -34,6 +38,134 @@ class TestResultInit:
         ) == dict(r)
 
 
+class TestResultDiffFormat:
+    def test_summary(self):
+        current = dict(a=1, b=dict(c=2), d=[1, 2])
+        desired = dict(a=1, b=dict(c=3, e="f"), d=[1])
+
+        r = utils.Result(current, desired, "summary")
+
+        assert r.changed is True
+        assert dict(
+            changed=True,
+            diff=dict(
+                changes=[
+                    dict(op="replace", path="/b/c"),
+                    dict(op="add", path="/b/e"),
+                    dict(op="replace", path="/d"),
+                ],
+                counts=dict(add=1, replace=2, remove=0),
+            ),
+        ) == dict(r)
+
+    def test_summary_no_change(self):
+        r = utils.Result(dict(a=1), dict(a=1), "summary")
+
+        assert dict(
+            changed=False,
+            diff=dict(changes=[], counts=dict(add=0, replace=0, remove=0)),
+        ) == dict(r)
+
+    def test_none(self):
+        r = utils.Result(dict(a=1), {}, "none")
+
+        r.add_object_fields(name="x")
+
+        assert dict(changed=True) == dict(r)
+
+
+class TestResultNormalize:
+    def test_normalize_is_applied_to_both_sides(self, mocker):
+        normalize = mocker.Mock(side_effect=lambda x: sorted(x))
+
+        r = utils.Result([2, 1], [1, 2], normalize=normalize)
+
+        assert r.changed is False
+        normalize.assert_has_calls((mocker.call([2, 1]), mocker.call([1, 2])))
+
+    def test_create_skips_equivalent_config(self, mocker):
+        client = mocker.Mock()
+        client.get.return_value = dict(type="python", processes=1)
+
+        r = utils.create(
+            client, ("app", ), dict(type="python"), False,
+            normalize=normalization.application,
+        )
+
+        assert r.changed is False
+        client.put.assert_not_called()
+
+
+class TestChecksum:
+    def test_key_order_does_not_matter(self):
+        assert utils.checksum(dict(a=1, b=[1, 2])) == utils.checksum(
+            dict(b=[1, 2], a=1),
+        )
+
+    def test_large_value(self, mocker):
+        mocker.patch.object(utils, "_CHECKSUM_BUFFER", 10)
+        value = dict(("k{0}".format(i), "v" * i) for i in range(100))
+
+        assert utils.checksum(value) == utils.checksum(dict(value))
+        assert utils.checksum(value) != utils.checksum(dict(value, k0="x"))
+
+
+class TestChecksumByObject:
+    @pytest.mark.parametrize("config", [
+        {},
+        [],
+        dict(settings={}, applications=dict(a={}, b=None)),
+        dict(
+            access_log="/var/log/access.log",
+            applications=dict(
+                b=dict(type="python", module="wsgi", processes=2),
+                a=dict(type="php", root="/www", processes=dict(max=4)),
+                c={},
+            ),
+            listeners={
+                "*:443": dict(tls=dict(certificate=["bundle"])),
+                "*:80": {"pass": "routes/main"},
+            },
+            routes=dict(main=[dict(action=dict(share=["/www"]))], empty=[]),
+            settings=dict(http=dict(max_body_size=10, idle_timeout=None)),
+            upstreams={},
+        ),
+        dict(routes=[dict(match=dict(uri=["/x"]), action={"pass": "a/b"})]),
+    ])
+    def test_same_as_canonical_form(self, config):
+        assert utils.checksum(normalization.config(config)) == (
+            utils.checksum_by_object(config, normalization.config)
+        )
+
+    def test_canonical_form_is_not_built(self, mocker):
+        normalize = mocker.Mock(side_effect=normalization.config)
+        config = dict(
+            applications=dict(a=dict(type="php"), b=dict(type="php")),
+            access_log="/log",
+        )
+
+        utils.checksum_by_object(config, normalize)
+
+        assert [c[0][0] for c in normalize.call_args_list] == [
+            dict(access_log="/log"),
+            dict(applications=dict(a=dict(type="php"))),
+            dict(applications=dict(b=dict(type="php"))),
+        ]
+
+
+class TestSummarize:
+    def test_json_pointer_escaping(self):
+        assert [
+            dict(op="remove", path="/listeners/127.0.0.1:80"),
+            dict(op="add", path="/a~1b/c~0d/0"),
+            dict(op="replace", path=""),
+        ] == utils.summarize([
+            ("remove", ("listeners", "127.0.0.1:80"), None),
+            ("add", ("a/b", "c~d", "0"), 1),
+            ("replace", (), 3),
+        ])["changes"]
+
+
 class TestResultAddObjectFields:
     def test_add_change(self):
         r = utils.Result({}, dict(a=1, b="c"))
@@ -173,3 +305,144 @@ class TestCompactDict:
         ) == utils.compact_dict(dict(
             a=1, b="c", d="e", f=None, g=[], h={}, x=0,
         ))
+
+
+class TestDiff:
+    def test_equal(self):
+        assert [] == utils.diff(dict(a=[1, dict(b=2)]), dict(a=[1, dict(b=2)]))
+
+    def test_scalar(self):
+        assert [("replace", (), 2)] == utils.diff(1, 2)
+
+    def test_type_change(self):
+        assert [("replace", ("a", ), dict(max=3))] == utils.diff(
+            dict(a=3), dict(a=dict(max=3)),
+        )
+
+    def test_dict_keys(self):
+        assert [
+            ("remove", ("b", ), None),
+            ("replace", ("a", "x"), 2),
+            ("add", ("c", ), 4),
+        ] == utils.diff(
+            dict(a=dict(x=1, y=2), b=3), dict(a=dict(x=2, y=2), c=4),
+        )
+
+    def test_list_same_length(self):
+        assert [
+            ("replace", ("1", "action", "pass"), "applications/b"),
+        ] == utils.diff(
+            [dict(action={"pass": "applications/a"})] * 3,
+            [
+                dict(action={"pass": "applications/a"}),
+                dict(action={"pass": "applications/b"}),
+                dict(action={"pass": "applications/a"}),
+            ],
+        )
+
+    def test_list_different_length(self):
+        assert [("replace", ("a", ), [1, 2, 3])] == utils.diff(
+            dict(a=[1, 2]), dict(a=[1, 2, 3]),
+        )
+
+    def test_whole_objects(self):
+        assert [
+            ("replace", ("a", "x"), 2),
+            ("replace", ("d", "0", "action"), dict(share="/www")),
+        ] == utils.diff(
+            dict(a=dict(x=1, y=2), d=[dict(action={"pass": "routes"})]),
+            dict(a=dict(x=2, y=2), d=[dict(action=dict(share="/www"))]),
+            whole_objects=True,
+        )
+
+    def test_whole_objects_new_key(self):
+        assert [("replace", (), dict(a=1, b=2))] == utils.diff(
+            dict(a=1), dict(a=1, b=2), whole_objects=True,
+        )
+
+
+class TestApplyChanges:
+    def test_missing_object(self, mocker):
+        client = mocker.Mock()
+
+        utils.apply_changes(client, ("x", ), {}, dict(a=1))
+
+        client.put.assert_called_once_with(("x", ), dict(a=1))
+
+    def test_small_change_in_big_object(self, mocker):
+        client = mocker.Mock()
+        current = dict(
+            environment=dict(A="a", B="b"), module="wsgi", type="python",
+            home="/" + "x" * 2000,
+        )
+        desired = dict(current, environment=dict(A="a", C="c"))
+
+        utils.apply_changes(client, ("app", ), current, desired)
+
+        client.put.assert_called_once_with(
+            ("app", "environment"), dict(A="a", C="c"),
+        )
+        client.mark_existing.assert_called_once_with(("app", ))
+        client.delete.assert_not_called()
+
+    def test_single_route_step(self, mocker):
+        client = mocker.Mock()
+        current = [
+            dict(match=dict(uri="/{0}".format(i)), action=dict(share="/tmp"))
+            for i in range(100)
+        ]
+        desired = [dict(s) for s in current]
+        desired[42] = dict(current[42], action=dict(share="/www"))
+
+        utils.apply_changes(client, ("routes", ), current, desired)
+
+        client.put.assert_called_once_with(
+            ("routes", "42", "action", "share"), "/www",
+        )
+        client.delete.assert_not_called()
+
+    def test_route_action_change(self, mocker):
+        client = mocker.Mock()
+        current = [
+            dict(match=dict(uri="/{0}".format(i)), action={"pass": "routes"})
+            for i in range(300)
+        ]
+        desired = [dict(s) for s in current]
+        desired[5] = dict(current[5], action=dict(share="/www"))
+
+        utils.apply_changes(client, ("routes", "r"), current, desired)
+
+        client.put.assert_called_once_with(
+            ("routes", "r", "5", "action"), dict(share="/www"),
+        )
+        client.mark_existing.assert_called_once_with(("routes", "r", "5"))
+        client.delete.assert_not_called()
+
+    def test_small_object(self, mocker):
+        client = mocker.Mock()
+
+        utils.apply_changes(client, ("x", ), dict(a=1, b=2), dict(a=2, b=2))
+
+        client.put.assert_called_once_with(("x", ), dict(a=2, b=2))
+
+    def test_too_many_changes(self, mocker):
+        client = mocker.Mock()
+        current = dict(("k{0}".format(i), "x" * 1000) for i in range(10))
+        desired = dict((k, "y") for k in current)
+
+        utils.apply_changes(client, ("x", ), current, desired)
+
+        client.put.assert_called_once_with(("x", ), desired)
+        client.delete.assert_not_called()
+
+    def test_single_write(self, mocker):
+        client = mocker.Mock()
+        current = dict(("k{0}".format(i), "x" * 1000) for i in range(10))
+        desired = dict(current, k0="y", k1="y")
+        del desired["k2"]
+
+        utils.apply_changes(client, ("x", ), current, desired,
+                            single_write=True)
+
+        client.put.assert_called_once_with(("x", ), desired)
+        client.delete.assert_not_called()
@@ -56,3 +56,214 @@ class TestValidatePass:
         msgs = validation.validate_pass(client, "applications/test/dest")
 
         assert msgs == []
+
+
+class TestCertificateExists:
+    @pytest.mark.parametrize("key,exists", [
+        ("RSA (2048 bits)", True), ({}, False),
+    ])
+    def test_only_key_is_decoded(self, mocker, key, exists):
+        client = mocker.Mock()
+        client.get.return_value = key
+
+        assert validation.certificate_exists(client, "bundle") is exists
+        client.get.assert_called_once_with(("certificates", "bundle"), (
+            "key",
+        ))
+
+
+class TestDestinationIndex:
+    CONFIG = dict(
+        applications=dict(
+            py=dict(type="python"),
+            php=dict(type="php", targets=dict(admin={}, front={})),
+        ),
+        routes=dict(main=[dict(action=dict(share="/tmp"))]),
+        upstreams=dict(backend=dict(servers={"127.0.0.1:81": {}})),
+    )
+
+    @pytest.mark.parametrize("path", [
+        "applications/py",
+        "applications/php/admin",
+        "routes/main",
+        "routes",
+        "upstreams/backend",
+    ])
+    def test_ok(self, path):
+        assert validation.DestinationIndex(self.CONFIG).validate(path) == []
+
+    @pytest.mark.parametrize("path", [
+        "applications/missing", "routes/missing", "upstreams/x", "other/x",
+    ])
+    def test_missing_destination(self, path):
+        msgs = validation.DestinationIndex(self.CONFIG).validate(path)
+
+        assert len(msgs) == 1
+        assert "does not exist" in msgs[0]
+
+    def test_missing_php_target(self):
+        msgs = validation.DestinationIndex(self.CONFIG).validate(
+            "applications/php/missing",
+        )
+
+        assert len(msgs) == 1
+        assert "PHP" in msgs[0]
+
+    def test_global_route(self):
+        index = validation.DestinationIndex(dict(routes=[dict()]))
+
+        assert index.validate("routes") == []
+        assert len(index.validate("routes/main")) == 1
+
+    def test_from_client(self, mocker):
+        client = mocker.Mock()
+        client.get.return_value = self.CONFIG
+
+        validation.DestinationIndex.from_client(client)
+
+        client.get.assert_called_once_with(("config", ))
+
+
+class TestValidatePasses:
+    def test_nothing_to_validate(self, mocker):
+        client = mocker.Mock()
+
+        assert validation.validate_passes(client, []) == []
+        client.get.assert_not_called()
+
+    def test_single_destination(self, mocker):
+        client = mocker.Mock()
+        client.get.return_value = {}
+
+        msgs = validation.validate_passes(client, [
+            "applications/test", "applications/test",
+        ])
+
+        assert len(msgs) == 1
+        client.get.assert_called_once_with(["config", "applications", "test"])
+
+    def test_many_destinations(self, mocker):
+        client = mocker.Mock()
+        client.get.return_value = dict(
+            applications=dict(a=dict(type="python")),
+        )
+
+        msgs = validation.validate_passes(client, [
+            "applications/a", "applications/b", "routes/c",
+            "applications/a", "applications/b",
+        ])
+
+        assert msgs == [
+            "Destination 'applications/b' does not exist.",
+            "Destination 'routes/c' does not exist.",
+        ]
+        client.get.assert_called_once_with(("config", ))
+
+
+class TestActionPasses:
+    def test_pass(self):
+        assert ["applications/sample"] == validation.action_passes(
+            {"pass": "applications/sample"},
+        )
+
+    def test_fallback(self):
+        assert [
+            "applications/sample", "aplications/admin",
+        ] == validation.action_passes({
+            "pass": "applications/sample",
+            "fallback": {
+                "pass": "aplications/admin",
+                "fallback": {
+                    "share": "/tmp",
+                },
+            },
+        })
+
+    def test_nothing_to_validate(self):
+        assert [] == validation.action_passes({"share": "/tmp/www"})
+
+
+class TestValidateSteps:
+    def test_missing_action(self):
+        msgs, passes = validation.validate_steps([
+            dict(action={"pass": "routes/a"}), dict(match=dict(uri="/x")),
+        ], "main")
+
+        assert msgs == ["Missing action field in step 1 of route 'main'"]
+        assert passes == ["routes/a"]
+
+    def test_invalid_types(self):
+        msgs, passes = validation.validate_steps([
+            None, dict(action="oops"), dict(action={"pass": 3}),
+            dict(action=dict(share="/www", fallback={"pass": ["x"]})),
+        ], "main")
+
+        assert msgs == [
+            "Step 0 of route 'main' should be a dictionary.",
+            "Action in step 1 of route 'main' should be a dictionary.",
+            "Destination in step 2 of route 'main' should be a string.",
+            "Destination in fallback of step 3 of route 'main' should be a "
+            "string.",
+        ]
+        assert passes == []
+
+    def test_steps_not_a_list(self):
+        assert validation.validate_steps("oops", "r") == (
+            ["Route 'r' should be a list of steps."], [],
+        )
+
+
+class TestValidateConfig:
+    def test_ok(self):
+        assert [] == validation.validate_config(dict(
+            listeners={"*:80": {"pass": "routes/main"}},
+            routes=dict(main=[
+                dict(action={"pass": "applications/app"}),
+                dict(action=dict(share="/www", fallback={
+                    "pass": "upstreams/backend",
+                })),
+            ]),
+            applications=dict(app=dict(type="python")),
+            upstreams=dict(backend=dict(servers={"127.0.0.1:81": {}})),
+        ))
+
+    def test_all_errors_reported(self):
+        assert [
+            "Listener '*:81' has no destination.",
+            "Missing action field in step 1",
+            "Destination 'applications/missing' does not exist.",
+            "Destination 'routes/main' does not exist.",
+        ] == validation.validate_config(dict(
+            listeners={
+                "*:80": {"pass": "applications/missing"},
+                "*:81": {},
+                "*:82": {"pass": "routes/main"},
+            },
+            routes=[dict(action={"pass": "applications/missing"}), {}],
+        ))
+
+    @pytest.mark.parametrize("config,msg", [
+        ([], "Configuration should be a dictionary."),
+        (dict(listeners=["*:80"]),
+         "Listeners should be a dictionary keyed by patterns."),
+        (dict(listeners={"*:80": None}),
+         "Listener '*:80' should be a dictionary."),
+        (dict(listeners={"*:80": {"pass": 80}}),
+         "Destination of listener '*:80' should be a string."),
+        (dict(routes="oops"),
+         "Routes should be a dictionary of named routes or a list of global "
+         "route steps."),
+        (dict(routes=dict(r="oops")), "Route 'r' should be a list of steps."),
+        (dict(routes=dict(r=[None])),
+         "Step 0 of route 'r' should be a dictionary."),
+    ])
+    def test_invalid_types(self, config, msg):
+        assert [msg] == validation.validate_config(config)
+
+    def test_invalid_php_application(self):
+        assert [
+            "PHP application target applications/a/t does not exist.",
+        ] == validation.validate_config(dict(
+            listeners={"*:80": {"pass": "applications/a/t"}},
+            applications=dict(a="oops"),
+        ))
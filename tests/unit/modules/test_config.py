@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import json
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.module_utils import errors
+from ansible_collections.steampunk.unit.plugins.modules import config
+
+
+def _params(**kwargs):
+    params = dict(
+        access_log=None,
+        applications=None,
+        diff_format="full",
+        listeners=None,
+        merge=False,
+        provider=dict(endpoint=None),
+        routes=None,
+        settings=None,
+        src=None,
+        upstreams=None,
+    )
+    params.update(kwargs)
+    return params
+
+
+class TestBuildPayload:
+    def test_unset_sections_are_kept(self):
+        assert dict(
+            applications=dict(a=dict(type="python")),
+            listeners={"*:80": {"pass": "applications/a"}},
+        ) == config.build_payload(
+            _params(listeners={"*:80": {"pass": "applications/a"}}),
+            dict(
+                applications=dict(a=dict(type="python")),
+                listeners={"*:81": {"pass": "applications/a"}},
+            ),
+        )
+
+    def test_empty_section(self):
+        assert dict(listeners={}) == config.build_payload(
+            _params(listeners={}), dict(listeners={"*:81": {"pass": "x"}}),
+        )
+
+    def test_merge(self):
+        assert dict(
+            applications=dict(a=dict(type="python")),
+            listeners={"*:80": {"pass": "x"}, "*:82": {"pass": "y"}},
+            routes=[dict(action=dict(share="/www"))],
+        ) == config.build_payload(
+            _params(
+                merge=True,
+                listeners={"*:80": {"pass": "x"}, "*:81": None},
+                routes=[dict(action=dict(share="/www"))],
+            ),
+            dict(
+                applications=dict(a=dict(type="python")),
+                listeners={"*:81": {"pass": "x"}, "*:82": {"pass": "y"}},
+                routes=dict(main=[]),
+            ),
+        )
+
+    def test_invalid_routes(self):
+        with pytest.raises(errors.UnitError, match="Routes"):
+            config.build_payload(_params(routes="main"), {})
+
+
+class TestValidateCurrentState:
+    def test_missing_destination(self, mocker):
+        client = mocker.Mock()
+
+        with pytest.raises(errors.UnitError, match="routes/main"):
+            config.validate_current_state(client, dict(
+                listeners={"*:80": {"pass": "routes/main"}},
+            ))
+
+        client.get.assert_not_called()
+
+    def test_missing_certificate(self, mocker):
+        client = mocker.Mock()
+        client.get.return_value = {}
+
+        with pytest.raises(errors.UnitError, match="Certificate 'bundle'"):
+            config.validate_current_state(client, dict(
+                listeners={
+                    "*:443": {"pass": "routes", "tls": dict(
+                        certificate="bundle",
+                    )},
+                    "*:8443": {"pass": "routes", "tls": dict(
+                        certificate="bundle",
+                    )},
+                },
+                routes=[dict(action=dict(share="/www"))],
+            ))
+
+        client.get.assert_called_once_with(
+            ("certificates", "bundle"), ("key", ),
+        )
+
+    def test_certificate_list(self, mocker):
+        client = mocker.Mock()
+        client.get.side_effect = ({"key": "x"}, {})
+
+        with pytest.raises(errors.UnitError) as e:
+            config.validate_current_state(client, dict(
+                listeners={
+                    "*:443": {"pass": "routes", "tls": dict(
+                        certificate=["a", "b"],
+                    )},
+                    "*:8443": {"pass": "routes", "tls": "oops"},
+                },
+                routes=[dict(action=dict(share="/www"))],
+            ))
+
+        assert str(e.value).split("\n") == [
+            "Certificate 'b' does not exist.",
+            "TLS settings of listener '*:8443' should be a dictionary.",
+        ]
+
+
+class TestRun:
+    def test_single_put(self, mocker):
+        client = mocker.Mock()
+        client.get.return_value = dict(listeners={}, applications={})
+        mocker.patch.object(config, "get_client").return_value = client
+        desired = dict(
+            applications=dict(a=dict(type="python", module="wsgi")),
+            listeners={"*:80": {"pass": "applications/a"}},
+        )
+
+        result = config.run(_params(**desired), False)
+
+        assert result["changed"] is True
+        assert client.snapshot is True
+        client.put.assert_called_once_with(("config", ), desired)
+
+    def test_changes_are_applied_at_once(self, mocker):
+        step = dict(action={"pass": "applications/a"})
+        current = dict(
+            applications=dict(a=dict(type="python", module="wsgi")),
+            listeners={"*:80": {"pass": "routes/r"}},
+            routes=dict(r=[
+                dict(step, match=dict(uri="/{0}".format(i)))
+                for i in range(300)
+            ]),
+        )
+        client = mocker.Mock()
+        client.get.return_value = current
+        mocker.patch.object(config, "get_client").return_value = client
+        routes = dict(r=[dict(s) for s in current["routes"]["r"]])
+        routes["r"][5] = dict(routes["r"][5], action=dict(share="/www"))
+
+        result = config.run(_params(merge=True, routes=routes), False)
+
+        assert result["changed"] is True
+        client.put.assert_called_once_with(
+            ("config", ), dict(current, routes=routes),
+        )
+        client.delete.assert_not_called()
+
+    def test_no_change(self, mocker):
+        client = mocker.Mock()
+        client.get.return_value = dict(
+            listeners={"*:80": {"pass": "applications/a"}},
+            applications=dict(a=dict(type="python", processes=1)),
+        )
+        mocker.patch.object(config, "get_client").return_value = client
+
+        result = config.run(_params(
+            applications=dict(a=dict(type="python")),
+        ), False)
+
+        assert result["changed"] is False
+        client.put.assert_not_called()
+
+    def test_invalid_listener(self, mocker):
+        client = mocker.Mock()
+        client.get.return_value = {}
+        mocker.patch.object(config, "get_client").return_value = client
+
+        with pytest.raises(errors.UnitError, match="Listener '.:80'"):
+            config.run(_params(listeners={"*:80": None}), False)
+        client.put.assert_not_called()
+
+
+class TestRunSrc:
+    CONFIG = dict(
+        applications=dict(a=dict(type="python", module="wsgi")),
+        listeners={"*:80": {"pass": "applications/a"}},
+    )
+
+    @pytest.fixture
+    def src(self, tmp_path):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps(self.CONFIG, indent=2))
+        return str(path)
+
+    @pytest.fixture
+    def client(self, mocker):
+        client = mocker.Mock()
+        mocker.patch.object(config, "get_client").return_value = client
+        return client
+
+    def test_file_is_streamed(self, client, src):
+        client.get.return_value = {}
+
+        result = config.run(_params(src=src, diff_format="none"), False)
+
+        assert result == dict(
+            changed=True,
+            checksum=config.utils.checksum(
+                config.normalization.config(self.CONFIG),
+            ),
+        )
+        client.put.assert_not_called()
+        client.put_file.assert_called_once()
+        assert client.put_file.call_args[0][0] == ("config", )
+
+    def test_no_change(self, client, src):
+        # Unit reports default processes, which we should ignore.
+        client.get.return_value = dict(
+            listeners={"*:80": {"pass": "applications/a"}},
+            applications=dict(
+                a=dict(type="python", module="wsgi", processes=1),
+            ),
+        )
+
+        result = config.run(_params(src=src, diff_format="summary"), False)
+
+        assert result["changed"] is False
+        assert result["diff"]["changes"] == []
+        client.put_file.assert_not_called()
+
+    def test_check_mode(self, client, src):
+        client.get.return_value = {}
+
+        result = config.run(_params(src=src), True)
+
+        assert result["changed"] is True
+        assert result["object"] == self.CONFIG
+        client.put_file.assert_not_called()
+
+    def test_references_are_validated(self, client, tmp_path):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps(dict(
+            listeners={"*:80": {"pass": "applications/missing"}},
+        )))
+
+        with pytest.raises(errors.UnitError, match="missing"):
+            config.run(_params(src=str(path)), False)
+        client.put_file.assert_not_called()
+
+    def test_invalid_structure(self, client, tmp_path):
+        path = tmp_path / "config.json"
+        path.write_text(u'{"routes": {"r": [null]}}')
+
+        with pytest.raises(errors.UnitError, match="Step 0 of route 'r'"):
+            config.run(_params(src=str(path)), False)
+        client.put_file.assert_not_called()
+
+    def test_invalid_file(self, client, tmp_path):
+        path = tmp_path / "config.json"
+        path.write_text(u"{")
+
+        with pytest.raises(errors.UnitError, match="Cannot read"):
+            config.run(_params(src=str(path)), False)
+
+    def test_missing_file(self, client, tmp_path):
+        with pytest.raises(errors.UnitError, match="Cannot read"):
+            config.run(_params(src=str(tmp_path / "missing")), False)
+
+
+class TestMain:
+    def test_minimal_params(self, mocker, ansible_run):
+        run_mock = mocker.patch.object(config, "run")
+        run_mock.return_value = dict(k="v")
+
+        ansible_run.run(config)
+
+        assert ansible_run.success is True
+        assert ansible_run.result == dict(k="v")
+        run_mock.assert_called_with({
+            "access_log": None,
+            "applications": None,
+            "diff_format": "full",
+            "listeners": None,
+            "merge": False,
+            "provider": {
+                "verify": True,
+                "ca_path": None,
+                "endpoint": None,
+                "endpoints": None,
+                "workers": None,
+                "connect_timeout": None,
+                "read_timeout": None,
+                "deadline": None,
+                "password": None,
+                "metrics": False,
+                "snapshot": False,
+                "username": None,
+            },
+            "routes": None,
+            "settings": None,
+            "src": None,
+            "upstreams": None,
+        }, False)
+
+    def test_src_and_sections_are_exclusive(self, mocker, ansible_run):
+        run_mock = mocker.patch.object(config, "run")
+
+        ansible_run.run(config, src="/tmp/config.json", listeners={})
+
+        assert ansible_run.success is False
+        assert "mutually exclusive" in ansible_run.result["msg"]
+        run_mock.assert_not_called()
@@ -41,7 +41,9 @@ class TestValidateCurrentState:
                 "tls": {"certificate": "bundle_name"},
             })
 
-        client.get.assert_called_once_with(("certificates", "bundle_name"))
+        client.get.assert_called_once_with(
+            ("certificates", "bundle_name"), ("key", ),
+        )
 
     def test_all_ok(self, mocker):
         validate_pass = mocker.patch.object(validation, "validate_pass")
@@ -55,7 +57,130 @@ class TestValidateCurrentState:
             "tls": {"certificate": "bundle_name"},
         })
 
-        client.get.assert_called_once_with(("certificates", "bundle_name"))
+        client.get.assert_called_once_with(
+            ("certificates", "bundle_name"), ("key", ),
+        )
+
+
+class TestValidateBatch:
+    def test_all_ok(self, mocker):
+        client = mocker.Mock()
+        client.get.side_effect = [
+            dict(applications=dict(a={"type": "php"}), routes=dict(r=[{}])),
+            dict(bundle={}),
+        ]
+
+        listener.validate_batch(client, {
+            "*:80": {"pass": "applications/a"},
+            "*:81": {"pass": "routes/r", "tls": {"certificate": "bundle"}},
+            "*:82": {"pass": "routes/r", "tls": {"certificate": "bundle"}},
+        })
+
+        assert client.get.call_count == 2
+
+    def test_report_all_errors(self, mocker):
+        client = mocker.Mock()
+        client.get.side_effect = [dict(applications=dict(a={"x": 1})), {}]
+
+        with pytest.raises(errors.UnitError) as e:
+            listener.validate_batch(client, {
+                "*:80": {},
+                "*:81": {"pass": "routes/r"},
+                "*:82": {"pass": "applications/a", "tls": {
+                    "certificate": "bundle",
+                }},
+            })
+
+        assert str(e.value) == "\n".join((
+            "Listener '*:80' has no destination.",
+            "Destination 'routes/r' does not exist.",
+            "Certificate 'bundle' does not exist.",
+        ))
+
+
+class TestBuildBatchPayload:
+    @staticmethod
+    def _params(state="present", purge=False):
+        return dict(state=state, purge=purge, listeners=[
+            {"pattern": "*:80", "pass": "routes", "tls": None},
+        ])
+
+    def test_merge(self):
+        assert {
+            "*:80": {"pass": "routes"}, "*:81": {"pass": "routes"},
+        } == listener.build_batch_payload(self._params(), {
+            "*:80": {"pass": "applications/a"}, "*:81": {"pass": "routes"},
+        })
+
+    def test_purge(self):
+        assert {
+            "*:80": {"pass": "routes"},
+        } == listener.build_batch_payload(self._params(purge=True), {
+            "*:81": {"pass": "routes"},
+        })
+
+    @pytest.mark.parametrize("purge", [True, False])
+    def test_absent(self, purge):
+        assert {
+            "*:81": {"pass": "routes"},
+        } == listener.build_batch_payload(self._params("absent", purge), {
+            "*:80": {"pass": "routes"}, "*:81": {"pass": "routes"},
+        })
+
+
+class TestRunBatch:
+    def test_single_write(self, mocker):
+        client = mocker.Mock()
+        client.get.side_effect = lambda path: {
+            ("config", "listeners"): {"*:81": {"pass": "routes"}},
+            ("config", ): dict(routes=[{}], listeners={}),
+        }[tuple(path)]
+        mocker.patch.object(listener, "get_client").return_value = client
+
+        result = listener.run(dict(
+            provider={}, state="present", purge=True, diff_format="full",
+            listeners=[
+                {"pattern": "*:80", "pass": "routes", "tls": None},
+                {"pattern": "*:82", "pass": "routes", "tls": None},
+            ],
+        ), False)
+
+        assert result["changed"] is True
+        assert client.snapshot is True
+        client.put.assert_called_once_with(("config", "listeners"), {
+            "*:80": {"pass": "routes"}, "*:82": {"pass": "routes"},
+        })
+        client.delete.assert_not_called()
+
+    def test_mixed_purge_and_update(self, mocker):
+        current = dict(
+            ("*:{0}".format(p), {"pass": "routes/r{0}".format(p)})
+            for p in range(150)
+        )
+        client = mocker.Mock()
+        client.get.side_effect = lambda path: {
+            ("config", "listeners"): current,
+            ("config", ): dict(routes=dict(
+                ("r{0}".format(p), [{}]) for p in range(150)
+            ), listeners=current),
+        }[tuple(path)]
+        mocker.patch.object(listener, "get_client").return_value = client
+        listeners = [
+            {"pattern": p, "pass": l["pass"], "tls": None}
+            for p, l in current.items() if p != "*:3"
+        ]
+        listeners[1]["pass"] = listeners[2]["pass"] = "routes/r0"
+
+        result = listener.run(dict(
+            provider={}, state="present", purge=True, diff_format="none",
+            listeners=listeners,
+        ), False)
+
+        assert result["changed"] is True
+        assert client.put.call_count == 1
+        assert client.put.call_args[0][0] == ("config", "listeners")
+        assert len(client.put.call_args[0][1]) == 149
+        client.delete.assert_not_called()
 
 
 class TestMain:
@@ -69,6 +194,15 @@ class TestMain:
         assert "pattern" in ansible_run.result["msg"]
         run_mock.assert_not_called()
 
+    def test_pattern_and_listeners_are_exclusive(self, mocker, ansible_run):
+        run_mock = mocker.patch.object(listener, "run")
+
+        ansible_run.run(listener, pattern="sample", listeners=[])
+
+        assert ansible_run.success is False
+        assert "mutually exclusive" in ansible_run.result["msg"]
+        run_mock.assert_not_called()
+
     def test_pass_required_when_state_present(self, mocker, ansible_run):
         run_mock = mocker.patch.object(listener, "run")
 
@@ -87,6 +221,8 @@ class TestMain:
         assert ansible_run.success is True
         assert ansible_run.result == dict(k="v")
         run_mock.assert_called_with({
+            "diff_format": "full",
+            "listeners": None,
             "pattern": "sample",
             "pass": "dest",
             "state": "present",
@@ -94,9 +230,17 @@ class TestMain:
                 "verify": True,
                 "ca_path": None,
                 "endpoint": None,
+                "endpoints": None,
+                "workers": None,
+                "connect_timeout": None,
+                "read_timeout": None,
+                "deadline": None,
                 "password": None,
+                "metrics": False,
+                "snapshot": False,
                 "username": None,
             },
+            "purge": False,
             "tls": None,
         }, False)
 
@@ -109,6 +253,8 @@ class TestMain:
         assert ansible_run.success is True
         assert ansible_run.result == dict(k="v")
         run_mock.assert_called_with({
+            "diff_format": "full",
+            "listeners": None,
             "pattern": "sample",
             "pass": None,
             "state": "absent",
@@ -116,9 +262,17 @@ class TestMain:
                 "verify": True,
                 "ca_path": None,
                 "endpoint": None,
+                "endpoints": None,
+                "workers": None,
+                "connect_timeout": None,
+                "read_timeout": None,
+                "deadline": None,
                 "password": None,
+                "metrics": False,
+                "snapshot": False,
                 "username": None,
             },
+            "purge": False,
             "tls": None,
         }, False)
 
@@ -135,6 +289,8 @@ class TestMain:
                 "ca_path": "ca_path",
                 "endpoint": "unix:///path",
                 "password": "pass",
+                "metrics": False,
+                "snapshot": False,
                 "username": "user",
             },
             "tls": {
@@ -145,6 +301,8 @@ class TestMain:
         assert ansible_run.success is True
         assert ansible_run.result == dict(k="v")
         run_mock.assert_called_with({
+            "diff_format": "full",
+            "listeners": None,
             "pattern": "sample",
             "pass": "dest",
             "state": "present",
@@ -152,10 +310,41 @@ class TestMain:
                 "verify": True,
                 "ca_path": "ca_path",
                 "endpoint": "unix:///path",
+                "endpoints": None,
+                "workers": None,
+                "connect_timeout": None,
+                "read_timeout": None,
+                "deadline": None,
                 "password": "pass",
+                "metrics": False,
+                "snapshot": False,
                 "username": "user",
             },
+            "purge": False,
             "tls": {
                 "certificate": "bundle",
             },
         }, False)
+
+    def test_endpoints(self, mocker, ansible_run):
+        run_mock = mocker.patch.object(listener, "run")
+        run_mock.side_effect = [dict(changed=True), dict(changed=False)]
+
+        ansible_run.run(listener, **{
+            "pattern": "sample",
+            "pass": "dest",
+            "provider": {
+                "endpoints": ["unix:///a.sock", "unix:///b.sock"],
+                "workers": 1,
+            },
+        })
+
+        assert ansible_run.success is True
+        assert ansible_run.result["changed"] is True
+        assert [
+            (r["endpoint"], r["changed"])
+            for r in ansible_run.result["endpoints"]
+        ] == [("unix:///a.sock", True), ("unix:///b.sock", False)]
+        assert [
+            c[0][0]["provider"]["endpoint"] for c in run_mock.call_args_list
+        ] == ["unix:///a.sock", "unix:///b.sock"]
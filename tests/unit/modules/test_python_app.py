@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.module_utils import errors
+from ansible_collections.steampunk.unit.plugins.modules import python_app
+
+
+def _app(name, **kwargs):
+    app = dict(
+        callable=None, environment=None, group=None, home=None, limits=None,
+        module=None, name=name, no_processes=None, path=None, processes=None,
+        stderr=None, stdout=None, user=None, version=None,
+        working_directory=None,
+    )
+    app.update(kwargs)
+    return app
+
+
+class TestBuildBatchPayload:
+    def test_present(self):
+        assert dict(
+            a=dict(type="python 3", module="wsgi", processes=2),
+            b=dict(type="python", module="app"),
+            c=dict(type="python", module="old"),
+        ) == python_app.build_batch_payload(dict(
+            state="present", applications=[
+                _app("a", module="wsgi", version="3", no_processes=2),
+                _app("b", module="app"),
+            ],
+        ), dict(
+            b=dict(type="python", module="old"),
+            c=dict(type="python", module="old"),
+        ))
+
+    def test_absent(self):
+        assert dict(
+            c=dict(type="python", module="old"),
+        ) == python_app.build_batch_payload(dict(
+            state="absent", applications=[_app("a"), _app("b")],
+        ), dict(
+            b=dict(type="python", module="old"),
+            c=dict(type="python", module="old"),
+        ))
+
+    def test_missing_module(self):
+        with pytest.raises(errors.UnitError) as e:
+            python_app.build_batch_payload(dict(
+                state="present", applications=[_app("a"), _app("b")],
+            ), {})
+
+        assert str(e.value) == (
+            "Application 'a' has no module.\n"
+            "Application 'b' has no module."
+        )
+
+
+class TestRunBatch:
+    def test_single_write(self, mocker):
+        client = mocker.Mock()
+        client.get.return_value = dict(
+            a=dict(type="python", module="wsgi", processes=1),
+        )
+        mocker.patch.object(python_app, "get_client").return_value = client
+
+        result = python_app.run(dict(
+            provider={}, state="present", diff_format="full", applications=[
+                _app("a", module="wsgi"),
+                _app("b", module="wsgi", no_processes=3),
+            ],
+        ), False)
+
+        assert result["changed"] is True
+        assert result["object"] == dict(
+            a=dict(name="a", type="python", module="wsgi"),
+            b=dict(name="b", type="python", module="wsgi", no_processes=3),
+        )
+        assert client.snapshot is True
+        client.put.assert_called_once_with(("config", "applications"), dict(
+            a=dict(type="python", module="wsgi"),
+            b=dict(type="python", module="wsgi", processes=3),
+        ))
+
+    @pytest.mark.parametrize("state", ["present", "absent"])
+    def test_small_changes_in_many_apps(self, mocker, state):
+        current = dict(
+            ("app{0}".format(i), dict(
+                type="python", module="wsgi", path="/www/" + "x" * 100,
+            )) for i in range(300)
+        )
+        client = mocker.Mock()
+        client.get.return_value = current
+        mocker.patch.object(python_app, "get_client").return_value = client
+
+        python_app.run(dict(
+            provider={}, state=state, diff_format="none", applications=[
+                _app("app1", module="new"), _app("app2", module="new"),
+            ],
+        ), False)
+
+        assert client.put.call_count == 1
+        assert client.put.call_args[0][0] == ("config", "applications")
+        client.delete.assert_not_called()
+
+
+class TestMain:
+    def test_name_or_applications_required(self, mocker, ansible_run):
+        run_mock = mocker.patch.object(python_app, "run")
+
+        ansible_run.run(python_app, version="3")
+
+        assert ansible_run.success is False
+        assert "name" in ansible_run.result["msg"]
+        run_mock.assert_not_called()
+
+    def test_module_required_when_state_present(self, mocker, ansible_run):
+        run_mock = mocker.patch.object(python_app, "run")
+
+        ansible_run.run(python_app, name="demo")
+
+        assert ansible_run.success is False
+        assert "module" in ansible_run.result["msg"]
+        run_mock.assert_not_called()
+
+    def test_batch_params(self, mocker, ansible_run):
+        run_mock = mocker.patch.object(python_app, "run")
+        run_mock.return_value = dict(k="v")
+
+        ansible_run.run(python_app, applications=[
+            dict(name="a", module="wsgi"), dict(name="b"),
+        ], state="absent")
+
+        assert ansible_run.success is True
+        params = run_mock.call_args[0][0]
+        assert params["name"] is None
+        assert params["applications"] == [
+            _app("a", module="wsgi"), _app("b"),
+        ]
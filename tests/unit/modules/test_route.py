@@ -6,6 +6,8 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+import json
+
 import pytest
 
 from ansible_collections.steampunk.unit.plugins.module_utils import (
@@ -14,61 +16,44 @@ from ansible_collections.steampunk.unit.plugins.module_utils import (
 from ansible_collections.steampunk.unit.plugins.modules import route
 
 
-class TestValidateAction:
-    def test_pass_validation(self, mocker):
-        validate_pass = mocker.patch.object(validation, "validate_pass")
-        validate_pass.return_value = []
-
-        msgs = route.validate_action(None, {"pass": "applications/sample"})
-
-        validate_pass.assert_called_once_with(None, "applications/sample")
-        assert msgs == []
-
-    def test_fallback_validation(self, mocker):
-        validate_pass = mocker.patch.object(validation, "validate_pass")
-        validate_pass.side_effect = [[0], [1], [2]]
-
-        msgs = route.validate_action(None, {
-            "pass": "applications/sample",
-            "fallback": {
-                "pass": "aplications/admin",
-                "fallback": {
-                    "share": "/tmp",
-                },
-            },
-        })
-
-        assert validate_pass.call_count == 2
-        assert msgs == [0, 1]
-
-    def test_nothing_to_validate(self, mocker):
-        validate_pass = mocker.patch.object(validation, "validate_pass")
-
-        msgs = route.validate_action(None, {"share": "/tmp/www"})
-
-        validate_pass.assert_not_called()
-        assert msgs == []
-
-
 class TestValidateCurrentState:
     def test_missing_action(self, mocker):
-        validate_action = mocker.patch.object(route, "validate_action")
+        validate_passes = mocker.patch.object(validation, "validate_passes")
+        validate_passes.return_value = []
 
         with pytest.raises(errors.UnitError, match="step 0"):
             route.validate_current_state(None, [{}])
 
-        validate_action.assert_not_called()
+        validate_passes.assert_called_once_with(None, [])
 
     def test_action_present(self, mocker):
-        validate_action = mocker.patch.object(route, "validate_action")
-        validate_action.return_value = []
+        validate_passes = mocker.patch.object(validation, "validate_passes")
+        validate_passes.return_value = []
 
         route.validate_current_state(None, [
             dict(match=dict(method="GET"), action=dict(share="/tmp/read")),
             dict(action=dict(share="/tmp/other")),
         ])
 
-        assert validate_action.call_count == 2
+        validate_passes.assert_called_once_with(None, [])
+
+    def test_all_passes_validated_at_once(self, mocker):
+        validate_passes = mocker.patch.object(validation, "validate_passes")
+        validate_passes.return_value = ["bad 1", "bad 2"]
+
+        with pytest.raises(errors.UnitError, match="bad 1\nbad 2"):
+            route.validate_current_state(None, [
+                dict(action={"pass": "applications/a"}),
+                dict(action={
+                    "share": "/tmp",
+                    "fallback": {"pass": "routes/b"},
+                }),
+                dict(action={"pass": "applications/a"}),
+            ])
+
+        validate_passes.assert_called_once_with(None, [
+            "applications/a", "routes/b", "applications/a",
+        ])
 
 
 class TestBuildPayload:
@@ -154,15 +139,25 @@ class TestMain:
         assert ansible_run.success is True
         assert ansible_run.result == dict(k="v")
         run_mock.assert_called_with({
+            "diff_format": "full",
             "name": "sample",
             "steps": [],
             "global": False,
+            "raw_steps": None,
+            "steps_file": None,
             "state": "present",
             "provider": {
                 "verify": True,
                 "ca_path": None,
                 "endpoint": None,
+                "endpoints": None,
+                "workers": None,
+                "connect_timeout": None,
+                "read_timeout": None,
+                "deadline": None,
                 "password": None,
+                "metrics": False,
+                "snapshot": False,
                 "username": None,
             },
         }, False)
@@ -176,15 +171,25 @@ class TestMain:
         assert ansible_run.success is True
         assert ansible_run.result == dict(k="v")
         run_mock.assert_called_with({
+            "diff_format": "full",
             "name": None,
             "steps": [],
             "global": True,
+            "raw_steps": None,
+            "steps_file": None,
             "state": "present",
             "provider": {
                 "verify": True,
                 "ca_path": None,
                 "endpoint": None,
+                "endpoints": None,
+                "workers": None,
+                "connect_timeout": None,
+                "read_timeout": None,
+                "deadline": None,
                 "password": None,
+                "metrics": False,
+                "snapshot": False,
                 "username": None,
             },
         }, False)
@@ -198,15 +203,25 @@ class TestMain:
         assert ansible_run.success is True
         assert ansible_run.result == dict(k="v")
         run_mock.assert_called_with({
+            "diff_format": "full",
             "name": "sample",
             "steps": None,
             "global": False,
+            "raw_steps": None,
+            "steps_file": None,
             "state": "absent",
             "provider": {
                 "verify": True,
                 "ca_path": None,
                 "endpoint": None,
+                "endpoints": None,
+                "workers": None,
+                "connect_timeout": None,
+                "read_timeout": None,
+                "deadline": None,
                 "password": None,
+                "metrics": False,
+                "snapshot": False,
                 "username": None,
             },
         }, False)
@@ -220,15 +235,25 @@ class TestMain:
         assert ansible_run.success is True
         assert ansible_run.result == dict(k="v")
         run_mock.assert_called_with({
+            "diff_format": "full",
             "name": None,
             "steps": None,
             "global": True,
+            "raw_steps": None,
+            "steps_file": None,
             "state": "absent",
             "provider": {
                 "verify": True,
                 "ca_path": None,
                 "endpoint": None,
+                "endpoints": None,
+                "workers": None,
+                "connect_timeout": None,
+                "read_timeout": None,
+                "deadline": None,
                 "password": None,
+                "metrics": False,
+                "snapshot": False,
                 "username": None,
             },
         }, False)
@@ -244,6 +269,8 @@ class TestMain:
                 "ca_path": "/my/path",
                 "endpoint": "unix:///socket",
                 "password": "pass",
+                "metrics": False,
+                "snapshot": False,
                 "username": "user",
                 "verify": False,
             },
@@ -268,12 +295,22 @@ class TestMain:
         assert ansible_run.success is True
         assert ansible_run.result == dict(k="v")
         run_mock.assert_called_with({
+            "diff_format": "full",
             "global": True,
+            "raw_steps": None,
+            "steps_file": None,
             "name": "sample",
             "provider": {
                 "ca_path": "/my/path",
                 "endpoint": "unix:///socket",
+                "endpoints": None,
+                "workers": None,
+                "connect_timeout": None,
+                "read_timeout": None,
+                "deadline": None,
                 "password": "pass",
+                "metrics": False,
+                "snapshot": False,
                 "username": "user",
                 "verify": False,
             },
@@ -313,3 +350,92 @@ class TestMain:
                 },
             ],
         }, False)
+
+    def test_steps_are_mutually_exclusive(self, mocker, ansible_run):
+        run_mock = mocker.patch.object(route, "run")
+
+        ansible_run.run(route, name="sample", steps=[], raw_steps=[])
+
+        assert ansible_run.success is False
+        assert "mutually exclusive" in ansible_run.result["msg"]
+        run_mock.assert_not_called()
+
+
+def _steps_result(mocker, ansible_run, **args):
+    run_mock = mocker.patch.object(route, "run")
+    run_mock.return_value = {}
+
+    ansible_run.run(route, name="sample", **args)
+
+    if ansible_run.success:
+        return True, run_mock.call_args[0][0]["steps"]
+    return False, ansible_run.result["msg"]
+
+
+class TestRawSteps:
+    @pytest.mark.parametrize("steps", [
+        [],
+        [dict(action={"pass": "applications/a"})],
+        [
+            dict(
+                match=dict(
+                    uri="/a/*,/b/*", method=["GET", 5], scheme="https",
+                    headers=[{"Accept": "*/*"}], arguments=["a=1"],
+                ),
+                action=dict(
+                    share="/www", fallback=dict(share="/old"), location=3,
+                ),
+            ),
+            dict(action={"return": "301", "location": "/new", "pass": 5}),
+        ],
+        "a=b",
+        # Errors
+        [dict(match=dict(uri="/"))],
+        [dict(action=dict(foo="bar"))],
+        [dict(action=dict(foo="bar", bar=1))],
+        [dict(action=dict(foo="bar"), match=dict(scheme="ftp"))],
+        [dict(action={"return": "moved"})],
+        [dict(action={}, match=dict(scheme="ftp"))],
+        [dict(action={}, match=dict(headers="x"))],
+        [dict(action={}, match=dict(host=[{}]))],
+        [dict(action={}, match=dict(host="a"), extra=1)],
+        [dict(action=None)],
+        [dict(action=[])],
+        ["step"],
+        [dict(action="pass=applications/a")],
+        [dict(action={}, match=dict(scheme="ftp")), dict(action="junk")],
+    ])
+    def test_same_as_module_validation(self, mocker, ansible_run, steps):
+        expected = _steps_result(mocker, ansible_run, steps=steps)
+
+        assert expected == _steps_result(
+            mocker, ansible_run, raw_steps=steps,
+        )
+
+    def test_steps_file(self, mocker, ansible_run, tmp_path):
+        steps = [dict(action=dict(share="/www"), match=dict(uri="/a"))]
+        path = tmp_path / "steps.json"
+        path.write_text(json.dumps(steps))
+
+        result = _steps_result(mocker, ansible_run, steps_file=str(path))
+
+        assert result == _steps_result(mocker, ansible_run, steps=steps)
+
+    def test_invalid_steps_file(self, mocker, ansible_run, tmp_path):
+        path = tmp_path / "steps.json"
+        path.write_text(u"[")
+
+        success, msg = _steps_result(
+            mocker, ansible_run, steps_file=str(path),
+        )
+
+        assert success is False
+        assert msg.startswith("Cannot read steps from '{0}'".format(path))
+
+    def test_missing_steps_file(self, mocker, ansible_run, tmp_path):
+        success, msg = _steps_result(
+            mocker, ansible_run, steps_file=str(tmp_path / "missing"),
+        )
+
+        assert success is False
+        assert "Cannot read steps" in msg
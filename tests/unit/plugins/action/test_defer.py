@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.action import (
+    listener, python_app, route,
+)
+from ansible_collections.steampunk.unit.plugins.module_utils.errors import (
+    UnitError,
+)
+
+
+def _defer(plugin, **args):
+    return plugin.ActionModule.defer(None, args)
+
+
+def _run(mocker, plugin, **args):
+    task = mocker.Mock(
+        args=args, async_val=0, action=plugin.__name__.split(".")[-1],
+    )
+    action = plugin.ActionModule(
+        task, mocker.Mock(), mocker.Mock(check_mode=False), None, None, None,
+    )
+    action._execute_module = mocker.Mock(return_value=dict(changed=True))
+    return action.run(task_vars=dict(steampunk_unit_defer=True))
+
+
+class TestDefer:
+    def test_listener(self):
+        assert ("listeners", "*:80", {"pass": "routes"}) == _defer(
+            listener, pattern="*:80", **{"pass": "routes", "tls": None}
+        )
+
+    def test_listener_batch(self):
+        assert _defer(listener, listeners=[]) is None
+
+    def test_route(self):
+        assert ("routes", "main", [dict(action=dict(share="/www"))]) == _defer(
+            route, name="main", steps=[
+                dict(match=None, action=dict(share="/www", proxy=None)),
+            ],
+        )
+
+    def test_global_route_removal(self):
+        assert _defer(route, state="absent", **{"global": True}) is None
+
+    def test_app(self):
+        assert ("applications", "a", dict(
+            type="python 3", module="wsgi", processes=2,
+        )) == _defer(
+            python_app, name="a", module="wsgi", version="3", no_processes=2,
+        )
+
+    def test_app_absent(self):
+        assert ("applications", "a", None) == _defer(
+            python_app, name="a", state="absent",
+        )
+
+    @pytest.mark.parametrize("plugin,args", [
+        (listener, dict(pattern="*:80")),
+        (route, dict(name="main")),
+        (route, dict(steps=[])),
+        (python_app, dict(name="a")),
+    ])
+    def test_missing_args(self, plugin, args):
+        with pytest.raises(UnitError, match="missing"):
+            _defer(plugin, **args)
+
+
+class TestRun:
+    def test_app_args_are_converted(self, mocker):
+        result = _run(
+            mocker, python_app, name="a", module="wsgi", no_processes="4",
+        )
+
+        assert result["ansible_facts"]["steampunk_unit_pending"] == [dict(
+            section="applications", name="a",
+            value=dict(type="python", module="wsgi", processes=4),
+        )]
+
+    def test_app_home_is_expanded_on_host(self, mocker):
+        result = _run(
+            mocker, python_app, name="a", module="wsgi", home="~/venv",
+        )
+
+        assert result["changed"] is True
+        assert "ansible_facts" not in result
+
+    @pytest.mark.parametrize("plugin,args,msg", [
+        (python_app, dict(name="a", module="wsgi", procesess=4),
+         "Unsupported parameters for (python_app) module: procesess"),
+        (python_app, dict(name="a", module="wsgi", no_processes=4,
+                          processes={}), "exclusive: no_processes|processes"),
+        (route, dict(name="a", steps=[dict(action={"bogus": 1})]),
+         "steps.action.bogus"),
+        (listener, {"pattern": "*:80", "pass": "routes", "tls": "bundle"},
+         "tls"),
+    ])
+    def test_invalid_args(self, mocker, plugin, args, msg):
+        result = _run(mocker, plugin, **args)
+
+        assert result["failed"] is True
+        assert msg in result["msg"]
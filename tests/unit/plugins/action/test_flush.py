@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.action import flush
+
+
+@pytest.fixture
+def action(mocker):
+    def factory(check_mode=False, **args):
+        task = mocker.Mock(args=args, async_val=0)
+        action = flush.ActionModule(
+            task, mocker.Mock(), mocker.Mock(check_mode=check_mode), None,
+            None, None,
+        )
+        action._execute_module = mocker.Mock(
+            return_value=dict(changed=True),
+        )
+        return action
+    return factory
+
+
+PENDING = [
+    dict(section="applications", name="a", value=dict(type="python")),
+    dict(section="listeners", name="*:80", value=None),
+]
+
+
+class TestRun:
+    def test_nothing_to_do(self, action):
+        a = action()
+
+        result = a.run(task_vars={})
+
+        assert result["changed"] is False
+        a._execute_module.assert_not_called()
+
+    def test_apply_pending(self, action):
+        a = action(provider=dict(endpoint="unix:///sock"))
+
+        result = a.run(task_vars=dict(steampunk_unit_pending=PENDING))
+
+        assert result["changed"] is True
+        assert result["ansible_facts"] == dict(steampunk_unit_pending=[])
+        a._execute_module.assert_called_once_with(
+            module_name="steampunk.unit.config",
+            module_args=dict(
+                applications=dict(a=dict(type="python")),
+                listeners={"*:80": None},
+                merge=True,
+                provider=dict(endpoint="unix:///sock"),
+            ),
+            task_vars=dict(steampunk_unit_pending=PENDING),
+        )
+
+    def test_keep_pending_in_check_mode(self, action):
+        a = action(check_mode=True)
+
+        result = a.run(task_vars=dict(steampunk_unit_pending=PENDING))
+
+        assert "ansible_facts" not in result
+
+    def test_keep_pending_on_failure(self, action):
+        a = action()
+        a._execute_module.return_value = dict(failed=True, msg="bad")
+
+        result = a.run(task_vars=dict(steampunk_unit_pending=PENDING))
+
+        assert result["failed"] is True
+        assert "ansible_facts" not in result
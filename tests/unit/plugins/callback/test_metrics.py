@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+from ansible_collections.steampunk.unit.plugins.callback import metrics
+
+
+def _result(mocker, host, action, result):
+    r = mocker.Mock(_result=result)
+    r._host.get_name.return_value = host
+    r._task.action = action
+    return r
+
+
+class TestCallback:
+    def test_aggregate(self, mocker):
+        callback = metrics.CallbackModule()
+        callback._display = mocker.Mock()
+        m = dict(
+            request_count=2, request_time=0.5, request_bytes=10,
+            response_bytes=20, put_retries=1, saved_round_trips=2,
+            discovery_time=0.25,
+        )
+
+        callback.v2_runner_on_ok(_result(mocker, "a", "listener", dict(
+            metrics=m,
+        )))
+        callback.v2_runner_on_failed(_result(mocker, "a", "listener", dict(
+            metrics=m,
+        )))
+        callback.v2_runner_on_ok(_result(mocker, "b", "listener", {}))
+        callback.v2_playbook_on_stats(None)
+
+        assert callback.stats == {("a", "listener"): dict(
+            tasks=2, request_count=4, request_time=1.0, request_bytes=20,
+            response_bytes=40, put_retries=2, saved_round_trips=4,
+            discovery_time=0.5,
+        )}
+        lines = [c[0][0] for c in callback._display.display.call_args_list]
+        assert lines[1].split() == [
+            "a", "listener", "2", "4", "1.000s", "60", "2", "4", "0.500s",
+        ]
+
+    def test_no_metrics(self, mocker):
+        callback = metrics.CallbackModule()
+        callback._display = mocker.Mock()
+
+        callback.v2_playbook_on_stats(None)
+
+        callback._display.banner.assert_not_called()
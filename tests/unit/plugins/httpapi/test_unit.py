@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import io
+
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+
+from ansible_collections.steampunk.unit.plugins.httpapi import unit
+
+
+class TestSendRequest:
+    def test_json_body(self, mocker):
+        connection = mocker.Mock()
+        response = mocker.Mock()
+        response.getcode.return_value = 200
+        response.headers = {"Server": "Unit/1.18.0"}
+        connection.send.return_value = response, io.BytesIO(b'{"a":1}')
+
+        result = unit.HttpApi(connection).send_request(
+            "PUT", "/config/a", '{"b":1}',
+        )
+
+        assert result == (200, '{"a":1}', "Unit/1.18.0")
+        connection.send.assert_called_once_with(
+            "/config/a", '{"b":1}', method="PUT",
+            headers={"Content-Type": "application/json"},
+        )
+
+
+class TestHandleHttpError:
+    def test_status_is_passed_to_client(self, mocker):
+        exc = HTTPError("http://u/config/x", 404, "Not found", {}, None)
+
+        assert unit.HttpApi(mocker.Mock()).handle_httperror(exc) is exc
+
+    def test_unauthorized(self, mocker):
+        exc = HTTPError("http://u/config", 401, "Unauthorized", {}, None)
+
+        assert unit.HttpApi(mocker.Mock()).handle_httperror(exc) is False
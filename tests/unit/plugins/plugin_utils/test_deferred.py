@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2020, XLAB Steampunk <steampunk@xlab.si>
+#
+# GNU General Public License v3.0+ (https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.steampunk.unit.plugins.module_utils import utils
+from ansible_collections.steampunk.unit.plugins.module_utils.errors import (
+    UnitError,
+)
+from ansible_collections.steampunk.unit.plugins.plugin_utils import deferred
+
+
+def _change(section, name, value):
+    return dict(section=section, name=name, value=value)
+
+
+class Action(deferred.DeferredAction):
+    def module_args(self):
+        return dict(
+            argument_spec=dict(
+                batch=dict(type="bool", default=False),
+                fail=dict(type="bool", default=False),
+                home=dict(type="path"),
+                pattern=dict(type="str"),
+                processes=dict(type="int"),
+                provider=dict(type="dict"),
+            ),
+            mutually_exclusive=[("pattern", "batch")],
+        )
+
+    def defer(self, args):
+        if args["fail"]:
+            raise UnitError("bad args")
+        if args["batch"]:
+            return None
+        return "listeners", args["pattern"], utils.filter_dict(
+            args, "home", "processes",
+        )
+
+
+@pytest.fixture
+def action(mocker):
+    def factory(**args):
+        task = mocker.Mock(args=args, async_val=0)
+        action = Action(
+            task, mocker.Mock(), mocker.Mock(check_mode=False), None, None,
+            None,
+        )
+        action._execute_module = mocker.Mock(
+            return_value=dict(changed=True, object={}),
+        )
+        return action
+    return factory
+
+
+class TestGetPending:
+    def test_from_facts(self):
+        assert [1] == deferred.get_pending(dict(
+            ansible_facts=dict(steampunk_unit_pending=[1]),
+            steampunk_unit_pending=[2],
+        ))
+
+    def test_from_vars(self):
+        assert [2] == deferred.get_pending(dict(steampunk_unit_pending=[2]))
+
+    def test_missing(self):
+        assert [] == deferred.get_pending({})
+
+
+class TestMergePending:
+    def test_last_change_wins(self):
+        assert dict(
+            listeners={"*:80": None, "*:81": {"pass": "routes"}},
+            routes=[],
+        ) == deferred.merge_pending([
+            _change("listeners", "*:80", {"pass": "routes"}),
+            _change("routes", "main", []),
+            _change("routes", None, []),
+            _change("listeners", "*:81", {"pass": "routes"}),
+            _change("listeners", "*:80", None),
+        ])
+
+    def test_named_route_after_global(self):
+        assert dict(routes=dict(main=[])) == deferred.merge_pending([
+            _change("routes", None, [dict(action={})]),
+            _change("routes", "main", []),
+        ])
+
+
+class TestDeferredAction:
+    def test_disabled(self, action):
+        a = action(pattern="*:80")
+
+        result = a.run(task_vars={})
+
+        assert result["changed"] is True
+        assert "ansible_facts" not in result
+        a._execute_module.assert_called_once()
+
+    def test_not_deferrable(self, action):
+        a = action(batch=True)
+
+        a.run(task_vars=dict(steampunk_unit_defer="yes"))
+
+        a._execute_module.assert_called_once()
+
+    def test_record(self, action):
+        a = action(pattern="*:80")
+
+        result = a.run(task_vars=dict(
+            steampunk_unit_defer=True,
+            steampunk_unit_pending=[_change("routes", "main", [])],
+        ))
+
+        assert result["changed"] is False
+        assert result["deferred"] is True
+        assert result["ansible_facts"] == dict(steampunk_unit_pending=[
+            _change("routes", "main", []),
+            _change("listeners", "*:80", {}),
+        ])
+        a._execute_module.assert_not_called()
+
+    def test_args_are_converted(self, action):
+        a = action(pattern="*:80", processes="4", home="/venv")
+
+        result = a.run(task_vars=dict(steampunk_unit_defer=True))
+
+        assert result["ansible_facts"] == dict(steampunk_unit_pending=[
+            _change("listeners", "*:80", dict(home="/venv", processes=4)),
+        ])
+
+    @pytest.mark.parametrize("home", ["~/venv", "$HOME/venv"])
+    def test_host_path(self, action, home):
+        a = action(pattern="*:80", home=home)
+        a._execute_module.return_value = dict(changed=True)
+
+        result = a.run(task_vars=dict(steampunk_unit_defer=True))
+
+        assert result["changed"] is True
+        assert "ansible_facts" not in result
+        assert result["warnings"] == [
+            "Task was not deferred because its paths need to be expanded on "
+            "the managed host.",
+        ]
+        a._execute_module.assert_called_once()
+
+    @pytest.mark.parametrize("args,msg", [
+        (dict(pattern="*:80", procesess=4), "procesess"),
+        (dict(pattern="*:80", processes="many"), "processes"),
+        (dict(pattern="*:80", batch=True), "mutually exclusive"),
+    ])
+    def test_args_are_validated(self, action, args, msg):
+        a = action(**args)
+
+        result = a.run(task_vars=dict(steampunk_unit_defer=True))
+
+        assert result["failed"] is True
+        assert msg in result["msg"]
+        a._execute_module.assert_not_called()
+
+    def test_own_provider(self, action):
+        a = action(pattern="*:80", provider=dict(endpoint="unix:///sock"))
+        a._execute_module.return_value = dict(changed=True, warnings=["w"])
+
+        result = a.run(task_vars=dict(steampunk_unit_defer=True))
+
+        assert result["changed"] is True
+        assert "deferred" not in result
+        assert "ansible_facts" not in result
+        assert result["warnings"] == [
+            "w", "Task was not deferred because it sets its own provider.",
+        ]
+        a._execute_module.assert_called_once()
+
+    def test_invalid_args(self, action):
+        a = action(fail=True)
+
+        result = a.run(task_vars=dict(steampunk_unit_defer=True))
+
+        assert result["failed"] is True
+        assert result["msg"] == "bad args"